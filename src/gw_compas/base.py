@@ -168,8 +168,34 @@ COMPAS_DATASET_MODEL_UPLOAD_TOKEN_EXPIRY = (
     60 * 60 * 24
 )  # User has one day to upload the file for the job
 
+# The URL of the internal nginx location that serves MEDIA_ROOT, see nginx/nginx.conf. If set, file_download only
+# checks the download token and has nginx send the file with an X-Accel-Redirect, rather than streaming it through a
+# Django worker. Unset in development, where files are streamed by Django
+FILE_DOWNLOAD_ACCEL_REDIRECT_URL = None
+
+# The size (in bytes) of each part of a chunked dataset model upload, see ChunkedDatasetModelUpload
+COMPAS_DATASET_MODEL_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+
 # The expiry of FileDownloadTokens (in seconds)
 FILE_DOWNLOAD_TOKEN_EXPIRY = 60 * 60 * 24
 
+# Whether uploaded data files are copied into a layout that is faster to plot from, after they are indexed. The copy
+# takes up as much space again as the data file, or more if the data file is compressed
+REPACK_DATA_FILES = False
+
 EXTERNAL_STORAGE_PATH = "/files"
 FILE_UPLOAD_TEMP_DIR = os.path.join(EXTERNAL_STORAGE_PATH, "upload")
+
+# Plot results for published datasets are cached on disk so they are shared between all workers. Entries never expire
+# (the keys include the file modification time), the cache is culled once it reaches MAX_ENTRIES
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "plots": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(EXTERNAL_STORAGE_PATH, "cache", "plots"),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 5000, "CULL_FREQUENCY": 4},
+    },
+}
@@ -14,6 +14,7 @@ EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 EXTERNAL_STORAGE_PATH = os.path.join(BASE_DIR, "files")
 FILE_UPLOAD_TEMP_DIR = os.path.join(EXTERNAL_STORAGE_PATH, "upload")
+CACHES["plots"]["LOCATION"] = os.path.join(EXTERNAL_STORAGE_PATH, "cache", "plots")
 
 # On both login and logout, redirect to the frontend react app
 LOGIN_REDIRECT_URL = "http://localhost:3000/"
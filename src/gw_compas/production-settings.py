@@ -15,6 +15,9 @@ GWCLOUD_JOB_CONTROLLER_API_URL = "https://jobcontroller.adacs.org.au/job/apiv1"
 CELERY_BROKER_URL = "redis://redis:6379"
 CELERY_RESULT_BACKEND = "redis://redis:6379"
 
+# Downloads are sent by nginx, see nginx/nginx.conf
+FILE_DOWNLOAD_ACCEL_REDIRECT_URL = "/protected_files/"
+
 # On both login and logout, redirect to the frontend react app
 LOGIN_REDIRECT_URL = "/"
 LOGIN_REDIRECT_URL = "/"
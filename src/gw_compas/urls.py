@@ -27,6 +27,11 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("graphql", csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True))),
     path("file_download/", publications.views.file_download, name="file_download"),
+    path(
+        "dataset_model_upload_part/",
+        publications.views.dataset_model_upload_part,
+        name="dataset_model_upload_part",
+    ),
     path("sso/", include("adacs_sso_plugin.urls", namespace="sso")),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,57 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from publications.utils.benchmark_functions import BENCHMARK_ROWS, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the plotting functions on synthetic COMPAS-like data files of increasing size, and saves the "
+        "results as JSON so they can be compared between commits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            nargs="+",
+            type=lambda value: int(float(value)),
+            default=BENCHMARK_ROWS,
+            help="Number of rows of each data file, e.g. 1e5 1e6",
+        )
+        parser.add_argument(
+            "--directory",
+            default=Path(tempfile.gettempdir()) / "compas_benchmark",
+            help="Directory the data files are written to, and reused from",
+        )
+        parser.add_argument(
+            "--output", default="benchmark.json", help="Path of the JSON results"
+        )
+        parser.add_argument("--repeats", type=int, default=3)
+        parser.add_argument("--bins", type=int, default=40)
+        parser.add_argument(
+            "--compression", default=None, help="Compression of new data files"
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            options["directory"],
+            rows=options["rows"],
+            repeats=options["repeats"],
+            bins=options["bins"],
+            compression=options["compression"],
+        )
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+
+        for result in results["results"]:
+            pair = " vs ".join(
+                result[key] for key in ["subgroup_x", "subgroup_y"] if key in result
+            )
+            self.stdout.write(
+                f"{result['rows']:>11} {result['function']:<26} {pair:<40} "
+                f"{result['min_seconds']:10.4f}s {result['peak_rss_bytes'] / 2**20:9.1f} MiB"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0010_auto_20240314_0523"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DatasetGroup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("length", models.BigIntegerField()),
+                (
+                    "dataset_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="groups",
+                        to="publications.compasdatasetmodel",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "unique_together": {("dataset_model", "name")},
+            },
+        ),
+        migrations.CreateModel(
+            name="DatasetSubgroup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("dtype", models.CharField(max_length=64)),
+                ("units", models.CharField(max_length=255, null=True)),
+                ("length", models.BigIntegerField()),
+                ("is_bool", models.BooleanField(default=False)),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="subgroups",
+                        to="publications.datasetgroup",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "unique_together": {("group", "name")},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0011_datasetgroup_datasetsubgroup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ColumnStatistics",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.BigIntegerField()),
+                ("nan_count", models.BigIntegerField()),
+                ("inf_count", models.BigIntegerField()),
+                ("zero_count", models.BigIntegerField()),
+                ("min", models.FloatField(null=True)),
+                ("max", models.FloatField(null=True)),
+                ("min_positive", models.FloatField(null=True)),
+                ("log_check", models.BooleanField(default=False)),
+                ("null_check", models.BooleanField(default=False)),
+                ("plot_min", models.FloatField(null=True)),
+                ("plot_max", models.FloatField(null=True)),
+                (
+                    "subgroup",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statistics",
+                        to="publications.datasetsubgroup",
+                    ),
+                ),
+            ],
+        ),
+    ]
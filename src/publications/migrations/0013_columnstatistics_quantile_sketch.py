@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0012_columnstatistics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="columnstatistics",
+            name="quantile_sketch",
+            field=models.JSONField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0013_columnstatistics_quantile_sketch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="datasetsubgroup",
+            name="is_derived",
+            field=models.BooleanField(default=False),
+        ),
+    ]
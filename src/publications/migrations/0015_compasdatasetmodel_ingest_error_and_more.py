@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0014_datasetsubgroup_is_derived"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="compasdatasetmodel",
+            name="ingest_error",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="compasdatasetmodel",
+            name="ingest_status",
+            field=models.CharField(
+                choices=[
+                    ("uploaded", "Uploaded"),
+                    ("extracting", "Extracting"),
+                    ("indexing", "Indexing"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="ready",
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0015_compasdatasetmodel_ingest_error_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="upload",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
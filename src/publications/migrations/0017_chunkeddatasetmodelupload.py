@@ -0,0 +1,55 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0016_upload_size_sha256"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChunkedDatasetModelUpload",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_name", models.CharField(max_length=255)),
+                ("size", models.BigIntegerField()),
+                ("part_size", models.BigIntegerField()),
+                ("offset", models.BigIntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "compas_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="publications.compasmodel",
+                    ),
+                ),
+                (
+                    "compas_publication",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="publications.compaspublication",
+                    ),
+                ),
+                (
+                    "upload_token",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunked_upload",
+                        to="publications.compasdatasetmodeluploadtoken",
+                    ),
+                ),
+            ],
+        ),
+    ]
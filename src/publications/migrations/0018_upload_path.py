@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0017_chunkeddatasetmodelupload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="upload",
+            name="path",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
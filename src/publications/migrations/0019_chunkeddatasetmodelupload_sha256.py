@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("publications", "0018_upload_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunkeddatasetmodelupload",
+            name="sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -1,16 +1,65 @@
 import datetime
+import hashlib
+import json
+import logging
 import os
+import shutil
 import tarfile
 import uuid
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 
+import numpy as np
+
 from django.conf import settings
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
+from publications.utils.h5_functions import (
+    SAMPLE_SEED,
+    default_prefs,
+    get_column_statistics,
+    get_h5_column_histogram,
+    get_h5_filter_mask,
+    get_h5_schema,
+    get_h5_seed_index,
+    get_h5_subgroup_pyramid,
+    get_plot_subgroups,
+    get_random_sample_indices,
+    get_sample_fraction,
+    get_sample_size,
+    get_stride_length,
+    repack_h5_file,
+    save_h5_derived_column,
+)
+from publications.utils.derived_functions import DerivedH5File
+from publications.utils.filter_functions import format_filter, parse_filter
+from publications.utils.h5_pool import h5_file_pool, open_h5_file
+from publications.utils.join_functions import (
+    SEED_COLUMN,
+    join_seed_indexes,
+    load_seed_index,
+    save_seed_index,
+)
+from publications.utils.plotting_functions import get_log_decision
+from publications.utils.pyramid_functions import (
+    load_histogram_pyramid,
+    save_histogram_pyramid,
+)
+from publications.utils.sketch_functions import DEFAULT_QUANTILES, QuantileSketch
+from publications.utils.tar_functions import (
+    COPY_BUFFER_SIZE,
+    check_tar_file,
+    copy_file_with_checksum,
+    get_file_checksum,
+    iter_tar_file,
+)
 from publications.utils.misc import check_publication_management_user
 
+logger = logging.getLogger(__name__)
+
 
 class Keyword(models.Model):
     class Meta:
@@ -41,6 +90,19 @@ class Keyword(models.Model):
         return cls.objects.filter(id__in=ids)
 
 
+def copy_model_instance(instance, **kwargs):
+    """
+    Saves a copy of a model instance as a new row, with the fields in kwargs (by attribute name, e.g. group_id)
+    replaced
+    """
+    fields = {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+    }
+    return type(instance).objects.create(**{**fields, **kwargs})
+
+
 def job_directory_path(instance, filename):
     """
     a callable to generate a custom directory path to upload file to
@@ -55,6 +117,40 @@ def job_directory_path(instance, filename):
     return os.path.join("publications", dataset_id, model_id, fname)
 
 
+# The directory within MEDIA_ROOT in which uploaded files are stored by their checksum, see store_blob
+BLOB_DIRECTORY = "blobs"
+
+
+def blob_path(sha256, filename):
+    """
+    Returns the path within MEDIA_ROOT of a file stored by the SHA-256 of its contents. Each file has its own
+    directory, so anything derived from the file and stored next to it is shared by every upload of the file
+    """
+    return os.path.join(
+        BLOB_DIRECTORY, sha256[:2], sha256, os.path.basename(filename).replace(" ", "_")
+    )
+
+
+def store_blob(path, sha256, filename):
+    """
+    Moves a file into the blob store, returning its path within MEDIA_ROOT. If a file with the same contents is
+    already stored, whatever its name, the file is removed and the stored file is returned instead
+    """
+    existing = (
+        Upload.objects.filter(sha256=sha256, file__startswith=f"{BLOB_DIRECTORY}/")
+        .values_list("file", flat=True)
+        .first()
+    )
+    if existing and default_storage.exists(existing):
+        os.unlink(path)
+        return existing
+
+    name = blob_path(sha256, filename)
+    Path(default_storage.path(name)).parent.mkdir(parents=True, exist_ok=True)
+    os.replace(path, default_storage.path(name))
+    return name
+
+
 class CompasPublication(models.Model):
     class Meta:
         ordering = ["title"]
@@ -146,6 +242,18 @@ class CompasModel(models.Model):
         model.save()
 
 
+class IngestStatus(models.TextChoices):
+    """
+    The stages of ingesting the uploaded file of a dataset model, see CompasDatasetModel.ingest
+    """
+
+    UPLOADED = "uploaded"
+    EXTRACTING = "extracting"
+    INDEXING = "indexing"
+    READY = "ready"
+    FAILED = "failed"
+
+
 class CompasDatasetModel(models.Model):
     compas_publication = models.ForeignKey(
         CompasPublication, models.CASCADE, related_name="dataset_models"
@@ -154,6 +262,11 @@ class CompasDatasetModel(models.Model):
     file = models.FileField(
         upload_to=job_directory_path, blank=True, null=True, max_length=255
     )
+    ingest_status = models.CharField(
+        max_length=16, choices=IngestStatus.choices, default=IngestStatus.READY
+    )
+    # The reason ingesting the uploaded file failed, if it did
+    ingest_error = models.TextField(blank=True, null=True)
 
     @classmethod
     def create_dataset_model(cls, compas_publication, compas_model, file):
@@ -163,10 +276,20 @@ class CompasDatasetModel(models.Model):
 
     @classmethod
     def delete_dataset_model(cls, _id):
-        # Clean up any related Upload files
+        # Clean up any related Upload files. Files in the blob store are only deleted with the last dataset model
+        # that references them, along with anything derived from them
         obj = cls.objects.get(id=_id)
-        for file in obj.upload_set.all():
-            file.file.delete()
+        for upload in obj.upload_set.all():
+            if upload.is_shared():
+                continue
+
+            if Path(upload.file.name).suffix == ".h5":
+                h5_file_pool.discard(upload.file.path)
+                artefact_dir = Path(upload.file.path).parent / ".artefacts"
+                for path in artefact_dir.rglob("*.h5"):
+                    h5_file_pool.discard(path)
+                shutil.rmtree(artefact_dir, ignore_errors=True)
+            upload.delete_file()
 
         # Clean up the original uploaded file
         cls.objects.get(id=_id).file.delete()
@@ -188,69 +311,713 @@ class CompasDatasetModel(models.Model):
         """
         overwrites default save behavior
         """
-        # Validate uploaded file has one and only one h5 file
-        # Can't check with is_tarfile because it requires a path, and the file hasn't been written to disk yet
-        if self.file.name:
-            try:
-                with tarfile.open(fileobj=self.file) as f:
-                    if sum(Path(name).suffix == ".h5" for name in f.getnames()) != 1:
-                        raise ValidationError(
-                            "Dataset must have exactly one assigned h5 file"
-                        )
-            except tarfile.ReadError:
-                if Path(self.file.name).suffix != ".h5":
-                    raise ValidationError("Uploaded dataset should be a .h5 file")
+        # Validate uploaded file is either an archive or a h5 file. Only the start of an archive is read here, the
+        # archive is checked to have one and only one h5 file as it is extracted, see decompress_tar_file
+        if (
+            self.file.name
+            and Path(self.file.name).suffix != ".h5"
+            and not check_tar_file(self.file)
+        ):
+            raise ValidationError("Uploaded dataset should be a .h5 file")
+
+        # A newly uploaded file is extracted and indexed by a background worker, as this can take minutes for large
+        # datasets
+        ingest = self._state.adding and bool(self.file.name)
+        if ingest:
+            self.ingest_status = IngestStatus.UPLOADED
 
         super().save(*args, **kwargs)
-        # Check file name is not empty after saving the model and uploading file
-        if self.file.name and not self.upload_set.exists():
+        if ingest:
+            from publications.tasks import ingest_dataset_model
+
+            transaction.on_commit(
+                lambda: ingest_dataset_model.delay(self.id), robust=True
+            )
+
+    def set_ingest_status(self, status, error=None):
+        # Only the status is updated, as saving the model would validate the uploaded file again
+        self.ingest_status, self.ingest_error = status, error
+        CompasDatasetModel.objects.filter(id=self.id).update(
+            ingest_status=status, ingest_error=error
+        )
+
+    def ingest(self):
+        """
+        Extracts the uploaded file, records each file it contains as an Upload and indexes the data file, recording
+        each stage in ingest_status. Once the dataset model is ready, its histogram pyramids and join indexes are
+        built by background workers
+        """
+        try:
+            self.set_ingest_status(IngestStatus.EXTRACTING)
             # Check the uploaded file could be decompressed using tarfile
             if tarfile.is_tarfile(self.file.path):
                 self.decompress_tar_file()
             # If the uploaded file is an individual file
             else:
-                Upload.create_upload(self.file.name, self)
+                size, sha256 = get_file_checksum(self.file.path)
+                name = store_blob(self.file.path, sha256, self.file.name)
+                Upload.create_upload(
+                    name, self, size, sha256, os.path.basename(self.file.name)
+                )
+                # The uploaded file has been moved into the blob store
+                self.file = None
+                CompasDatasetModel.objects.filter(id=self.id).update(file=None)
+
+            self.set_ingest_status(IngestStatus.INDEXING)
+            # The index and anything derived from the data file are shared with any other dataset model with the
+            # same data file, so are only built once
+            shared = self.copy_shared_index()
+            if not shared:
+                self.index_data_file()
+        except Exception as e:
+            logger.exception(f"Unable to ingest the uploaded file of {self}")
+            self.set_ingest_status(IngestStatus.FAILED, str(e))
+            return
+
+        self.set_ingest_status(IngestStatus.READY)
+        if shared:
+            return
+
+        from publications.tasks import (
+            build_histogram_pyramids,
+            build_seed_indexes,
+            repack_data_file,
+        )
+
+        # Building the histogram pyramids and join indexes reads every row, so is left to other background workers
+        transaction.on_commit(
+            lambda: build_histogram_pyramids.delay(self.id), robust=True
+        )
+        transaction.on_commit(lambda: build_seed_indexes.delay(self.id), robust=True)
+        if settings.REPACK_DATA_FILES:
+            transaction.on_commit(lambda: repack_data_file.delay(self.id), robust=True)
 
     def decompress_tar_file(self):
-        # Get the actual path for uploaded file
-        dataset_dir = os.path.dirname(self.file.path)
-        dataset_tar = tarfile.open(self.file.path)
-
-        for member in dataset_tar.getmembers():
-            # ignore any directory but include its contents
-            if not member.isdir():
-                # extract files into dataset directory
-                # (this will create subdirectories as well, exactly as in the tarball)
-                dataset_tar.extract(member, dataset_dir)
+        """
+        Extracts the uploaded archive into the dataset directory, recording the size and checksum of each file as
+        it is extracted. The archive is read once as a stream, and must contain one and only one h5 file
+        """
+        dataset_dir = Path(self.file.path).parent
+        blob_dir = Path(default_storage.path(BLOB_DIRECTORY))
+        h5_count = 0
+        try:
+            for member, source in iter_tar_file(self.file.path, dataset_dir):
+                if Path(member.name).suffix == ".h5":
+                    h5_count += 1
+                    if h5_count > 1:
+                        raise ValueError(
+                            "Dataset must have exactly one assigned h5 file"
+                        )
+
+                # The file is extracted into the blob store, then stored by its checksum
+                path = blob_dir / f"{uuid.uuid4().hex}.extract"
+                size, sha256 = copy_file_with_checksum(source, path)
                 Upload.create_upload(
-                    os.path.join(os.path.dirname(self.file.name), member.name), self
+                    store_blob(path, sha256, member.name),
+                    self,
+                    size,
+                    sha256,
+                    member.name,
                 )
 
-        dataset_tar.close()
+            if h5_count != 1:
+                raise ValueError("Dataset must have exactly one assigned h5 file")
+        except Exception:
+            # Remove anything extracted before the archive was found to be invalid
+            for upload in self.upload_set.all():
+                upload.delete_file()
+            self.upload_set.all().delete()
+            raise
+
         # remove the tar file after decompression
         self.file.delete()
 
     def get_data_file(self):
         return self.upload_set.get(file__iendswith=".h5").file
 
+    def index_data_file(self):
+        """
+        Records the groups and subgroups of the data file in the database, so that plot metadata
+        can be served without opening the file
+        """
+        with open_h5_file(self.get_data_file().path) as f:
+            schema = get_h5_schema(f)
+
+            self.groups.all().delete()
+            for group_name, subgroups in schema:
+                group = DatasetGroup.objects.create(
+                    dataset_model=self,
+                    name=group_name,
+                    length=subgroups[0]["length"] if subgroups else 0,
+                )
+                DatasetSubgroup.objects.bulk_create(
+                    [DatasetSubgroup(group=group, **subgroup) for subgroup in subgroups]
+                )
+
+                # Statistics are computed over the full columns, in a streaming pass over each column. Derived
+                # columns are only computed when they are first used, so their statistics are computed then
+                for subgroup in group.subgroups.filter(is_derived=False):
+                    ColumnStatistics.create_statistics(
+                        subgroup, f[group_name][subgroup.name]
+                    )
+
+    def copy_shared_index(self):
+        """
+        Copies the groups, subgroups and column statistics of another dataset model with the same data file, so
+        that the data file isn't read again. Returns whether there was an index to copy
+        """
+        dataset_model = (
+            CompasDatasetModel.objects.filter(
+                upload__file=self.get_data_file().name, groups__isnull=False
+            )
+            .exclude(id=self.id)
+            .distinct()
+            .first()
+        )
+        if dataset_model is None:
+            return False
+
+        self.groups.all().delete()
+        for source_group in dataset_model.groups.all():
+            group = copy_model_instance(source_group, dataset_model_id=self.id)
+            for source_subgroup in source_group.subgroups.all():
+                subgroup = copy_model_instance(source_subgroup, group_id=group.id)
+                statistics = ColumnStatistics.objects.filter(
+                    subgroup=source_subgroup
+                ).first()
+                if statistics is not None:
+                    copy_model_instance(statistics, subgroup_id=subgroup.id)
+
+        return True
+
+    def get_column_statistics(self, root_group, subgroups):
+        """
+        Returns the precomputed statistics of the full columns of the specified subgroups, keyed by subgroup
+        name, computing any that are missing. Subgroups without statistics (e.g. strings) are not included
+        """
+        if not self.groups.exists():
+            self.index_data_file()
+
+        group = self.groups.get(name=root_group)
+        statistics = {
+            s.subgroup.name: s
+            for s in ColumnStatistics.objects.filter(
+                subgroup__group=group, subgroup__name__in=subgroups
+            ).select_related("subgroup")
+        }
+
+        missing = group.subgroups.filter(name__in=subgroups).exclude(
+            name__in=statistics.keys()
+        )
+        if missing.exists():
+            with self.open_data_file() as f:
+                for subgroup in missing:
+                    stats = ColumnStatistics.create_statistics(
+                        subgroup, f[root_group][subgroup.name]
+                    )
+                    if stats is not None:
+                        statistics[subgroup.name] = stats
+
+        return {name: stats.as_dict() for name, stats in statistics.items()}
+
+    @contextmanager
+    def open_data_file(self):
+        """
+        Context manager returning the data file from the pool of open H5 files, in which the derived columns of
+        each group can be read like stored columns, see DerivedH5File. Each derived column is computed and saved
+        next to the data file the first time it is read. The repacked copy of the data file is read instead if
+        there is one, see repack_data_file
+        """
+        path = self.get_repacked_data_file_path()
+        if not path.exists():
+            path = self.get_data_file().path
+
+        with ExitStack() as stack:
+            columns = {}
+
+            def open_column(root_group, subgroup):
+                if (root_group, subgroup) not in columns:
+                    path = self.get_derived_column_path(root_group, subgroup)
+                    if not path.exists():
+                        self.build_derived_column(h5_file, root_group, subgroup)
+                    derived_file = stack.enter_context(open_h5_file(path))
+                    columns[root_group, subgroup] = derived_file[root_group][subgroup]
+                return columns[root_group, subgroup]
+
+            h5_file = stack.enter_context(open_h5_file(path))
+            yield DerivedH5File(h5_file, open_column)
+
+    def get_artefact_dir(self):
+        # Files derived from the data file are stored in a hidden directory next to it
+        return Path(self.get_data_file().path).parent / ".artefacts"
+
+    def get_repacked_data_file_path(self):
+        return self.get_artefact_dir() / "repacked.h5"
+
+    def repack_data_file(self):
+        """
+        Writes a copy of the data file laid out for reading whole columns next to it, which is read for plots
+        instead of the data file, see repack_h5_file. The data file is left unchanged for download
+        """
+        path = self.get_repacked_data_file_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open_h5_file(self.get_data_file().path) as f:
+            repack_h5_file(f, temp_path)
+        os.replace(temp_path, path)
+
+    def get_derived_column_path(self, root_group, subgroup):
+        key = hashlib.sha256(json.dumps([root_group, subgroup]).encode()).hexdigest()
+        return self.get_artefact_dir() / "derived" / f"{key}.h5"
+
+    def build_derived_column(self, h5_file, root_group, subgroup):
+        """
+        Computes a derived column of a group from the open data file, and saves it next to the data file, see
+        save_h5_derived_column
+        """
+        path = self.get_derived_column_path(root_group, subgroup)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        save_h5_derived_column(h5_file, root_group, subgroup, temp_path)
+        os.replace(temp_path, path)
+
+    def get_histogram_pyramid_path(self, root_group, subgroup_x, subgroup_y):
+        key = hashlib.sha256(
+            json.dumps([root_group, subgroup_x, subgroup_y]).encode()
+        ).hexdigest()
+        return self.get_artefact_dir() / "pyramids" / f"{key}.npz"
+
+    def get_sample_indices(self, root_group):
+        """
+        Returns the row indices of the random sample of a group, saving them next to the data file so
+        that every plot of the group uses the same sample without recomputing it
+        """
+        group = self.groups.get(name=root_group)
+        sample_size = get_sample_size(group.length)
+        if sample_size >= group.length:
+            return np.arange(group.length)
+
+        path = (
+            self.get_artefact_dir()
+            / "samples"
+            / f"random_{group.length}_{sample_size}_{SAMPLE_SEED}.npy"
+        )
+        if path.exists():
+            return np.load(path)
+
+        indices = get_random_sample_indices(group.length, sample_size, SAMPLE_SEED)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, indices)
+        os.replace(temp_path, path)
+        return indices
+
+    def get_filter_mask(self, root_group, expression):
+        """
+        Returns the boolean mask of the rows of a group that match a filter expression, see parse_filter.
+        Masks are saved next to the data file as compressed bitsets, so repeating a filter only has to
+        load the bitset
+        """
+        if not self.groups.exists():
+            self.index_data_file()
+
+        group = self.groups.get(name=root_group)
+        tree = parse_filter(expression, group.subgroups.values_list("name", flat=True))
+        key = hashlib.sha256(
+            json.dumps([root_group, format_filter(tree)]).encode()
+        ).hexdigest()
+        path = self.get_artefact_dir() / "filters" / f"{key}.npz"
+        if path.exists():
+            with np.load(path) as data:
+                bits, length = data["bits"], int(data["length"])
+            return np.unpackbits(bits, count=length).astype(bool)
+
+        with self.open_data_file() as f:
+            mask = get_h5_filter_mask(f, root_group, tree)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "wb") as f:
+            np.savez_compressed(f, bits=np.packbits(mask), length=len(mask))
+        os.replace(temp_path, path)
+        return mask
+
+    def build_histogram_pyramid(self, root_group, subgroup_x, subgroup_y):
+        """
+        Builds the multi-resolution histogram pyramid of a pair of subgroups from every row of the data file,
+        and saves it next to the data file. Returns the pyramid and its plot metadata, or None if one of the
+        subgroups has a dtype of string
+        """
+        statistics = self.get_column_statistics(root_group, [subgroup_x, subgroup_y])
+        with self.open_data_file() as f:
+            result = get_h5_subgroup_pyramid(
+                f, root_group, subgroup_x, subgroup_y, statistics=statistics
+            )
+
+        if result is not None:
+            path = self.get_histogram_pyramid_path(root_group, subgroup_x, subgroup_y)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so a partially written pyramid is never read
+            temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(temp_path, "wb") as f:
+                save_histogram_pyramid(f, *result)
+            os.replace(temp_path, path)
+
+        return result
+
+    def get_histogram_pyramid(self, root_group, subgroup_x, subgroup_y):
+        """
+        Returns the histogram pyramid of a pair of subgroups and its plot metadata, building it on demand
+        if it hasn't been built yet
+        """
+        path = self.get_histogram_pyramid_path(root_group, subgroup_x, subgroup_y)
+        if path.exists():
+            return load_histogram_pyramid(path)
+        return self.build_histogram_pyramid(root_group, subgroup_x, subgroup_y)
+
+    def build_default_histogram_pyramids(self):
+        """
+        Builds the histogram pyramids of the default subgroups of each group in the data file
+        """
+        if not self.groups.exists():
+            self.index_data_file()
+
+        for group in self.groups.all():
+            subgroups = default_prefs.get(group.name)
+            if subgroups and group.subgroups.filter(name__in=subgroups).count() == 2:
+                self.build_histogram_pyramid(group.name, *subgroups)
+
+    def get_seed_index_path(self, root_group):
+        key = hashlib.sha256(json.dumps([root_group]).encode()).hexdigest()
+        return self.get_artefact_dir() / "seeds" / f"{key}.npz"
+
+    def build_seed_index(self, root_group):
+        """
+        Builds the SEED join index of a group and saves it next to the data file, see build_seed_index.
+        Returns None if the group doesn't have a SEED column
+        """
+        with self.open_data_file() as f:
+            index = get_h5_seed_index(f, root_group)
+
+        if index is not None:
+            path = self.get_seed_index_path(root_group)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            with open(temp_path, "wb") as f:
+                save_seed_index(f, index)
+            os.replace(temp_path, path)
+
+        return index
+
+    def get_seed_index(self, root_group):
+        """
+        Returns the SEED join index of a group, building it on demand if it hasn't been built yet
+        """
+        path = self.get_seed_index_path(root_group)
+        if path.exists():
+            return load_seed_index(path)
+        return self.build_seed_index(root_group)
+
+    def build_seed_indexes(self):
+        """
+        Builds the SEED join indexes of every group in the data file that has a SEED column
+        """
+        if not self.groups.exists():
+            self.index_data_file()
+
+        for group in self.groups.filter(subgroups__name=SEED_COLUMN):
+            self.build_seed_index(group.name)
+
+    def get_seed_join(self, root_group_x, root_group_y):
+        """
+        Returns the row indices of the pairs of rows of two groups that belong to the same system, see
+        join_seed_indexes
+
+        Raises
+        ------
+        ValueError
+            If either group doesn't have a SEED column
+        """
+        indexes = [self.get_seed_index(g) for g in [root_group_x, root_group_y]]
+        if None in indexes:
+            raise ValueError(
+                f"Groups must have a {SEED_COLUMN} column to be plotted together"
+            )
+        return join_seed_indexes(*indexes)
+
+    def get_column_summary(self, root_group, subgroup, bins=40, quantiles=None):
+        """
+        Returns the 1D histogram of the full column of a subgroup, with the same logging and limits as a plot
+        axis, and quantiles of the column estimated from its quantile sketch. Returns None for subgroups without
+        statistics (e.g. strings)
+        """
+        quantiles = DEFAULT_QUANTILES if quantiles is None else quantiles
+        statistics = self.get_column_statistics(root_group, [subgroup])
+        if subgroup not in statistics:
+            return None
+
+        column_statistics = ColumnStatistics.objects.select_related("subgroup").get(
+            subgroup__group__dataset_model=self,
+            subgroup__group__name=root_group,
+            subgroup__name=subgroup,
+        )
+        with self.open_data_file() as f:
+            dataset = f[root_group][subgroup]
+            sketch = column_statistics.get_quantile_sketch(dataset)
+            histogram = get_h5_column_histogram(
+                f, root_group, subgroup, bins, statistics[subgroup]
+            )
+
+        return {
+            "group": root_group,
+            "subgroup": subgroup,
+            "unit": column_statistics.subgroup.units,
+            "count": column_statistics.count,
+            "null_count": column_statistics.nan_count + column_statistics.inf_count,
+            "min": column_statistics.min,
+            "max": column_statistics.max,
+            **histogram,
+            "quantiles": [
+                {"quantile": quantile, "value": value}
+                for quantile, value in zip(quantiles, sketch.quantiles(quantiles))
+            ],
+        }
+
+    def get_plot_meta(self, **kwargs):
+        """
+        Returns the plot metadata for a group of the data file from the schema index, indexing the
+        data file first if it hasn't been indexed yet. Raises ValueError if the data file can't be read,
+        or if a group or subgroup isn't in it
+        """
+        if not self.groups.exists():
+            try:
+                self.index_data_file()
+            except OSError:
+                logger.warning(
+                    f"Unable to index the data file of {self}", exc_info=True
+                )
+
+        groups = {g.name: g for g in self.groups.all()}
+        if not groups:
+            raise ValueError("The data file of this dataset model can't be read.")
+
+        root_group = kwargs.get("root_group") or next(iter(groups))
+        root_group_y = kwargs.get("root_group_y") or root_group
+        for name in [root_group, root_group_y]:
+            if name not in groups:
+                raise ValueError(f"Unknown group {name}.")
+
+        group = groups[root_group]
+        subgroups = {s.name: s for s in group.subgroups.all()}
+        subgroup_list = list(subgroups.keys())
+
+        subgroups_y = {s.name: s for s in groups[root_group_y].subgroups.all()}
+        subgroup_list_y = list(subgroups_y.keys())
+
+        subgroup_x, _ = get_plot_subgroups(
+            root_group,
+            subgroup_list,
+            kwargs.get("subgroup_x"),
+            kwargs.get("subgroup_y"),
+        )
+        # The y axis can come from a different group, joined on SEED
+        _, subgroup_y = get_plot_subgroups(
+            root_group_y,
+            subgroup_list_y,
+            kwargs.get("subgroup_x"),
+            kwargs.get("subgroup_y"),
+        )
+        if subgroup_x not in subgroups:
+            raise ValueError(f"Unknown subgroup {subgroup_x}.")
+        if subgroup_y not in subgroups_y:
+            raise ValueError(f"Unknown subgroup {subgroup_y}.")
+
+        stride_length = kwargs.get("stride_length") or get_stride_length(group.length)
+        sampling = kwargs.get("sampling", "stride")
+
+        return {
+            "groups": [name for name in groups if name not in ["Run_Details"]],
+            "group": root_group,
+            "subgroups": subgroup_list,
+            "subgroup_x": subgroup_x,
+            "subgroup_y": subgroup_y,
+            "group_y": root_group_y,
+            "subgroups_y": subgroup_list_y,
+            "subgroup_x_unit": subgroups[subgroup_x].units,
+            "subgroup_y_unit": subgroups_y[subgroup_y].units,
+            "stride_length": stride_length,
+            "total_length": group.length,
+            "sampling": sampling,
+            "sample_fraction": get_sample_fraction(
+                group.length, sampling, stride_length
+            ),
+        }
+
 
 class Upload(models.Model):
     file = models.FileField(blank=True, null=True, max_length=255)
     dataset_model = models.ForeignKey(CompasDatasetModel, models.CASCADE)
 
+    # The size in bytes and hexadecimal SHA-256 of the file, recorded when it is extracted
+    size = models.BigIntegerField(blank=True, null=True)
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+    # The path of the file within the uploaded archive, as files in the blob store are stored by their checksum
+    path = models.CharField(max_length=255, blank=True, null=True)
+
     # create an Upload model for an uploaded file
     @classmethod
-    def create_upload(cls, filepath, dataset_model):
+    def create_upload(cls, filepath, dataset_model, size=None, sha256=None, path=None):
         """
         filepath is the relative path of the uploaded file within MEDIA_ROOT
         """
         upload = Upload()
         upload.file = filepath
         upload.dataset_model = dataset_model
+        upload.size = size
+        upload.sha256 = sha256
+        upload.path = path
         upload.save()
 
+    def is_shared(self):
+        # Whether the file is referenced by an upload of any other dataset model, which is the case for files in
+        # the blob store that have been uploaded more than once
+        return (
+            Upload.objects.filter(file=self.file.name)
+            .exclude(dataset_model_id=self.dataset_model_id)
+            .exists()
+        )
+
+    def delete_file(self):
+        """
+        Deletes the file unless it is shared with another upload, removing its directory in the blob store
+        """
+        if self.is_shared():
+            return
+
+        name = self.file.name
+        self.file.delete(save=False)
+        if name.startswith(f"{BLOB_DIRECTORY}/"):
+            shutil.rmtree(Path(default_storage.path(name)).parent, ignore_errors=True)
+
+    def __str__(self):
+        return os.path.basename(self.path or self.file.name)
+
+
+class DatasetGroup(models.Model):
+    """
+    A top level group of the data file of a dataset model, recorded when the dataset is uploaded
+    """
+
+    class Meta:
+        ordering = ["id"]
+        unique_together = ["dataset_model", "name"]
+
+    dataset_model = models.ForeignKey(
+        CompasDatasetModel, models.CASCADE, related_name="groups"
+    )
+    name = models.CharField(max_length=255)
+    # The number of rows in the group, taken from its first subgroup
+    length = models.BigIntegerField()
+
+    def __str__(self):
+        return self.name
+
+
+class DatasetSubgroup(models.Model):
+    """
+    A dataset (column) within a group of the data file of a dataset model
+    """
+
+    class Meta:
+        ordering = ["id"]
+        unique_together = ["group", "name"]
+
+    group = models.ForeignKey(DatasetGroup, models.CASCADE, related_name="subgroups")
+    name = models.CharField(max_length=255)
+    dtype = models.CharField(max_length=64)
+    units = models.CharField(max_length=255, null=True)
+    length = models.BigIntegerField()
+    is_bool = models.BooleanField(default=False)
+    # Whether the subgroup is computed from other subgroups of the group rather than stored, see DERIVED_COLUMNS
+    is_derived = models.BooleanField(default=False)
+
     def __str__(self):
-        return os.path.basename(self.file.name)
+        return self.name
+
+
+class ColumnStatistics(models.Model):
+    """
+    Summary statistics of the full column of a numeric subgroup, computed once when the dataset is indexed so that
+    plots don't need to scan the data to decide on logging and limits
+    """
+
+    subgroup = models.OneToOneField(
+        DatasetSubgroup, models.CASCADE, related_name="statistics"
+    )
+    count = models.BigIntegerField()
+    nan_count = models.BigIntegerField()
+    inf_count = models.BigIntegerField()
+    zero_count = models.BigIntegerField()
+    # The min, max and minimum positive value of the finite values in the column
+    min = models.FloatField(null=True)
+    max = models.FloatField(null=True)
+    min_positive = models.FloatField(null=True)
+    # The logging decision and plot limits, see get_log_decision
+    log_check = models.BooleanField(default=False)
+    null_check = models.BooleanField(default=False)
+    plot_min = models.FloatField(null=True)
+    plot_max = models.FloatField(null=True)
+    # The quantile sketch of the finite values in the column, see QuantileSketch.to_dict
+    quantile_sketch = models.JSONField(null=True)
+
+    @classmethod
+    def create_statistics(cls, subgroup, dataset):
+        """
+        Computes and stores the statistics of a subgroup from its H5 dataset, returning None for non-numeric
+        subgroups
+        """
+        if np.dtype(subgroup.dtype).kind not in "biuf" or dataset.ndim != 1:
+            return None
+
+        sketch = QuantileSketch()
+        stats = get_column_statistics(dataset, sketch=sketch)
+
+        log_check, (plot_min, plot_max), null_check = False, (None, None), False
+        if stats["min"] is not None:
+            log_check, (plot_min, plot_max), null_check, _ = get_log_decision(
+                stats["min"], stats["max"], stats["min_positive"], subgroup.is_bool
+            )
+
+        return cls.objects.create(
+            subgroup=subgroup,
+            log_check=log_check,
+            null_check=null_check,
+            plot_min=plot_min,
+            plot_max=plot_max,
+            quantile_sketch=sketch.to_dict(),
+            **stats,
+        )
+
+    def get_quantile_sketch(self, dataset):
+        """
+        Returns the quantile sketch of the column, computing and storing it from the H5 dataset if the column was
+        indexed before sketches were stored
+        """
+        if self.quantile_sketch is None:
+            sketch = QuantileSketch()
+            get_column_statistics(dataset, sketch=sketch)
+            self.quantile_sketch = sketch.to_dict()
+            self.save(update_fields=["quantile_sketch"])
+        return QuantileSketch.from_dict(self.quantile_sketch)
+
+    def as_dict(self):
+        return {
+            "min": self.min,
+            "max": self.max,
+            "min_positive": self.min_positive,
+            "is_bool": self.subgroup.is_bool,
+        }
 
 
 class CompasDatasetModelUploadToken(models.Model):
@@ -295,14 +1062,246 @@ class CompasDatasetModelUploadToken(models.Model):
     @classmethod
     def prune(cls):
         """
-        Removes any expired tokens from the database
+        Removes any expired tokens from the database. Tokens being used for a chunked upload expire once no part
+        has been uploaded for the expiry instead, so that large uploads can take longer than the expiry
         """
-        cls.objects.filter(
-            created__lt=timezone.now()
-            - datetime.timedelta(
-                seconds=settings.COMPAS_DATASET_MODEL_UPLOAD_TOKEN_EXPIRY
+        expired = timezone.now() - datetime.timedelta(
+            seconds=settings.COMPAS_DATASET_MODEL_UPLOAD_TOKEN_EXPIRY
+        )
+        tokens = cls.objects.filter(created__lt=expired).exclude(
+            chunked_upload__updated__gte=expired
+        )
+
+        # Remove the partial files of any unfinished chunked uploads, which are deleted with their tokens
+        for chunked_upload in ChunkedDatasetModelUpload.objects.filter(
+            upload_token__in=tokens
+        ):
+            Path(chunked_upload.get_partial_path()).unlink(missing_ok=True)
+
+        tokens.delete()
+
+
+class ChunkedDatasetModelUpload(models.Model):
+    """
+    A dataset model file being uploaded in fixed-size parts with a CompasDatasetModelUploadToken, see
+    publications.views.dataset_model_upload_part. Parts are written in order to a partial file in the dataset
+    directory, and each is acknowledged once it has been written, so an interrupted upload can be resumed from the
+    last acknowledged offset. Once every part has been received the partial file is renamed in place
+    """
+
+    upload_token = models.OneToOneField(
+        CompasDatasetModelUploadToken, models.CASCADE, related_name="chunked_upload"
+    )
+    compas_publication = models.ForeignKey(CompasPublication, models.CASCADE)
+    compas_model = models.ForeignKey(CompasModel, models.CASCADE)
+    # The path of the uploaded file within MEDIA_ROOT once it has been assembled, see job_directory_path
+    file_name = models.CharField(max_length=255)
+    # The size of the file in bytes
+    size = models.BigIntegerField()
+    # The size of each part in bytes, except the last part which may be smaller
+    part_size = models.BigIntegerField()
+    # The hexadecimal SHA-256 of the whole file, checked once every part has been received if it is given
+    sha256 = models.CharField(max_length=64, blank=True, null=True)
+    # The number of bytes of the file that have been received and acknowledged
+    offset = models.BigIntegerField(default=0)
+    # When a part was last received
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def create(
+        cls,
+        upload_token,
+        compas_publication,
+        compas_model,
+        file_name,
+        size,
+        sha256=None,
+    ):
+        """
+        Starts a chunked upload with an upload token, or returns the existing chunked upload of the token so it can
+        be resumed. If the hexadecimal SHA-256 of the whole file is given, the file is checked against it once it
+        has been uploaded
+        """
+        if not os.path.basename(file_name):
+            raise ValueError("Uploaded file must have a name")
+        if size <= 0:
+            raise ValueError("Uploaded file must not be empty")
+
+        chunked_upload = cls(
+            upload_token=upload_token,
+            compas_publication=compas_publication,
+            compas_model=compas_model,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+            part_size=settings.COMPAS_DATASET_MODEL_UPLOAD_PART_SIZE,
+        )
+        # Only the name of the file is used, so that it can't be written outside the dataset directory
+        chunked_upload.file_name = job_directory_path(
+            chunked_upload, os.path.basename(file_name)
+        )
+
+        existing = cls.objects.filter(upload_token=upload_token).first()
+        if not existing:
+            chunked_upload.save()
+            return chunked_upload
+
+        if (
+            existing.compas_publication,
+            existing.compas_model,
+            existing.file_name,
+            existing.size,
+            existing.sha256,
+        ) != (
+            compas_publication,
+            compas_model,
+            chunked_upload.file_name,
+            size,
+            chunked_upload.sha256,
+        ):
+            raise ValueError(
+                "Upload token is already being used to upload a different file"
             )
-        ).delete()
+        return existing
+
+    def get_partial_path(self):
+        return os.path.join(
+            settings.MEDIA_ROOT, f"{self.file_name}.{self.upload_token.token}.part"
+        )
+
+    def write_part(self, offset, source, sha256):
+        """
+        Writes the part of the file starting at offset, read from a file object, to the partial file and
+        acknowledges it if it is the expected size and its hexadecimal SHA-256 matches sha256. A part before the
+        acknowledged offset has already been received, so is ignored
+
+        Returns the acknowledged offset, from which the next part should be uploaded
+        """
+        with transaction.atomic():
+            # Lock the chunked upload while the part is written and acknowledged, so that a part that is retried
+            # while the original request is still writing it can't overwrite or truncate an acknowledged part
+            chunked_upload = (
+                ChunkedDatasetModelUpload.objects.select_for_update()
+                .filter(id=self.id)
+                .first()
+            )
+            if chunked_upload is None:
+                raise ValueError("The upload has already been finished")
+            self.offset = chunked_upload.offset
+
+            if offset < self.offset:
+                return self.offset
+            if offset > self.offset:
+                raise ValueError(
+                    f"Parts must be uploaded in order, the next part starts at {self.offset}"
+                )
+            if offset >= self.size:
+                raise ValueError("Every part of the file has already been uploaded")
+
+            part_size = min(self.part_size, self.size - offset)
+            path = Path(self.get_partial_path())
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            with open(path, "r+b" if path.exists() else "wb") as f:
+                # Anything after the acknowledged offset is left from a part that was interrupted
+                f.truncate(offset)
+                f.seek(offset)
+
+                part_sha256 = hashlib.sha256()
+                received = 0
+                # One more byte than the part size is read so that a part that is too large is found
+                while chunk := source.read(
+                    min(COPY_BUFFER_SIZE, part_size + 1 - received)
+                ):
+                    part_sha256.update(chunk)
+                    received += len(chunk)
+                    f.write(chunk)
+                    if received > part_size:
+                        break
+
+                if (
+                    received != part_size
+                    or part_sha256.hexdigest() != (sha256 or "").lower()
+                ):
+                    f.truncate(offset)
+                    if received != part_size:
+                        raise ValueError(
+                            f"Part starting at {offset} should be {part_size} bytes, but was at least {received} bytes"
+                        )
+                    raise ValueError(
+                        f"Part starting at {offset} doesn't match its SHA-256 checksum"
+                    )
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.offset = offset + part_size
+            ChunkedDatasetModelUpload.objects.filter(id=self.id).update(
+                offset=self.offset, updated=timezone.now()
+            )
+
+        return self.offset
+
+    def finish(self):
+        """
+        Renames the partial file of a completely uploaded file into the dataset directory and creates its dataset
+        model, which is then ingested like any other uploaded file. If the partial file isn't the size of the file,
+        or doesn't match the SHA-256 of the file given when the upload was started, the upload is started again
+        """
+        with transaction.atomic():
+            # Lock the chunked upload, so that only one of any concurrent requests to finish it creates a dataset
+            # model, and the others find it has already been finished
+            chunked_upload = (
+                ChunkedDatasetModelUpload.objects.select_for_update()
+                .filter(id=self.id)
+                .first()
+            )
+            if chunked_upload is None:
+                raise ValueError("The upload has already been finished")
+            if chunked_upload.offset != chunked_upload.size:
+                raise ValueError(
+                    f"Only {chunked_upload.offset} of {chunked_upload.size} bytes of the file have been uploaded"
+                )
+
+            partial_path = chunked_upload.get_partial_path()
+            error = chunked_upload.check_partial_file()
+            if error:
+                # There is no way to tell which parts are wrong, so every part must be uploaded again
+                Path(partial_path).unlink(missing_ok=True)
+                ChunkedDatasetModelUpload.objects.filter(id=self.id).update(
+                    offset=0, updated=timezone.now()
+                )
+            else:
+                file_name = default_storage.get_available_name(chunked_upload.file_name)
+                os.replace(partial_path, default_storage.path(file_name))
+
+                try:
+                    dataset_model = CompasDatasetModel.create_dataset_model(
+                        chunked_upload.compas_publication,
+                        chunked_upload.compas_model,
+                        file_name,
+                    )
+                    chunked_upload.delete()
+                except BaseException:
+                    # Move the file back, so that finishing the upload can be retried
+                    os.replace(default_storage.path(file_name), partial_path)
+                    raise
+
+        if error:
+            self.offset = 0
+            raise ValueError(f"{error}, so it must be uploaded again")
+        return dataset_model
+
+    def check_partial_file(self):
+        """
+        Returns why the partial file of a completely uploaded file isn't the uploaded file, or None if it is
+        """
+        path = self.get_partial_path()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size != self.size:
+            return f"The uploaded file is {size} bytes instead of {self.size} bytes"
+        if self.sha256 and get_file_checksum(path)[1] != self.sha256:
+            return "The uploaded file doesn't match its SHA-256 checksum"
+        return None
 
 
 class FileDownloadToken(models.Model):
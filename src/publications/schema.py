@@ -1,10 +1,9 @@
 from decimal import Decimal
 from pathlib import Path
 
-import h5py
-
 import graphene
 from graphene import relay
+from graphene.types.generic import GenericScalar
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
 from graphene_file_upload.scalars import Upload
@@ -13,15 +12,70 @@ from graphql_relay import from_global_id, to_global_id
 from compasui.utils.decorators import login_required, user_passes_test
 
 from publications.models import (
+    ChunkedDatasetModelUpload,
     Keyword,
     CompasPublication,
     CompasModel,
     CompasDatasetModel,
     CompasDatasetModelUploadToken,
     FileDownloadToken,
+    IngestStatus,
 )
 from publications.utils.misc import check_publication_management_user
-from publications.utils.h5_functions import get_h5_subgroup_meta, get_h5_subgroup_data
+from publications.utils.h5_functions import (
+    get_h5_joined_subgroup_data,
+    get_h5_subgroup_data,
+    get_h5_subgroup_data_batch,
+    get_h5_subgroup_data_streaming,
+)
+from publications.utils.plot_cache import (
+    get_cached_plot,
+    get_cached_plots,
+    get_plot_cache_key,
+)
+from publications.utils.pyramid_functions import hybrid_plot_from_pyramid
+
+# The maximum number of histogram bins in each dimension of a plot, to keep plot payloads bounded
+MAX_PLOT_BINS = 200
+
+# The maximum number of plots in a single plotDataBatch request
+MAX_PLOT_BATCH = 100
+
+
+def check_plot_bins(bins):
+    if not 1 <= bins <= MAX_PLOT_BINS:
+        raise GraphQLError(f"Plot bins must be between 1 and {MAX_PLOT_BINS}.")
+
+
+def check_stride_length(stride_length):
+    if stride_length is not None and stride_length < 1:
+        raise GraphQLError("Plot stride length must be at least 1.")
+
+
+def check_dataset_model_ready(dataset_model):
+    # The data file of a dataset model can't be read until its uploaded file has been ingested
+    if dataset_model.ingest_status != IngestStatus.READY:
+        raise GraphQLError(
+            f"Dataset model data file is not available, its upload is {dataset_model.ingest_status}."
+        )
+
+
+def get_plot_meta(dataset_model, **kwargs):
+    # Returns the plot metadata of the dataset model, for a group that may not be in its data file
+    try:
+        return dataset_model.get_plot_meta(**kwargs)
+    except ValueError as e:
+        raise GraphQLError(str(e))
+
+
+def get_filter_mask(dataset_model, root_group, expression):
+    # Returns the mask of rows matching the filter expression, or None if there is no filter
+    if not expression:
+        return None
+    try:
+        return dataset_model.get_filter_mask(root_group, expression)
+    except ValueError as e:
+        raise GraphQLError(f"Invalid filter: {e}")
 
 
 class KeywordNode(DjangoObjectType):
@@ -96,7 +150,39 @@ class CompasModelNode(DjangoObjectType):
         interfaces = (relay.Node,)
 
 
+class PlotDataEncoding(graphene.Enum):
+    JSON = "json"
+    LIST = "list"
+    BASE64 = "base64"
+
+
+class PlotSampling(graphene.Enum):
+    STRIDE = "stride"
+    RANDOM = "random"
+    RESERVOIR = "reservoir"
+
+
+class PlotColumnsType(graphene.ObjectType):
+    """
+    Columnar plot data, where each column is either a list of numbers or a base64 encoded
+    little-endian float32 buffer, depending on the requested encoding
+    """
+
+    encoding = graphene.String()
+    length = graphene.Int()
+    x = GenericScalar()
+    y = GenericScalar()
+    counts = GenericScalar()
+
+
+class PlotPairInput(graphene.InputObjectType):
+    subgroup_x = graphene.String(required=True)
+    subgroup_y = graphene.String(required=True)
+
+
 class PlotDataType(graphene.ObjectType):
+    subgroup_x = graphene.String()
+    subgroup_y = graphene.String()
     log_check_x = graphene.Boolean()
     log_check_y = graphene.Boolean()
     min_max_x = graphene.List(graphene.Float)
@@ -108,18 +194,46 @@ class PlotDataType(graphene.ObjectType):
     sides = graphene.List(graphene.Float)
     hist_data = graphene.String()
     scatter_data = graphene.String()
+    hist_columns = graphene.Field(PlotColumnsType)
+    scatter_columns = graphene.Field(PlotColumnsType)
 
 
 class PlotMetaType(graphene.ObjectType):
     groups = graphene.List(graphene.String)
     group = graphene.String()
     subgroups = graphene.List(graphene.String)
+    group_y = graphene.String()
+    subgroups_y = graphene.List(graphene.String)
     subgroup_x = graphene.String()
     subgroup_y = graphene.String()
     subgroup_x_unit = graphene.String()
     subgroup_y_unit = graphene.String()
     stride_length = graphene.Int()
     total_length = graphene.Int()
+    sampling = graphene.String()
+    sample_fraction = graphene.Float()
+
+
+class ColumnQuantileType(graphene.ObjectType):
+    quantile = graphene.Float()
+    value = graphene.Float()
+
+
+class ColumnSummaryType(graphene.ObjectType):
+    group = graphene.String()
+    subgroup = graphene.String()
+    unit = graphene.String()
+    count = graphene.Int()
+    null_count = graphene.Int()
+    min = graphene.Float()
+    max = graphene.Float()
+    log_check = graphene.Boolean()
+    null_check = graphene.Boolean()
+    bool_check = graphene.Boolean()
+    min_max = graphene.List(graphene.Float)
+    edges = graphene.List(graphene.Float)
+    counts = graphene.List(graphene.Int)
+    quantiles = graphene.List(ColumnQuantileType)
 
 
 class DatasetFile(graphene.ObjectType):
@@ -138,21 +252,52 @@ class CompasDatasetModelNode(DjangoObjectType):
     plot_meta = graphene.Field(
         PlotMetaType,
         root_group=graphene.String(),
+        root_group_y=graphene.String(),
         subgroup_x=graphene.String(),
         subgroup_y=graphene.String(),
         stride_length=graphene.Int(),
+        sampling=PlotSampling(default_value=PlotSampling.STRIDE),
     )
     plot_data = graphene.Field(
         PlotDataType,
         root_group=graphene.String(),
+        root_group_y=graphene.String(),
         subgroup_x=graphene.String(),
         subgroup_y=graphene.String(),
         stride_length=graphene.Int(),
+        sampling=PlotSampling(default_value=PlotSampling.STRIDE),
+        encoding=PlotDataEncoding(default_value=PlotDataEncoding.JSON),
+        streaming=graphene.Boolean(),
+        pyramid=graphene.Boolean(),
+        x_range=graphene.List(graphene.Float),
+        y_range=graphene.List(graphene.Float),
+        bins=graphene.Int(),
+        filter=graphene.String(),
+        weights_subgroup=graphene.String(),
+        weighted_split=graphene.Boolean(default_value=False),
+    )
+    plot_data_batch = graphene.List(
+        PlotDataType,
+        pairs=graphene.List(graphene.NonNull(PlotPairInput), required=True),
+        root_group=graphene.String(),
+        stride_length=graphene.Int(),
+        sampling=PlotSampling(default_value=PlotSampling.STRIDE),
+        encoding=PlotDataEncoding(default_value=PlotDataEncoding.JSON),
+        bins=graphene.Int(),
+        filter=graphene.String(),
+    )
+    row_count = graphene.Int(root_group=graphene.String(), filter=graphene.String())
+    column_summary = graphene.Field(
+        ColumnSummaryType,
+        subgroup=graphene.String(required=True),
+        root_group=graphene.String(),
+        bins=graphene.Int(),
+        quantiles=graphene.List(graphene.NonNull(graphene.Float)),
     )
 
     class Meta:
         model = CompasDatasetModel
-        fields = ["compas_publication", "compas_model"]
+        fields = ["compas_publication", "compas_model", "ingest_status", "ingest_error"]
         filter_fields = {
             "id": ["exact"],
             "compas_publication": ["exact"],
@@ -167,9 +312,11 @@ class CompasDatasetModelNode(DjangoObjectType):
         # Generate a dict that can be used to query the generated tokens
         token_dict = {tk.path: tk.token for tk in tokens}
 
-        # Generate a dict to remove the parent dirs
+        # Generate a dict to remove the parent dirs. Files in the blob store record their path in the archive
         output_path_dict = {
-            Path(f.file.path).absolute(): Path(*Path(f.file.name).parts[3:])
+            Path(f.file.path).absolute(): Path(
+                f.path if f.path else Path(*Path(f.file.name).parts[3:])
+            )
             for f in root.upload_set.all()
         }
 
@@ -184,6 +331,7 @@ class CompasDatasetModelNode(DjangoObjectType):
         ]
 
     def resolve_data_file(root, info, **kwargs):
+        check_dataset_model_ready(root)
         path = Path(root.get_data_file().path).absolute()
         tokens = FileDownloadToken.create(root, [path])
 
@@ -195,18 +343,291 @@ class CompasDatasetModelNode(DjangoObjectType):
         )
 
     def resolve_plot_meta(root, info, **kwargs):
-        f = h5py.File(Path(root.get_data_file().path).absolute())
-        return get_h5_subgroup_meta(f, **kwargs)
+        check_dataset_model_ready(root)
+        check_stride_length(kwargs.get("stride_length"))
+        return get_plot_meta(root, **{**kwargs, "sampling": kwargs["sampling"].value})
 
     def resolve_plot_data(root, info, **kwargs):
-        f = h5py.File(Path(root.get_data_file().path).absolute())
-        plot_meta = get_h5_subgroup_meta(f, **kwargs)
-        return get_h5_subgroup_data(
-            f,
-            root_group=plot_meta["group"],
-            subgroup_x=plot_meta["subgroup_x"],
-            subgroup_y=plot_meta["subgroup_y"],
-            stride_length=plot_meta["stride_length"],
+        check_dataset_model_ready(root)
+        check_stride_length(kwargs.get("stride_length"))
+        path = Path(root.get_data_file().path).absolute()
+        plot_meta = get_plot_meta(
+            root, **{**kwargs, "sampling": kwargs["sampling"].value}
+        )
+        x_range = kwargs.get("x_range")
+        y_range = kwargs.get("y_range")
+        for plot_range in [x_range, y_range]:
+            if plot_range is not None and (
+                len(plot_range) != 2 or not plot_range[0] < plot_range[1]
+            ):
+                raise GraphQLError(
+                    "Plot ranges must contain a minimum and a larger maximum value."
+                )
+
+        bins = kwargs.get("bins", 40)
+        check_plot_bins(bins)
+
+        weights_subgroup = kwargs.get("weights_subgroup")
+        if weights_subgroup and weights_subgroup not in plot_meta["subgroups"]:
+            raise GraphQLError(f"Unknown weights subgroup {weights_subgroup}.")
+        weighted_split = kwargs["weighted_split"] if weights_subgroup else None
+
+        # Zoomed plots re-bin the points inside the window, and weighted plots sum the weights of every point,
+        # so both need every row rather than a strided subset
+        streaming = (
+            kwargs.get("streaming", False)
+            or bool(x_range or y_range)
+            or bool(weights_subgroup)
+        )
+        pyramid = kwargs.get("pyramid", False)
+        filter_expression = kwargs.get("filter")
+        if pyramid and filter_expression:
+            raise GraphQLError("Filters can't be used with pyramid plots.")
+        if pyramid and weights_subgroup:
+            raise GraphQLError("Weights can't be used with pyramid plots.")
+        # Subgroups from different groups are paired up by joining the groups on SEED
+        root_group_y = plot_meta["group_y"]
+        joined = root_group_y != plot_meta["group"]
+        if joined and (streaming or pyramid):
+            raise GraphQLError(
+                "Plots of subgroups from different groups can't be streamed, zoomed, weighted or use pyramids."
+            )
+        # Streamed and pyramid plots use every row, so aren't affected by sampling
+        sampling = None if streaming or pyramid else plot_meta["sampling"]
+        params = {
+            "root_group": plot_meta["group"],
+            "subgroup_x": plot_meta["subgroup_x"],
+            "subgroup_y": plot_meta["subgroup_y"],
+            "bins": bins,
+            "encoding": kwargs["encoding"].value,
+        }
+
+        def compute():
+            if pyramid:
+                result = root.get_histogram_pyramid(
+                    params["root_group"], params["subgroup_x"], params["subgroup_y"]
+                )
+                if result is None:
+                    return None
+                pyramid_data, metadata = result
+                return {
+                    **hybrid_plot_from_pyramid(
+                        pyramid_data,
+                        bins=params["bins"],
+                        x_range=x_range,
+                        y_range=y_range,
+                        encoding=params["encoding"],
+                    ),
+                    **metadata,
+                    "min_max_x": x_range or metadata["min_max_x"],
+                    "min_max_y": y_range or metadata["min_max_y"],
+                }
+
+            if joined:
+                return compute_joined()
+
+            # The statistics of the weights are cached with the others, and used to check the weights
+            statistics = root.get_column_statistics(
+                params["root_group"],
+                [params["subgroup_x"], params["subgroup_y"]]
+                + ([weights_subgroup] if weights_subgroup else []),
+            )
+            mask = get_filter_mask(root, params["root_group"], filter_expression)
+            with root.open_data_file() as f:
+                if streaming:
+                    try:
+                        return get_h5_subgroup_data_streaming(
+                            f,
+                            **params,
+                            statistics=statistics,
+                            x_range=x_range,
+                            y_range=y_range,
+                            mask=mask,
+                            weights_subgroup=weights_subgroup,
+                            weighted_split=kwargs["weighted_split"],
+                        )
+                    except ValueError as e:
+                        raise GraphQLError(str(e))
+                return get_h5_subgroup_data(
+                    f,
+                    **params,
+                    stride_length=plot_meta["stride_length"],
+                    statistics=statistics,
+                    sampling=sampling,
+                    sample_indices=(
+                        root.get_sample_indices(params["root_group"])
+                        if sampling == "random" and mask is None
+                        else None
+                    ),
+                    mask=mask,
+                )
+
+        def compute_joined():
+            try:
+                rows_x, rows_y = root.get_seed_join(params["root_group"], root_group_y)
+            except ValueError as e:
+                raise GraphQLError(str(e))
+
+            # Filters apply to the rows of the x group
+            mask = get_filter_mask(root, params["root_group"], filter_expression)
+            if mask is not None:
+                keep = mask[rows_x]
+                rows_x, rows_y = rows_x[keep], rows_y[keep]
+
+            statistics_x = root.get_column_statistics(
+                params["root_group"], [params["subgroup_x"]]
+            )
+            statistics_y = root.get_column_statistics(
+                root_group_y, [params["subgroup_y"]]
+            )
+            with root.open_data_file() as f:
+                return get_h5_joined_subgroup_data(
+                    f,
+                    params["root_group"],
+                    params["subgroup_x"],
+                    root_group_y,
+                    params["subgroup_y"],
+                    rows_x,
+                    rows_y,
+                    stride_length=plot_meta["stride_length"],
+                    bins=params["bins"],
+                    encoding=params["encoding"],
+                    statistics_x=statistics_x.get(params["subgroup_x"]),
+                    statistics_y=statistics_y.get(params["subgroup_y"]),
+                    sampling=sampling,
+                )
+
+        return get_cached_plot(
+            get_plot_cache_key(
+                root.id,
+                path,
+                **params,
+                root_group_y=root_group_y,
+                stride_length=(
+                    plot_meta["stride_length"] if sampling == "stride" else 1
+                ),
+                sampling=sampling,
+                streaming=streaming,
+                pyramid=pyramid,
+                x_range=x_range,
+                y_range=y_range,
+                filter=filter_expression,
+                weights_subgroup=weights_subgroup,
+                weighted_split=weighted_split,
+            ),
+            compute,
+        )
+
+    def resolve_plot_data_batch(root, info, pairs, **kwargs):
+        check_dataset_model_ready(root)
+        if len(pairs) > MAX_PLOT_BATCH:
+            raise GraphQLError(
+                f"A plot batch can contain at most {MAX_PLOT_BATCH} pairs."
+            )
+
+        bins = kwargs.get("bins", 40)
+        check_plot_bins(bins)
+        check_stride_length(kwargs.get("stride_length"))
+
+        path = Path(root.get_data_file().path).absolute()
+        plot_meta = get_plot_meta(
+            root, **{**kwargs, "sampling": kwargs["sampling"].value}
+        )
+        root_group = plot_meta["group"]
+        sampling = plot_meta["sampling"]
+        pairs = [(pair.subgroup_x, pair.subgroup_y) for pair in pairs]
+        for subgroup in [subgroup for pair in pairs for subgroup in pair]:
+            if subgroup not in plot_meta["subgroups"]:
+                raise GraphQLError(f"Unknown subgroup {subgroup}.")
+
+        # Use the same keys as plotData, so that plots are shared between single and batch requests
+        keys = [
+            get_plot_cache_key(
+                root.id,
+                path,
+                root_group=root_group,
+                root_group_y=root_group,
+                subgroup_x=subgroup_x,
+                subgroup_y=subgroup_y,
+                bins=bins,
+                encoding=kwargs["encoding"].value,
+                stride_length=(
+                    plot_meta["stride_length"] if sampling == "stride" else 1
+                ),
+                sampling=sampling,
+                streaming=False,
+                pyramid=False,
+                x_range=None,
+                y_range=None,
+                filter=kwargs.get("filter"),
+                weights_subgroup=None,
+                weighted_split=None,
+            )
+            for subgroup_x, subgroup_y in pairs
+        ]
+
+        def compute(missing):
+            missing_pairs = [pairs[i] for i in missing]
+            statistics = root.get_column_statistics(
+                root_group, list({s for pair in missing_pairs for s in pair})
+            )
+            mask = get_filter_mask(root, root_group, kwargs.get("filter"))
+            with root.open_data_file() as f:
+                return get_h5_subgroup_data_batch(
+                    f,
+                    root_group,
+                    missing_pairs,
+                    stride_length=plot_meta["stride_length"],
+                    bins=bins,
+                    encoding=kwargs["encoding"].value,
+                    statistics=statistics,
+                    sampling=sampling,
+                    sample_indices=(
+                        root.get_sample_indices(root_group)
+                        if sampling == "random" and mask is None
+                        else None
+                    ),
+                    mask=mask,
+                )
+
+        return [
+            result and {**result, "subgroup_x": pair[0], "subgroup_y": pair[1]}
+            for pair, result in zip(pairs, get_cached_plots(keys, compute))
+        ]
+
+    def resolve_row_count(root, info, **kwargs):
+        check_dataset_model_ready(root)
+        plot_meta = get_plot_meta(root, root_group=kwargs.get("root_group"))
+        mask = get_filter_mask(root, plot_meta["group"], kwargs.get("filter"))
+        return plot_meta["total_length"] if mask is None else int(mask.sum())
+
+    def resolve_column_summary(root, info, subgroup, **kwargs):
+        check_dataset_model_ready(root)
+        bins = kwargs.get("bins", 40)
+        check_plot_bins(bins)
+
+        quantiles = kwargs.get("quantiles")
+        if quantiles is not None and not all(0 <= q <= 1 for q in quantiles):
+            raise GraphQLError("Quantiles must be between 0 and 1.")
+
+        plot_meta = get_plot_meta(root, root_group=kwargs.get("root_group"))
+        if subgroup not in plot_meta["subgroups"]:
+            raise GraphQLError(f"Unknown subgroup {subgroup}.")
+
+        path = Path(root.get_data_file().path).absolute()
+        return get_cached_plot(
+            get_plot_cache_key(
+                root.id,
+                path,
+                column_summary=True,
+                root_group=plot_meta["group"],
+                subgroup=subgroup,
+                bins=bins,
+                quantiles=quantiles,
+            ),
+            lambda: root.get_column_summary(
+                plot_meta["group"], subgroup, bins, quantiles
+            ),
         )
 
 
@@ -475,6 +896,84 @@ class UploadCompasDatasetModelMutation(relay.ClientIDMutation):
         )
 
 
+class StartCompasDatasetModelUploadMutation(relay.ClientIDMutation):
+    """
+    Starts uploading a file in parts with an upload token, or resumes the upload if it has already been started.
+    Each part is uploaded to the dataset_model_upload_part view, then the upload is finished with
+    FinishCompasDatasetModelUploadMutation
+    """
+
+    class Input:
+        upload_token = graphene.String(required=True)
+        compas_publication = graphene.String(required=True)
+        compas_model = graphene.String(required=True)
+        file_name = graphene.String(required=True)
+        file_size = graphene.Float(required=True)
+        # The hexadecimal SHA-256 of the whole file, which the uploaded file is checked against if it is given
+        sha256 = graphene.String()
+
+    part_size = graphene.Float()
+    offset = graphene.Float()
+
+    @classmethod
+    def mutate_and_get_payload(
+        cls,
+        root,
+        info,
+        upload_token,
+        compas_publication,
+        compas_model,
+        file_name,
+        file_size,
+        sha256=None,
+    ):
+        token = CompasDatasetModelUploadToken.get_by_token(upload_token)
+        if not token:
+            raise GraphQLError(
+                "Compas Dataset Model upload token is invalid or expired."
+            )
+
+        try:
+            chunked_upload = ChunkedDatasetModelUpload.create(
+                token,
+                CompasPublication.objects.get(id=from_global_id(compas_publication)[1]),
+                CompasModel.objects.get(id=from_global_id(compas_model)[1]),
+                file_name,
+                int(file_size),
+                sha256,
+            )
+        except ValueError as e:
+            raise GraphQLError(str(e))
+
+        return StartCompasDatasetModelUploadMutation(
+            part_size=chunked_upload.part_size, offset=chunked_upload.offset
+        )
+
+
+class FinishCompasDatasetModelUploadMutation(relay.ClientIDMutation):
+    class Input:
+        upload_token = graphene.String(required=True)
+
+    id = graphene.ID()
+
+    @classmethod
+    def mutate_and_get_payload(cls, root, info, upload_token):
+        token = CompasDatasetModelUploadToken.get_by_token(upload_token)
+        if not token or not hasattr(token, "chunked_upload"):
+            raise GraphQLError(
+                "Compas Dataset Model upload token is invalid or expired."
+            )
+
+        try:
+            dataset_model = token.chunked_upload.finish()
+        except ValueError as e:
+            raise GraphQLError(str(e))
+
+        return FinishCompasDatasetModelUploadMutation(
+            id=to_global_id("CompasDatasetModelNode", dataset_model.id)
+        )
+
+
 class Mutation(graphene.ObjectType):
     add_keyword = AddKeywordMutation.Field()
     delete_keyword = DeleteKeywordMutation.Field()
@@ -488,3 +987,5 @@ class Mutation(graphene.ObjectType):
     delete_compas_dataset_model = DeleteCompasDatasetModelMutation.Field()
     update_compas_dataset_model = UpdateCompasDatasetModelMutation.Field()
     upload_compas_dataset_model = UploadCompasDatasetModelMutation.Field()
+    start_compas_dataset_model_upload = StartCompasDatasetModelUploadMutation.Field()
+    finish_compas_dataset_model_upload = FinishCompasDatasetModelUploadMutation.Field()
@@ -0,0 +1,56 @@
+import logging
+
+from celery import shared_task
+
+from .models import CompasDatasetModel
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Ingest tasks read every row of a data file, so need far longer than the default task time limits
+INGEST_SOFT_TIME_LIMIT = 60 * 60
+INGEST_TIME_LIMIT = INGEST_SOFT_TIME_LIMIT + 60
+
+
+@shared_task(soft_time_limit=INGEST_SOFT_TIME_LIMIT, time_limit=INGEST_TIME_LIMIT)
+def ingest_dataset_model(dataset_model_id):
+    try:
+        dataset_model = CompasDatasetModel.objects.get(id=dataset_model_id)
+    except CompasDatasetModel.DoesNotExist:
+        logger.warning(f"Dataset model {dataset_model_id} no longer exists")
+        return
+
+    dataset_model.ingest()
+
+
+@shared_task(soft_time_limit=INGEST_SOFT_TIME_LIMIT, time_limit=INGEST_TIME_LIMIT)
+def build_histogram_pyramids(dataset_model_id):
+    try:
+        dataset_model = CompasDatasetModel.objects.get(id=dataset_model_id)
+    except CompasDatasetModel.DoesNotExist:
+        logger.warning(f"Dataset model {dataset_model_id} no longer exists")
+        return
+
+    dataset_model.build_default_histogram_pyramids()
+
+
+@shared_task(soft_time_limit=INGEST_SOFT_TIME_LIMIT, time_limit=INGEST_TIME_LIMIT)
+def build_seed_indexes(dataset_model_id):
+    try:
+        dataset_model = CompasDatasetModel.objects.get(id=dataset_model_id)
+    except CompasDatasetModel.DoesNotExist:
+        logger.warning(f"Dataset model {dataset_model_id} no longer exists")
+        return
+
+    dataset_model.build_seed_indexes()
+
+
+@shared_task(soft_time_limit=INGEST_SOFT_TIME_LIMIT, time_limit=INGEST_TIME_LIMIT)
+def repack_data_file(dataset_model_id):
+    try:
+        dataset_model = CompasDatasetModel.objects.get(id=dataset_model_id)
+    except CompasDatasetModel.DoesNotExist:
+        logger.warning(f"Dataset model {dataset_model_id} no longer exists")
+        return
+
+    dataset_model.repack_data_file()
@@ -0,0 +1,294 @@
+import hashlib
+import io
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.test import Client, override_settings, testcases
+from django.urls import reverse
+from django.utils import timezone
+
+from publications.models import (
+    ChunkedDatasetModelUpload,
+    CompasDatasetModel,
+    CompasDatasetModelUploadToken,
+    CompasModel,
+    CompasPublication,
+    IngestStatus,
+    Upload,
+)
+
+
+@override_settings(
+    MEDIA_ROOT=TemporaryDirectory().name, COMPAS_DATASET_MODEL_UPLOAD_PART_SIZE=1000
+)
+class TestChunkedDatasetModelUpload(testcases.TestCase):
+    def setUp(self):
+        class TestUser:
+            def __init__(self):
+                self.id = 1234
+
+        self.upload_token = CompasDatasetModelUploadToken.create(TestUser())
+        self.model = CompasModel.create_model("test", "summary", "description")
+        self.publication = CompasPublication.create_publication(
+            author="test author", title="test title", arxiv_id="test arxiv_id"
+        )
+
+        self.content = open(
+            "./publications/tests/test_data/test_job.tar.gz", "rb"
+        ).read()
+        self.chunked_upload = ChunkedDatasetModelUpload.create(
+            self.upload_token,
+            self.publication,
+            self.model,
+            "test job.tar.gz",
+            len(self.content),
+        )
+
+        self.http_client = Client()
+
+    def put_part(self, offset, content=None, sha256=None):
+        if content is None:
+            content = self.content[offset : offset + 1000]  # noqa: E203
+        return self.http_client.put(
+            f"{reverse(viewname='dataset_model_upload_part')}"
+            f"?uploadToken={self.upload_token.token}&offset={offset}",
+            content,
+            content_type="application/octet-stream",
+            headers={"X-Part-SHA256": sha256 or hashlib.sha256(content).hexdigest()},
+        )
+
+    def test_create(self):
+        self.assertEqual(
+            self.chunked_upload.file_name,
+            f"publications/{self.publication.id}/{self.model.id}/test_job.tar.gz",
+        )
+        self.assertEqual(self.chunked_upload.part_size, 1000)
+        self.assertEqual(self.chunked_upload.offset, 0)
+
+        # Starting the upload again resumes it
+        self.assertEqual(
+            ChunkedDatasetModelUpload.create(
+                self.upload_token,
+                self.publication,
+                self.model,
+                "test job.tar.gz",
+                len(self.content),
+            ),
+            self.chunked_upload,
+        )
+        with self.assertRaises(ValueError):
+            ChunkedDatasetModelUpload.create(
+                self.upload_token, self.publication, self.model, "other.tar.gz", 10
+            )
+
+    def test_create_outside_dataset_directory(self):
+        self.chunked_upload.delete()
+        chunked_upload = ChunkedDatasetModelUpload.create(
+            self.upload_token, self.publication, self.model, "../../job.h5", 10
+        )
+        self.assertEqual(
+            chunked_upload.file_name,
+            f"publications/{self.publication.id}/{self.model.id}/job.h5",
+        )
+
+    def test_upload(self):
+        offset = 0
+        while offset < len(self.content):
+            response = self.put_part(offset)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.json()["offset"], min(offset + 1000, len(self.content))
+            )
+            offset = response.json()["offset"]
+
+        self.chunked_upload.refresh_from_db()
+        self.assertEqual(
+            Path(self.chunked_upload.get_partial_path()).read_bytes(), self.content
+        )
+
+        with (
+            patch("publications.tasks.ingest_dataset_model.delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            dataset_model = self.chunked_upload.finish()
+
+        delay.assert_called_once_with(dataset_model.id)
+        self.assertEqual(dataset_model.ingest_status, IngestStatus.UPLOADED)
+        self.assertEqual(dataset_model.file.name, self.chunked_upload.file_name)
+        self.assertEqual(Path(dataset_model.file.path).read_bytes(), self.content)
+        self.assertFalse(Path(self.chunked_upload.get_partial_path()).exists())
+        self.assertFalse(ChunkedDatasetModelUpload.objects.exists())
+
+        dataset_model.ingest()
+        self.assertEqual(Upload.objects.filter(dataset_model=dataset_model).count(), 3)
+
+    def test_resume(self):
+        self.put_part(0)
+
+        # A part that was received, but whose acknowledgement was lost, is ignored
+        response = self.put_part(0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        # Parts must be uploaded in order
+        response = self.put_part(2000)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 1000)
+
+    def test_duplicate_part(self):
+        # A request for a part that started before a retry of the part was acknowledged
+        stale = ChunkedDatasetModelUpload.objects.get(id=self.chunked_upload.id)
+        self.put_part(0)
+
+        # The part has already been received, so the failed duplicate doesn't truncate it
+        content = self.content[:10]
+        self.assertEqual(
+            stale.write_part(
+                0, io.BytesIO(content), hashlib.sha256(content).hexdigest()
+            ),
+            1000,
+        )
+        self.assertEqual(
+            Path(self.chunked_upload.get_partial_path()).read_bytes(),
+            self.content[:1000],
+        )
+
+    def test_invalid_part(self):
+        self.put_part(0)
+
+        # A part whose checksum doesn't match isn't acknowledged, and is removed from the partial file
+        response = self.put_part(1000, sha256="0" * 64)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 1000)
+
+        # As is a part that is too small or too large
+        for content in [self.content[1000:1010], self.content[1000:2001]]:
+            response = self.put_part(1000, content)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()["offset"], 1000)
+
+        self.assertEqual(
+            Path(self.chunked_upload.get_partial_path()).read_bytes(),
+            self.content[:1000],
+        )
+
+        # The upload can't be finished until every part is received
+        with self.assertRaises(ValueError):
+            self.chunked_upload.finish()
+
+    def upload_parts(self):
+        for offset in range(0, len(self.content), 1000):
+            self.put_part(offset)
+        self.chunked_upload.refresh_from_db()
+
+    def test_finish_twice(self):
+        self.upload_parts()
+        # A request that loaded the chunked upload before another request finished it
+        other = ChunkedDatasetModelUpload.objects.get(id=self.chunked_upload.id)
+
+        with patch("publications.tasks.ingest_dataset_model.delay"):
+            dataset_model = self.chunked_upload.finish()
+            with self.assertRaises(ValueError):
+                other.finish()
+
+        self.assertEqual(CompasDatasetModel.objects.count(), 1)
+        dataset_model.file.delete(save=False)
+
+    def test_finish_failed(self):
+        self.upload_parts()
+
+        with (
+            patch.object(
+                CompasDatasetModel,
+                "create_dataset_model",
+                side_effect=ValidationError("Invalid"),
+            ),
+            self.assertRaises(ValidationError),
+        ):
+            self.chunked_upload.finish()
+
+        # The partial file is kept, so that finishing the upload can be retried
+        self.assertEqual(
+            Path(self.chunked_upload.get_partial_path()).read_bytes(), self.content
+        )
+        self.assertFalse(
+            Path(settings.MEDIA_ROOT, self.chunked_upload.file_name).exists()
+        )
+        self.assertTrue(ChunkedDatasetModelUpload.objects.exists())
+
+        with patch("publications.tasks.ingest_dataset_model.delay"):
+            dataset_model = self.chunked_upload.finish()
+        self.assertEqual(Path(dataset_model.file.path).read_bytes(), self.content)
+        dataset_model.file.delete(save=False)
+
+    def test_finish_checks_file(self):
+        self.chunked_upload.delete()
+        self.chunked_upload = ChunkedDatasetModelUpload.create(
+            self.upload_token,
+            self.publication,
+            self.model,
+            "test job.tar.gz",
+            len(self.content),
+            hashlib.sha256(b"other").hexdigest(),
+        )
+        self.upload_parts()
+
+        # A file that doesn't match its checksum must be uploaded again
+        with self.assertRaises(ValueError):
+            self.chunked_upload.finish()
+        self.chunked_upload.refresh_from_db()
+        self.assertEqual(self.chunked_upload.offset, 0)
+        self.assertFalse(Path(self.chunked_upload.get_partial_path()).exists())
+
+        # As must a file that isn't the size of the upload
+        ChunkedDatasetModelUpload.objects.update(sha256=None)
+        self.upload_parts()
+        with open(self.chunked_upload.get_partial_path(), "r+b") as f:
+            f.truncate(len(self.content) - 1)
+        with self.assertRaises(ValueError):
+            self.chunked_upload.finish()
+        self.assertFalse(CompasDatasetModel.objects.exists())
+
+        ChunkedDatasetModelUpload.objects.update(
+            sha256=hashlib.sha256(self.content).hexdigest()
+        )
+        self.upload_parts()
+        with patch("publications.tasks.ingest_dataset_model.delay"):
+            dataset_model = self.chunked_upload.finish()
+        self.assertEqual(Path(dataset_model.file.path).read_bytes(), self.content)
+        dataset_model.file.delete(save=False)
+
+    def test_invalid_token(self):
+        response = self.http_client.put(
+            f"{reverse(viewname='dataset_model_upload_part')}?uploadToken=not_a_token&offset=0",
+            b"",
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, 404)
+
+        response = self.http_client.get(
+            f"{reverse(viewname='dataset_model_upload_part')}"
+            f"?uploadToken={self.upload_token.token}&offset=0"
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_prune(self):
+        self.put_part(0)
+        partial_path = Path(self.chunked_upload.get_partial_path())
+        expired = timezone.now() - timezone.timedelta(
+            seconds=settings.COMPAS_DATASET_MODEL_UPLOAD_TOKEN_EXPIRY + 1
+        )
+        CompasDatasetModelUploadToken.objects.update(created=expired)
+
+        # Tokens of chunked uploads that are still receiving parts don't expire
+        CompasDatasetModelUploadToken.prune()
+        self.assertTrue(CompasDatasetModelUploadToken.objects.exists())
+
+        ChunkedDatasetModelUpload.objects.update(updated=expired)
+        CompasDatasetModelUploadToken.prune()
+        self.assertFalse(CompasDatasetModelUploadToken.objects.exists())
+        self.assertFalse(ChunkedDatasetModelUpload.objects.exists())
+        self.assertFalse(partial_path.exists())
@@ -1,16 +1,36 @@
+import hashlib
 import pathlib
 from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
+import h5py
+import numpy as np
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.exceptions import ValidationError
 from django.test import testcases, override_settings
 
 from publications.models import (
+    ColumnStatistics,
+    DatasetGroup,
+    DatasetSubgroup,
+    IngestStatus,
     Upload,
     CompasPublication,
     CompasModel,
     CompasDatasetModel,
 )
+from publications.utils.h5_functions import (
+    get_h5_subgroup_data_streaming,
+    get_h5_subgroup_meta,
+)
+from publications.utils.pyramid_functions import hybrid_plot_from_pyramid
+
+
+def create_dataset_model(*args):
+    # Uploaded files are ingested by a background worker once the dataset model is saved, so are ingested here
+    dataset_model = CompasDatasetModel.create_dataset_model(*args)
+    dataset_model.ingest()
+    return dataset_model
 
 
 class TestCompasDatasetModel(testcases.TestCase):
@@ -55,9 +75,7 @@ class TestCompasDatasetModel(testcases.TestCase):
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_create(self):
-        CompasDatasetModel.create_dataset_model(
-            self.publication, self.model, self.test_job_archive
-        )
+        create_dataset_model(self.publication, self.model, self.test_job_archive)
 
         self.assertEqual(CompasDatasetModel.objects.all().count(), 1)
         self.assertEqual(
@@ -67,7 +85,7 @@ class TestCompasDatasetModel(testcases.TestCase):
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_delete(self):
-        model = CompasDatasetModel.create_dataset_model(
+        model = create_dataset_model(
             self.publication, self.model, self.test_job_archive
         )
 
@@ -84,7 +102,7 @@ class TestCompasDatasetModel(testcases.TestCase):
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_update(self):
-        model = CompasDatasetModel.create_dataset_model(
+        model = create_dataset_model(
             self.publication, self.model, self.test_job_archive
         )
 
@@ -109,7 +127,7 @@ class TestCompasDatasetModel(testcases.TestCase):
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_str(self):
-        model = CompasDatasetModel.create_dataset_model(
+        model = create_dataset_model(
             self.publication, self.model, self.test_job_archive
         )
 
@@ -123,35 +141,52 @@ class TestCompasDatasetModel(testcases.TestCase):
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_save_archive(self):
-        CompasDatasetModel.create_dataset_model(
-            self.publication, self.model, self.test_job_archive
-        )
+        create_dataset_model(self.publication, self.model, self.test_job_archive)
 
         self.assertEqual(Upload.objects.all().count(), 3)
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_save_single_file(self):
-        CompasDatasetModel.create_dataset_model(
-            self.publication, self.model, self.test_job_single
-        )
+        create_dataset_model(self.publication, self.model, self.test_job_single)
 
         self.assertEqual(Upload.objects.all().count(), 1)
+        upload = Upload.objects.last()
+        # The file is stored by its checksum
         self.assertEqual(
-            Upload.objects.last().file.name, "publications/1/1/COMPAS_Output.h5"
+            upload.file.name,
+            f"blobs/{upload.sha256[:2]}/{upload.sha256}/COMPAS_Output.h5",
         )
+        self.assertEqual(upload.path, "COMPAS_Output.h5")
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
-    def test_save_multiple_h5(self):
-        with self.assertRaises(
-            ValidationError,
-            msg="CompasDatasetModel was created with more than one h5 file when it should have failed",
-        ):
-            CompasDatasetModel.create_dataset_model(
-                self.publication, self.model, self.test_job_archive_multiple_h5
-            )
+    def test_ingest_multiple_h5(self):
+        # The archive is only found to have more than one h5 file as it is extracted
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive_multiple_h5
+        )
 
-        self.assertEqual(CompasDatasetModel.objects.all().count(), 0)
+        model.refresh_from_db()
+        self.assertEqual(model.ingest_status, IngestStatus.FAILED)
+        self.assertEqual(
+            model.ingest_error, "Dataset must have exactly one assigned h5 file"
+        )
         self.assertEqual(Upload.objects.all().count(), 0)
+        # Files extracted before the second h5 file was found are removed
+        dataset_dir = pathlib.Path(model.file.path).parent
+        self.assertSequenceEqual(
+            [path for path in dataset_dir.rglob("*") if path.is_file()],
+            [pathlib.Path(model.file.path)],
+        )
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_ingest_records_checksums(self):
+        for job_file in [self.test_job_archive, self.test_job_single]:
+            model = create_dataset_model(self.publication, self.model, job_file)
+
+            for upload in model.upload_set.all():
+                content = pathlib.Path(upload.file.path).read_bytes()
+                self.assertEqual(upload.size, len(content))
+                self.assertEqual(upload.sha256, hashlib.sha256(content).hexdigest())
 
     @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
     def test_save_non_h5(self):
@@ -159,9 +194,502 @@ class TestCompasDatasetModel(testcases.TestCase):
             ValidationError,
             msg="CompasDatasetModel was created with a data file that is not a h5 file",
         ):
-            CompasDatasetModel.create_dataset_model(
-                self.publication, self.model, self.test_job_not_h5
-            )
+            create_dataset_model(self.publication, self.model, self.test_job_not_h5)
 
         self.assertEqual(CompasDatasetModel.objects.all().count(), 0)
         self.assertEqual(Upload.objects.all().count(), 0)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_save_indexes_data_file(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        self.assertSequenceEqual(
+            [group.name for group in model.groups.all()],
+            ["BSE_Common_Envelopes", "BSE_RLOF", "BSE_System_Parameters"],
+        )
+        group = model.groups.get(name="BSE_System_Parameters")
+        self.assertEqual(group.length, 1)
+        self.assertEqual(group.subgroups.count(), 36)
+        self.assertTrue(group.subgroups.filter(name="Mass@ZAMS(1)").exists())
+        self.assertSequenceEqual(
+            group.subgroups.filter(is_derived=True).values_list("name", flat=True),
+            ["Chirp_Mass@ZAMS", "Mass_Ratio@ZAMS", "Total_Mass@ZAMS"],
+        )
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_plot_meta(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        with h5py.File(model.get_data_file().path, "r") as f:
+            for kwargs in [
+                {},
+                {"root_group": "BSE_System_Parameters"},
+                {"root_group": "BSE_RLOF", "subgroup_x": "SEED"},
+                {"stride_length": 3},
+            ]:
+                self.assertDictEqual(
+                    model.get_plot_meta(**kwargs), get_h5_subgroup_meta(f, **kwargs)
+                )
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_plot_meta_indexes_unindexed_data_file(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.groups.all().delete()
+        self.assertEqual(DatasetSubgroup.objects.count(), 0)
+
+        self.assertEqual(model.get_plot_meta()["group"], "BSE_Common_Envelopes")
+        self.assertEqual(DatasetGroup.objects.filter(dataset_model=model).count(), 3)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_plot_meta_invalid(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        for kwargs in [
+            {"root_group": "not_a_group"},
+            {"root_group_y": "not_a_group"},
+            {"subgroup_x": "not_a_subgroup"},
+            {"root_group": "BSE_RLOF", "subgroup_y": "not_a_subgroup"},
+        ]:
+            with self.assertRaises(ValueError):
+                model.get_plot_meta(**kwargs)
+
+        # A data file that can't be indexed has no groups
+        model.groups.all().delete()
+        with (
+            patch.object(CompasDatasetModel, "index_data_file", side_effect=OSError),
+            self.assertLogs("publications.models", "WARNING"),
+            self.assertRaises(ValueError),
+        ):
+            model.get_plot_meta()
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_save_computes_column_statistics(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        subgroup = DatasetSubgroup.objects.get(
+            group__dataset_model=model,
+            group__name="BSE_System_Parameters",
+            name="Mass@ZAMS(1)",
+        )
+        with h5py.File(model.get_data_file().path, "r") as f:
+            data = f["BSE_System_Parameters"]["Mass@ZAMS(1)"][()]
+
+        self.assertEqual(subgroup.statistics.count, len(data))
+        self.assertEqual(subgroup.statistics.min, data.min())
+        self.assertEqual(subgroup.statistics.max, data.max())
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_column_statistics(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        subgroups = ["Mass@ZAMS(1)", "Mass@ZAMS(2)"]
+        statistics = model.get_column_statistics("BSE_System_Parameters", subgroups)
+
+        # Missing statistics should be recomputed
+        ColumnStatistics.objects.filter(subgroup__group__dataset_model=model).delete()
+        self.assertDictEqual(
+            model.get_column_statistics("BSE_System_Parameters", subgroups), statistics
+        )
+        self.assertCountEqual(statistics.keys(), subgroups)
+        self.assertEqual(ColumnStatistics.objects.count(), 2)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_save_ingests_on_commit(self):
+        with patch("publications.tasks.ingest_dataset_model.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                model = CompasDatasetModel.create_dataset_model(
+                    self.publication, self.model, self.test_job_archive
+                )
+
+        delay.assert_called_once_with(model.id)
+        # The uploaded file isn't extracted until it's ingested
+        model.refresh_from_db()
+        self.assertEqual(model.ingest_status, IngestStatus.UPLOADED)
+        self.assertEqual(Upload.objects.all().count(), 0)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_ingest(self):
+        model = CompasDatasetModel.create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.ingest()
+
+        model.refresh_from_db()
+        self.assertEqual(model.ingest_status, IngestStatus.READY)
+        self.assertIsNone(model.ingest_error)
+        self.assertEqual(Upload.objects.filter(dataset_model=model).count(), 3)
+        self.assertEqual(model.groups.count(), 3)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_ingest_failed(self):
+        model = CompasDatasetModel.create_dataset_model(
+            self.publication,
+            self.model,
+            SimpleUploadedFile("test.h5", b"not a h5 file"),
+        )
+        model.ingest()
+
+        model.refresh_from_db()
+        self.assertEqual(model.ingest_status, IngestStatus.FAILED)
+        self.assertTrue(model.ingest_error)
+        self.assertEqual(model.groups.count(), 0)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_ingest_builds_histogram_pyramids_on_commit(self):
+        model = CompasDatasetModel.create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        with (
+            patch("publications.tasks.build_histogram_pyramids.delay") as delay,
+            patch("publications.tasks.build_seed_indexes.delay") as seed_delay,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                model.ingest()
+
+        delay.assert_called_once_with(model.id)
+        seed_delay.assert_called_once_with(model.id)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name, REPACK_DATA_FILES=True)
+    def test_ingest_repacks_data_file_on_commit(self):
+        model = CompasDatasetModel.create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        with (
+            patch("publications.tasks.build_histogram_pyramids.delay"),
+            patch("publications.tasks.build_seed_indexes.delay"),
+            patch("publications.tasks.repack_data_file.delay") as delay,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                model.ingest()
+
+        delay.assert_called_once_with(model.id)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_repack_data_file(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        kwargs = {
+            "root_group": "BSE_RLOF",
+            "subgroup_x": "Mass(1)",
+            "subgroup_y": "Time",
+        }
+        with model.open_data_file() as f:
+            data = get_h5_subgroup_data_streaming(f, **kwargs)
+
+        model.repack_data_file()
+
+        path = model.get_repacked_data_file_path()
+        self.assertTrue(path.exists())
+        with model.open_data_file() as f:
+            self.assertEqual(f.h5_file.filename, str(path.absolute()))
+            self.assertDictEqual(get_h5_subgroup_data_streaming(f, **kwargs), data)
+
+        # The data file is left as it was uploaded
+        with h5py.File(model.get_data_file().path, "r") as f:
+            self.assertEqual(f["BSE_RLOF"]["Mass(1)"].chunks, (1000,))
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_build_default_histogram_pyramids(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.build_default_histogram_pyramids()
+
+        # Only groups with default subgroups have their pyramids built
+        self.assertTrue(
+            model.get_histogram_pyramid_path(
+                "BSE_System_Parameters", "Mass@ZAMS(1)", "Mass@ZAMS(2)"
+            ).exists()
+        )
+        self.assertTrue(
+            model.get_histogram_pyramid_path(
+                "BSE_Common_Envelopes", "SemiMajorAxis>CE", "SemiMajorAxis<CE"
+            ).exists()
+        )
+        self.assertEqual(
+            len(list((model.get_artefact_dir() / "pyramids").iterdir())), 2
+        )
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_histogram_pyramid(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        args = ["BSE_RLOF", "Mass(1)", "Mass(2)"]
+        self.assertFalse(model.get_histogram_pyramid_path(*args).exists())
+
+        # The pyramid is built on demand, and loaded once it exists
+        pyramid, metadata = model.get_histogram_pyramid(*args)
+        self.assertTrue(model.get_histogram_pyramid_path(*args).exists())
+        loaded_pyramid, loaded_metadata = model.get_histogram_pyramid(*args)
+
+        with h5py.File(model.get_data_file().path, "r") as f:
+            expected = get_h5_subgroup_data_streaming(f, *args)
+
+        self.assertDictEqual(
+            {**hybrid_plot_from_pyramid(pyramid), **metadata}, expected
+        )
+        self.assertDictEqual(
+            {**hybrid_plot_from_pyramid(loaded_pyramid), **loaded_metadata}, expected
+        )
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_delete_removes_artefacts(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.build_default_histogram_pyramids()
+        artefact_dir = model.get_artefact_dir()
+        self.assertTrue(artefact_dir.exists())
+
+        CompasDatasetModel.delete_dataset_model(model.id)
+
+        self.assertFalse(artefact_dir.exists())
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_shared_files(self):
+        # A file that is uploaded more than once is stored once
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.build_default_histogram_pyramids()
+        other_model = CompasDatasetModel.create_dataset_model(
+            self.publication,
+            self.model,
+            SimpleUploadedFile(
+                name="test.tar.gz",
+                content=open(
+                    "./publications/tests/test_data/test_job.tar.gz", "rb"
+                ).read(),
+            ),
+        )
+        with (
+            patch("publications.tasks.build_histogram_pyramids.delay") as delay,
+            patch.object(CompasDatasetModel, "index_data_file") as index_data_file,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            other_model.ingest()
+
+        self.assertEqual(other_model.ingest_status, IngestStatus.READY)
+        self.assertSetEqual(
+            set(other_model.upload_set.values_list("file", "path")),
+            set(model.upload_set.values_list("file", "path")),
+        )
+        self.assertEqual(other_model.get_artefact_dir(), model.get_artefact_dir())
+
+        # The index is copied rather than built from the data file, and the artefacts aren't built again
+        index_data_file.assert_not_called()
+        delay.assert_not_called()
+        self.assertSequenceEqual(
+            list(other_model.groups.values_list("name", "length")),
+            list(model.groups.values_list("name", "length")),
+        )
+        subgroups = DatasetSubgroup.objects.filter(group__dataset_model=other_model)
+        self.assertEqual(
+            subgroups.count(),
+            DatasetSubgroup.objects.filter(group__dataset_model=model).count(),
+        )
+        self.assertEqual(
+            ColumnStatistics.objects.filter(
+                subgroup__group__dataset_model=other_model
+            ).count(),
+            ColumnStatistics.objects.filter(
+                subgroup__group__dataset_model=model
+            ).count(),
+        )
+        self.assertEqual(
+            other_model.get_plot_meta(root_group="BSE_RLOF"),
+            model.get_plot_meta(root_group="BSE_RLOF"),
+        )
+
+        # Shared files are only deleted with the last dataset model that uses them
+        paths = [pathlib.Path(upload.file.path) for upload in model.upload_set.all()]
+        CompasDatasetModel.delete_dataset_model(model.id)
+        self.assertTrue(all(path.exists() for path in paths))
+        self.assertTrue(other_model.get_artefact_dir().exists())
+
+        artefact_dir = other_model.get_artefact_dir()
+        CompasDatasetModel.delete_dataset_model(other_model.id)
+        self.assertFalse(any(path.parent.exists() for path in paths))
+        self.assertFalse(artefact_dir.exists())
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_sample_indices(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        group = model.groups.get(name="BSE_System_Parameters")
+        group.length = 5000
+        group.save()
+
+        with patch("publications.models.get_sample_size", return_value=100):
+            indices = model.get_sample_indices("BSE_System_Parameters")
+            self.assertEqual(len(indices), 100)
+            self.assertTrue(np.all(indices < 5000))
+
+            # The sample is saved, and reused
+            self.assertEqual(
+                len(list((model.get_artefact_dir() / "samples").iterdir())), 1
+            )
+            with patch("publications.models.get_random_sample_indices") as sample:
+                np.testing.assert_array_equal(
+                    model.get_sample_indices("BSE_System_Parameters"), indices
+                )
+                sample.assert_not_called()
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_plot_meta_sampling(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        meta = model.get_plot_meta(sampling="random")
+        self.assertEqual(meta["sampling"], "random")
+        self.assertEqual(meta["sample_fraction"], 1)
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_filter_mask(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        with h5py.File(model.get_data_file().path, "r") as f:
+            mass = f["BSE_System_Parameters"]["Mass@ZAMS(1)"][()]
+
+        for expression, expected in [
+            ("Mass@ZAMS(1) > 0", mass > 0),
+            ("Mass@ZAMS(1) < 0", mass < 0),
+        ]:
+            np.testing.assert_array_equal(
+                model.get_filter_mask("BSE_System_Parameters", expression), expected
+            )
+
+        # The masks are saved, and reused for equivalent filters
+        self.assertEqual(len(list((model.get_artefact_dir() / "filters").iterdir())), 2)
+        with patch("publications.models.get_h5_filter_mask") as get_mask:
+            np.testing.assert_array_equal(
+                model.get_filter_mask("BSE_System_Parameters", "(Mass@ZAMS(1)>0.0)"),
+                mass > 0,
+            )
+            get_mask.assert_not_called()
+
+        with self.assertRaises(ValueError):
+            model.get_filter_mask("BSE_System_Parameters", "Unknown > 0")
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_build_seed_indexes(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        model.build_seed_indexes()
+
+        for group in ["BSE_Common_Envelopes", "BSE_RLOF", "BSE_System_Parameters"]:
+            self.assertTrue(model.get_seed_index_path(group).exists())
+
+        # The saved indexes are used to join groups
+        with patch("publications.models.get_h5_seed_index") as get_index:
+            rows_x, rows_y = model.get_seed_join(
+                "BSE_System_Parameters", "BSE_Common_Envelopes"
+            )
+            get_index.assert_not_called()
+        np.testing.assert_array_equal(rows_x, [0])
+        np.testing.assert_array_equal(rows_y, [0])
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_derived_columns(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        path = model.get_derived_column_path("BSE_RLOF", "Total_Mass")
+
+        # Derived columns are indexed, but not computed until they are used
+        subgroup = DatasetSubgroup.objects.get(
+            group__dataset_model=model, group__name="BSE_RLOF", name="Total_Mass"
+        )
+        self.assertTrue(subgroup.is_derived)
+        self.assertEqual(subgroup.units, "Msol")
+        self.assertFalse(ColumnStatistics.objects.filter(subgroup=subgroup).exists())
+        self.assertFalse(path.exists())
+
+        statistics = model.get_column_statistics("BSE_RLOF", ["Total_Mass"])
+        self.assertTrue(path.exists())
+        with model.open_data_file() as f:
+            group = f["BSE_RLOF"]
+            total_mass = group["Mass(1)"][0] + group["Mass(2)"][0]
+            self.assertEqual(group["Total_Mass"][0], total_mass)
+        self.assertEqual(statistics["Total_Mass"]["min"], total_mass)
+
+        # The saved column is read on later uses
+        with (
+            patch("publications.models.save_h5_derived_column") as save,
+            model.open_data_file() as f,
+        ):
+            self.assertEqual(f["BSE_RLOF"]["Total_Mass"][0], total_mass)
+            save.assert_not_called()
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_plot_meta_y_group(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+
+        with h5py.File(model.get_data_file().path, "r") as f:
+            kwargs = {
+                "root_group": "BSE_RLOF",
+                "root_group_y": "BSE_System_Parameters",
+            }
+            meta = model.get_plot_meta(**kwargs)
+            self.assertDictEqual(meta, get_h5_subgroup_meta(f, **kwargs))
+
+        self.assertEqual(meta["group_y"], "BSE_System_Parameters")
+        self.assertEqual(meta["subgroup_y"], "Mass@ZAMS(2)")
+
+    @override_settings(MEDIA_ROOT=TemporaryDirectory().name)
+    def test_get_column_summary(self):
+        model = create_dataset_model(
+            self.publication, self.model, self.test_job_archive
+        )
+        statistics = ColumnStatistics.objects.get(
+            subgroup__group__dataset_model=model,
+            subgroup__group__name="BSE_System_Parameters",
+            subgroup__name="Mass@ZAMS(1)",
+        )
+        # The sketch is stored when the data file is indexed
+        self.assertEqual(statistics.quantile_sketch["count"], 1)
+
+        with h5py.File(model.get_data_file().path, "r") as f:
+            mass = f["BSE_System_Parameters"]["Mass@ZAMS(1)"][0]
+
+        summary = model.get_column_summary(
+            "BSE_System_Parameters", "Mass@ZAMS(1)", quantiles=[0, 0.5, 1]
+        )
+        self.assertEqual(summary["count"], 1)
+        self.assertEqual(summary["unit"], "Msol")
+        self.assertEqual(sum(summary["counts"]), 1)
+        self.assertEqual(
+            summary["quantiles"],
+            [{"quantile": q, "value": mass} for q in [0, 0.5, 1]],
+        )
+
+        # Sketches missing from columns indexed before they were stored are computed on demand
+        statistics.quantile_sketch = None
+        statistics.save()
+        self.assertEqual(
+            model.get_column_summary(
+                "BSE_System_Parameters", "Mass@ZAMS(1)", quantiles=[0, 0.5, 1]
+            ),
+            summary,
+        )
+        statistics.refresh_from_db()
+        self.assertIsNotNone(statistics.quantile_sketch)
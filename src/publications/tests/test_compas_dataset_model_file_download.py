@@ -2,14 +2,21 @@ from pathlib import Path
 import uuid
 from tempfile import TemporaryDirectory
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings, Client
 from django.urls import reverse
-from graphql_relay import to_global_id
+from graphql_relay import from_global_id, to_global_id
 
 from compasui.tests.testcases import CompasTestCase
-from publications.models import CompasModel, CompasPublication, Keyword
+from publications.models import (
+    CompasDatasetModel,
+    CompasModel,
+    CompasPublication,
+    FileDownloadToken,
+    Keyword,
+)
 from publications.tests.test_utils import silence_errors
 
 User = get_user_model()
@@ -90,6 +97,8 @@ class TestUploadedJobFileDownload(CompasTestCase):
         )
 
         self.dataset_id = response.data["uploadCompasDatasetModel"]["id"]
+        # The uploaded file is ingested by a background worker, so is ingested here
+        CompasDatasetModel.objects.get(id=from_global_id(self.dataset_id)[1]).ingest()
 
         self.query_string = """
             query ($id: ID!){
@@ -158,3 +167,52 @@ class TestUploadedJobFileDownload(CompasTestCase):
             test_file_path = Path(__file__) / "../test_data" / path
             with open(test_file_path.resolve(), "rb") as f:
                 self.assertEqual(content, f.read())
+
+    @silence_errors
+    @override_settings(FILE_DOWNLOAD_ACCEL_REDIRECT_URL="/protected_files/")
+    def test_success_accel_redirect(self):
+        # Files are sent by nginx rather than streamed by Django
+        download_tokens, response = self.generate_file_download_tokens()
+
+        for f in response.data["compasDatasetModel"]["files"]:
+            token = f["downloadToken"]
+            path = Path(f["path"])
+
+            response = self.http_client.get(
+                f"{reverse(viewname='file_download')}?fileId={token}&forceDownload"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.headers["Content-Type"], "application/octet-stream"
+            )
+            self.assertEqual(
+                response.headers["Content-Disposition"],
+                f'attachment; filename="{path.name}"',
+            )
+            self.assertEqual(response.content, b"")
+
+            file_path = Path(FileDownloadToken.objects.get(token=token).path)
+            self.assertEqual(
+                response.headers["X-Accel-Redirect"],
+                "/protected_files/"
+                + file_path.resolve()
+                .relative_to(Path(settings.MEDIA_ROOT).resolve())
+                .as_posix(),
+            )
+
+    @silence_errors
+    @override_settings(FILE_DOWNLOAD_ACCEL_REDIRECT_URL="/protected_files/")
+    def test_success_accel_redirect_outside_media_root(self):
+        # Files that nginx can't serve are streamed by Django
+        test_file_path = (
+            Path(__file__) / "../test_data/test_job/BSE_grid.txt"
+        ).resolve()
+        dataset = CompasDatasetModel.objects.get(id=from_global_id(self.dataset_id)[1])
+        token = FileDownloadToken.create(dataset, [test_file_path])[0].token
+
+        response = self.http_client.get(
+            f"{reverse(viewname='file_download')}?fileId={token}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+        self.assertEqual(b"".join(list(response)), test_file_path.read_bytes())
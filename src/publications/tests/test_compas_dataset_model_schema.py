@@ -1,8 +1,11 @@
+import json
 import pathlib
 import uuid
 from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
 from graphql_relay import to_global_id
@@ -12,9 +15,11 @@ from publications.models import (
     CompasPublication,
     CompasModel,
     CompasDatasetModel,
+    IngestStatus,
     Upload,
     Keyword,
 )
+from publications.schema import MAX_PLOT_BATCH, MAX_PLOT_BINS
 from publications.tests.test_utils import silence_errors
 
 User = get_user_model()
@@ -124,11 +129,15 @@ class TestUploadCompasDatasetModelSchema(CompasTestCase):
             "generateCompasDatasetModelUploadToken"
         ]["token"]
 
-        response = self.file_query(
-            self.upload_compas_dataset_model_mutation,
-            input_data=self.archive_input["input"],
-            files=self.archive_file,
-        )
+        with (
+            patch("publications.tasks.ingest_dataset_model.delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            response = self.file_query(
+                self.upload_compas_dataset_model_mutation,
+                input_data=self.archive_input["input"],
+                files=self.archive_file,
+            )
 
         self.assertIsNone(response.errors)
         self.assertDictEqual(self.expected_output, response.data)
@@ -140,6 +149,13 @@ class TestUploadCompasDatasetModelSchema(CompasTestCase):
             1,
         )
 
+        # The mutation returns before the uploaded file is ingested
+        dataset_model = CompasDatasetModel.objects.last()
+        delay.assert_called_once_with(dataset_model.id)
+        self.assertEqual(dataset_model.ingest_status, IngestStatus.UPLOADED)
+        self.assertEqual(Upload.objects.all().count(), 0)
+        dataset_model.ingest()
+
         files = ["COMPAS_Output.h5", "Run_Details", "BSE_grid.txt"]
 
         self.assertEqual(3, Upload.objects.all().count())
@@ -161,11 +177,15 @@ class TestUploadCompasDatasetModelSchema(CompasTestCase):
             "generateCompasDatasetModelUploadToken"
         ]["token"]
 
-        response = self.file_query(
-            self.upload_compas_dataset_model_mutation,
-            input_data=self.single_input["input"],
-            files=self.single_file,
-        )
+        with (
+            patch("publications.tasks.ingest_dataset_model.delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            response = self.file_query(
+                self.upload_compas_dataset_model_mutation,
+                input_data=self.single_input["input"],
+                files=self.single_file,
+            )
 
         self.assertIsNone(response.errors)
         self.assertDictEqual(self.expected_output, response.data)
@@ -177,10 +197,15 @@ class TestUploadCompasDatasetModelSchema(CompasTestCase):
             1,
         )
 
+        # The mutation returns before the uploaded file is ingested
+        dataset_model = CompasDatasetModel.objects.last()
+        delay.assert_called_once_with(dataset_model.id)
+        self.assertEqual(dataset_model.ingest_status, IngestStatus.UPLOADED)
+        self.assertEqual(Upload.objects.all().count(), 0)
+        dataset_model.ingest()
+
         self.assertEqual(Upload.objects.all().count(), 1)
-        self.assertEqual(
-            Upload.objects.last().file.name, "publications/1/1/COMPAS_Output.h5"
-        )
+        self.assertEqual(Upload.objects.last().path, "COMPAS_Output.h5")
 
     @silence_errors
     @override_settings(PERMITTED_PUBLICATION_MANAGEMENT_USER_IDS=[2])
@@ -269,6 +294,8 @@ class TestDeleteCompasDatasetModelSchema(CompasTestCase):
                 content_type="application/gzip",
             ),
         )
+        # The uploaded file is ingested by a background worker, so is ingested here
+        self.dataset_model.ingest()
 
         self.dataset_model_input = {
             "input": {
@@ -489,6 +516,7 @@ class TestQueryCompasDatasetModelSchema(CompasTestCase):
                     edges {
                         node {
                             id
+                            ingestStatus
                             compasPublication {
                                 id
                                 author
@@ -528,6 +556,8 @@ class TestQueryCompasDatasetModelSchema(CompasTestCase):
                 content_type="application/gzip",
             ),
         )
+        # The uploaded file is ingested by a background worker, so is ingested here
+        self.dataset_model.ingest()
 
         self.expected_output = {
             "compasDatasetModels": {
@@ -535,6 +565,7 @@ class TestQueryCompasDatasetModelSchema(CompasTestCase):
                     {
                         "node": {
                             "id": "Q29tcGFzRGF0YXNldE1vZGVsTm9kZTox",
+                            "ingestStatus": "READY",
                             "compasPublication": {
                                 "id": "Q29tcGFzUHVibGljYXRpb25Ob2RlOjE=",
                                 "author": "test author 1",
@@ -581,3 +612,342 @@ class TestQueryCompasDatasetModelSchema(CompasTestCase):
 
         self.assertIsNone(response.errors)
         self.assertDictEqual(self.expected_output, response.data)
+
+
+@override_settings(
+    MEDIA_ROOT=TemporaryDirectory().name,
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "plots": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+)
+class TestPlotCompasDatasetModelSchema(CompasTestCase):
+    def setUp(self):
+        self.model, self.publication = create_model_publication()
+
+        self.publication.public = True
+        self.publication.save()
+
+        self.dataset_model = CompasDatasetModel.create_dataset_model(
+            self.publication,
+            self.model,
+            SimpleUploadedFile(
+                name="test.tar.gz",
+                content=open(
+                    "./publications/tests/test_data/test_job.tar.gz", "rb"
+                ).read(),
+                content_type="application/gzip",
+            ),
+        )
+        # The uploaded file is ingested by a background worker, so is ingested here
+        self.dataset_model.ingest()
+
+        caches["plots"].clear()
+
+    def execute_query(self, fields):
+        return self.query(
+            f"""
+            query {{
+                compasDatasetModel(id: "{to_global_id("CompasDatasetModelNode", self.dataset_model.id)}") {{
+                    {fields}
+                }}
+            }}
+            """
+        )
+
+    def assertQueryError(self, fields, message):
+        response = self.execute_query(fields)
+
+        self.assertEqual(1, len(response.errors))
+        self.assertEqual(message, response.errors[0]["message"])
+
+    @silence_errors
+    def test_plot_unknown_group(self):
+        for fields in [
+            'plotMeta(rootGroup: "Unknown_Group") { group }',
+            'plotData(rootGroupY: "Unknown_Group") { histData }',
+            'plotDataBatch(rootGroup: "Unknown_Group", pairs: [{subgroupX: "SEED", subgroupY: "SEED"}]) '
+            "{ histData }",
+            'rowCount(rootGroup: "Unknown_Group")',
+            'columnSummary(rootGroup: "Unknown_Group", subgroup: "SEED") { count }',
+        ]:
+            self.assertQueryError(fields, "Unknown group Unknown_Group.")
+
+        self.assertQueryError(
+            'plotData(subgroupX: "Unknown_Column") { histData }',
+            "Unknown subgroup Unknown_Column.",
+        )
+
+    @silence_errors
+    def test_plot_stride_length(self):
+        for fields in [
+            "plotMeta(strideLength: 0) { strideLength }",
+            "plotData(strideLength: 0) { histData }",
+            "plotData(strideLength: -1) { histData }",
+            'plotDataBatch(strideLength: 0, pairs: [{subgroupX: "SEED", subgroupY: "SEED"}]) { histData }',
+        ]:
+            self.assertQueryError(fields, "Plot stride length must be at least 1.")
+
+        response = self.execute_query("plotMeta(strideLength: 2) { strideLength }")
+
+        self.assertIsNone(response.errors)
+        self.assertEqual(
+            2, response.data["compasDatasetModel"]["plotMeta"]["strideLength"]
+        )
+
+        # A null stride length uses the default
+        response = self.execute_query(
+            "plotMeta(strideLength: null) { strideLength }\n"
+            "plotData(strideLength: null) { histData }\n"
+            'plotDataBatch(strideLength: null, pairs: [{subgroupX: "SEED", subgroupY: "SEED"}]) { histData }'
+        )
+
+        self.assertIsNone(response.errors)
+        self.assertEqual(
+            1, response.data["compasDatasetModel"]["plotMeta"]["strideLength"]
+        )
+
+    @silence_errors
+    def test_plot_data_zoom_invalid(self):
+        for fields in [
+            "plotData(xRange: [1]) { histData }",
+            "plotData(xRange: [1, 2, 3]) { histData }",
+            "plotData(xRange: [2, 1]) { histData }",
+            "plotData(yRange: [1, 1]) { histData }",
+        ]:
+            self.assertQueryError(
+                fields,
+                "Plot ranges must contain a minimum and a larger maximum value.",
+            )
+
+        for bins in [0, MAX_PLOT_BINS + 1]:
+            self.assertQueryError(
+                f"plotData(bins: {bins}) {{ histData }}",
+                f"Plot bins must be between 1 and {MAX_PLOT_BINS}.",
+            )
+
+        self.assertQueryError(
+            'plotData(rootGroup: "BSE_RLOF", rootGroupY: "BSE_System_Parameters", subgroupX: "Mass(1)", '
+            'subgroupY: "Mass@ZAMS(1)", xRange: [0, 40]) { histData }',
+            "Plots of subgroups from different groups can't be streamed, zoomed, weighted or use pyramids.",
+        )
+
+    def test_plot_data_zoom(self):
+        fields = (
+            'plotData(rootGroup: "BSE_RLOF", subgroupX: "Mass(1)", subgroupY: "Mass(2)"%s) '
+            "{ sides minMaxX minMaxY scatterData }"
+        )
+        response = self.execute_query(
+            fields % ", xRange: [0, 40], yRange: [0, 20], bins: 20"
+        )
+
+        self.assertIsNone(response.errors)
+        plot_data = response.data["compasDatasetModel"]["plotData"]
+        self.assertEqual([2.0, 1.0], plot_data["sides"])
+        self.assertEqual([0.0, 40.0], plot_data["minMaxX"])
+        self.assertEqual([0.0, 20.0], plot_data["minMaxY"])
+        self.assertEqual(1, len(json.loads(plot_data["scatterData"])))
+
+        # The window and bins are part of the cache key, so the zoomed plot isn't returned for the full plot
+        response = self.execute_query(fields % ", bins: 20")
+
+        self.assertIsNone(response.errors)
+        self.assertNotEqual(
+            [0.0, 40.0], response.data["compasDatasetModel"]["plotData"]["minMaxX"]
+        )
+
+    @silence_errors
+    def test_plot_data_batch_invalid(self):
+        pair = '{subgroupX: "Mass(1)", subgroupY: "Mass(2)"}'
+        self.assertQueryError(
+            f'plotDataBatch(rootGroup: "BSE_RLOF", pairs: [{", ".join([pair] * (MAX_PLOT_BATCH + 1))}]) '
+            "{ histData }",
+            f"A plot batch can contain at most {MAX_PLOT_BATCH} pairs.",
+        )
+
+        for bins in [0, MAX_PLOT_BINS + 1]:
+            self.assertQueryError(
+                f'plotDataBatch(rootGroup: "BSE_RLOF", pairs: [{pair}], bins: {bins}) {{ histData }}',
+                f"Plot bins must be between 1 and {MAX_PLOT_BINS}.",
+            )
+
+        self.assertQueryError(
+            f'plotDataBatch(rootGroup: "BSE_RLOF", pairs: [{pair}, {{subgroupX: "Mass(1)", '
+            'subgroupY: "Unknown_Column"}]) { histData }',
+            "Unknown subgroup Unknown_Column.",
+        )
+
+    def test_plot_data_batch(self):
+        response = self.execute_query(
+            """
+            plotDataBatch(
+                rootGroup: "BSE_RLOF",
+                pairs: [{subgroupX: "Mass(1)", subgroupY: "Mass(2)"}, {subgroupX: "Time", subgroupY: "Mass(1)"}]
+            ) {
+                subgroupX
+                subgroupY
+                histData
+                scatterData
+                minMaxX
+                minMaxY
+            }
+            """
+        )
+
+        self.assertIsNone(response.errors)
+        plots = response.data["compasDatasetModel"]["plotDataBatch"]
+        self.assertEqual(
+            [("Mass(1)", "Mass(2)"), ("Time", "Mass(1)")],
+            [(plot["subgroupX"], plot["subgroupY"]) for plot in plots],
+        )
+
+        # Batched plots use the same cache keys as single plots, so the single plot isn't computed again
+        with patch("publications.schema.get_h5_subgroup_data") as get_h5_subgroup_data:
+            response = self.execute_query(
+                'plotData(rootGroup: "BSE_RLOF", subgroupX: "Time", subgroupY: "Mass(1)") '
+                "{ histData scatterData minMaxX minMaxY }"
+            )
+
+        get_h5_subgroup_data.assert_not_called()
+        self.assertIsNone(response.errors)
+        self.assertDictEqual(
+            {
+                key: plots[1][key]
+                for key in ["histData", "scatterData", "minMaxX", "minMaxY"]
+            },
+            response.data["compasDatasetModel"]["plotData"],
+        )
+
+    @silence_errors
+    def test_plot_filter_invalid(self):
+        for fields in [
+            'rowCount(rootGroup: "BSE_RLOF", filter: "Unknown_Column > 1")',
+            'plotData(rootGroup: "BSE_RLOF", filter: "Unknown_Column > 1") { histData }',
+            'plotDataBatch(rootGroup: "BSE_RLOF", pairs: [{subgroupX: "Mass(1)", subgroupY: "Mass(2)"}], '
+            'filter: "Unknown_Column > 1") { histData }',
+        ]:
+            self.assertQueryError(
+                fields,
+                "Invalid filter: Unknown column or operator at 'Unknown_Column > 1'",
+            )
+
+        self.assertQueryError(
+            'rowCount(rootGroup: "BSE_RLOF", filter: "Mass(1) > 1 &&")',
+            "Invalid filter: Expected more of the expression in filter",
+        )
+        self.assertQueryError(
+            'plotData(rootGroup: "BSE_RLOF", filter: "Mass(1) > 1", pyramid: true) { histData }',
+            "Filters can't be used with pyramid plots.",
+        )
+
+    def test_row_count(self):
+        for row_filter, row_count in [
+            (None, 1),
+            ("Mass(1) > 10", 1),
+            ("Mass(1) > 10 && Mass(2) > 10", 0),
+        ]:
+            response = self.execute_query(
+                'rowCount(rootGroup: "BSE_RLOF"'
+                + (f', filter: "{row_filter}"' if row_filter else "")
+                + ")"
+            )
+
+            self.assertIsNone(response.errors)
+            self.assertEqual(row_count, response.data["compasDatasetModel"]["rowCount"])
+
+    def test_plot_data_filter(self):
+        fields = 'plotData(rootGroup: "BSE_RLOF", subgroupX: "Mass(1)", subgroupY: "Mass(2)"%s) { scatterData }'
+        # The filter is part of the cache key, so filtered and unfiltered plots aren't mixed up
+        for row_filter, points in [(None, 1), ("Mass(2) > 10", 0), ("Mass(2) < 10", 1)]:
+            response = self.execute_query(
+                fields % (f', filter: "{row_filter}"' if row_filter else "")
+            )
+
+            self.assertIsNone(response.errors)
+            self.assertEqual(
+                points,
+                len(
+                    json.loads(
+                        response.data["compasDatasetModel"]["plotData"]["scatterData"]
+                    )
+                ),
+            )
+
+    @silence_errors
+    def test_column_summary_invalid(self):
+        self.assertQueryError(
+            'columnSummary(rootGroup: "BSE_RLOF", subgroup: "Unknown_Column") { count }',
+            "Unknown subgroup Unknown_Column.",
+        )
+        self.assertQueryError(
+            'columnSummary(rootGroup: "BSE_RLOF", subgroup: "Mass(1)", quantiles: [0.5, 1.5]) { count }',
+            "Quantiles must be between 0 and 1.",
+        )
+        for bins in [0, MAX_PLOT_BINS + 1]:
+            self.assertQueryError(
+                f'columnSummary(rootGroup: "BSE_RLOF", subgroup: "Mass(1)", bins: {bins}) {{ count }}',
+                f"Plot bins must be between 1 and {MAX_PLOT_BINS}.",
+            )
+
+    def test_column_summary(self):
+        response = self.execute_query(
+            'columnSummary(rootGroup: "BSE_RLOF", subgroup: "Mass(1)", bins: 5, quantiles: [0, 0.5, 1]) '
+            "{ group subgroup unit count nullCount min max edges counts quantiles { quantile value } }"
+        )
+
+        self.assertIsNone(response.errors)
+        summary = response.data["compasDatasetModel"]["columnSummary"]
+        self.assertEqual("BSE_RLOF", summary["group"])
+        self.assertEqual("Mass(1)", summary["subgroup"])
+        self.assertEqual("Msol", summary["unit"])
+        self.assertEqual(1, summary["count"])
+        self.assertEqual(0, summary["nullCount"])
+        self.assertAlmostEqual(19.998032437939855, summary["min"])
+        self.assertEqual(summary["min"], summary["max"])
+        self.assertEqual(len(summary["counts"]) + 1, len(summary["edges"]))
+        self.assertEqual(1, sum(summary["counts"]))
+        self.assertEqual(
+            [{"quantile": q, "value": summary["min"]} for q in [0.0, 0.5, 1.0]],
+            summary["quantiles"],
+        )
+
+    @silence_errors
+    def test_plot_data_weights_invalid(self):
+        fields = 'plotData(rootGroup: "BSE_RLOF", subgroupX: "Mass(1)", subgroupY: "Mass(2)", %s) { histData }'
+        for arguments, message in [
+            (
+                'weightsSubgroup: "Unknown_Column"',
+                "Unknown weights subgroup Unknown_Column.",
+            ),
+            (
+                'weightsSubgroup: "Zeta_Soberman(1)"',
+                "Weights subgroup Zeta_Soberman(1) contains negative weights",
+            ),
+            (
+                'weightsSubgroup: "Mass(2)", pyramid: true',
+                "Weights can't be used with pyramid plots.",
+            ),
+        ]:
+            self.assertQueryError(fields % arguments, message)
+
+    def test_plot_data_weights(self):
+        fields = (
+            'plotData(rootGroup: "BSE_RLOF", subgroupX: "Mass(1)", subgroupY: "Mass(2)", '
+            'weightsSubgroup: "Mass(2)"%s) { histData scatterData }'
+        )
+        # A bin with a single point is drawn in the scatter plot, unless its weighted count is used to split
+        # the bins. The split is part of the cache key, so the two plots aren't mixed up
+        for arguments, hist_points, scatter_points in [
+            ("", 0, 1),
+            (", weightedSplit: true", 1, 0),
+        ]:
+            response = self.execute_query(fields % arguments)
+
+            self.assertIsNone(response.errors)
+            plot_data = response.data["compasDatasetModel"]["plotData"]
+            self.assertEqual(hist_points, len(json.loads(plot_data["histData"])))
+            self.assertEqual(scatter_points, len(json.loads(plot_data["scatterData"])))
+
+        self.assertAlmostEqual(
+            9.999980696364355, json.loads(plot_data["histData"])[0]["counts"]
+        )
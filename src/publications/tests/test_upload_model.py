@@ -29,9 +29,11 @@ class TestUploadModel(testcases.TestCase):
         self.dataset_model = CompasDatasetModel.create_dataset_model(
             self.publication, self.model, self.test_job_archive
         )
+        # The uploaded file is ingested by a background worker, so is ingested here
+        self.dataset_model.ingest()
 
     def test_create(self):
-        # Create is triggered when we initiate the creation of CompasDatasetModel in setUp()
+        # Create is triggered when we ingest the CompasDatasetModel in setUp()
         files = ["COMPAS_Output.h5", "Run_Details", "BSE_grid.txt"]
 
         self.assertEqual(3, Upload.objects.all().count())
@@ -0,0 +1,311 @@
+import datetime
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from .h5_functions import (
+    check_subgroup_boolean,
+    get_h5_subgroup_data,
+    get_h5_subgroup_meta,
+    iter_chunk_slices,
+    read_h5_sample,
+    remove_null_coords,
+)
+from .plotting_functions import (
+    get_histogram_bins,
+    get_log_and_limits,
+    histo2d_scatter_hybrid,
+    split_histogram_by_count,
+)
+
+# The number of rows of each synthetic data file that is benchmarked by default
+BENCHMARK_ROWS = [10**5, 10**6, 10**7, 10**8]
+
+# The group of the synthetic data files, whose default subgroups are Mass(1) and Mass(2)
+BENCHMARK_GROUP = "BSE_Double_Compact_Objects"
+
+# The HDF5 chunk size of the synthetic data files, the default chunk size of COMPAS output
+BENCHMARK_CHUNK_ROWS = 100000
+
+# The units of each column of the synthetic data files
+BENCHMARK_UNITS = {
+    "SEED": "-",
+    "Mass(1)": "Msol",
+    "Mass(2)": "Msol",
+    "SemiMajorAxis@DCO": "AU",
+    "Eccentricity@DCO": "-",
+    "Time": "Myr",
+    "Coalescence_Time": "Myr",
+    "Merges_Hubble_Time": "State",
+}
+
+# The pairs of subgroups that are plotted, covering plain, logged, zero-heavy, NaN-containing and boolean columns
+BENCHMARK_PAIRS = [
+    ("Mass(1)", "Mass(2)"),
+    ("SemiMajorAxis@DCO", "Eccentricity@DCO"),
+    ("Coalescence_Time", "Merges_Hubble_Time"),
+]
+
+
+def generate_benchmark_columns(rng, start, rows):
+    """Generates rows of synthetic columns with distributions like those of a COMPAS double compact object group
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator
+    start : int
+        Index of the first row, used as its SEED
+    rows : int
+        The number of rows to generate
+
+    Returns
+    -------
+    dict
+        Dictionary of arrays containing the rows of each column in BENCHMARK_UNITS
+    """
+    mass_1 = rng.lognormal(2.5, 0.6, rows)
+    semi_major_axis = rng.lognormal(0, 2, rows)
+    # Systems disrupted by a supernova don't have an orbit
+    semi_major_axis[rng.random(rows) < 0.01] = np.nan
+    time = rng.uniform(3, 50, rows)
+    # Spans many orders of magnitude, with many systems taking longer than a Hubble time to merge
+    coalescence_time = 10 ** rng.normal(4, 2, rows)
+
+    return {
+        "SEED": np.arange(start, start + rows, dtype=np.uint64),
+        "Mass(1)": mass_1,
+        "Mass(2)": mass_1 * rng.uniform(0.1, 1, rows),
+        "SemiMajorAxis@DCO": semi_major_axis,
+        # Most orbits are circularised by mass transfer
+        "Eccentricity@DCO": np.where(
+            rng.random(rows) < 0.3, 0.0, rng.uniform(0, 1, rows)
+        ),
+        "Time": time,
+        "Coalescence_Time": coalescence_time,
+        "Merges_Hubble_Time": (coalescence_time + time < 14000).astype(np.uint8),
+    }
+
+
+def write_benchmark_file(
+    path, rows, seed=0, chunk_rows=BENCHMARK_CHUNK_ROWS, compression=None
+):
+    """Writes a synthetic COMPAS-like H5 file, see generate_benchmark_columns, generating a chunk of rows at a
+    time so that files larger than memory can be written
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the H5 file to create
+    rows : int
+        The number of rows in the file
+    seed : int, optional
+        Seed of the random number generator, by default 0
+    chunk_rows : int, optional
+        The HDF5 chunk size, and the number of rows generated at a time, by default BENCHMARK_CHUNK_ROWS
+    compression : str, optional
+        HDF5 compression filter of the columns, e.g. "gzip", by default no compression
+    """
+    rng = np.random.default_rng(seed)
+    with h5py.File(path, "w") as f:
+        group = f.create_group(BENCHMARK_GROUP)
+        for chunk_slice in iter_chunk_slices(rows, chunk_rows):
+            columns = generate_benchmark_columns(
+                rng, chunk_slice.start, chunk_slice.stop - chunk_slice.start
+            )
+            for name, values in columns.items():
+                if name not in group:
+                    dataset = group.create_dataset(
+                        name,
+                        shape=(rows,),
+                        dtype=values.dtype,
+                        chunks=(min(rows, chunk_rows),),
+                        compression=compression,
+                    )
+                    dataset.attrs["units"] = np.bytes_(BENCHMARK_UNITS[name])
+                group[name][chunk_slice] = values
+
+
+def get_peak_rss():
+    # The peak resident set size of the process in bytes, which is reported in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def time_function(function, *args, repeats=3, **kwargs):
+    """Times repeated calls of a function, then measures the peak memory allocated by one more call with
+    tracemalloc, which also traces NumPy arrays. The calls are timed without tracing, as tracing slows them down
+
+    Returns
+    -------
+    object, dict
+        The result of the function, and a dictionary of the fastest and mean time of the calls in seconds, the
+        peak memory allocated during a call and the peak resident set size of the process so far in bytes
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak_traced = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {
+        "repeats": repeats,
+        "min_seconds": min(times),
+        "mean_seconds": sum(times) / len(times),
+        "peak_traced_bytes": peak_traced,
+        "peak_rss_bytes": get_peak_rss(),
+    }
+
+
+def run_benchmark(path, repeats=3, bins=40):
+    """Times the plotting functions on a data file written by write_benchmark_file
+
+    get_h5_subgroup_data is timed reading and plotting each of BENCHMARK_PAIRS from the file. The plotting
+    functions it calls are timed separately, on the same stride sample of rows that it plots
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the data file
+    repeats : int, optional
+        The number of times each function is timed, by default 3
+    bins : int, optional
+        The number of bins in each dimension of the plots, by default 40
+
+    Returns
+    -------
+    list
+        List of dicts containing the function, subgroups and measurements of each benchmark, see time_function
+    """
+    results = []
+    with h5py.File(path, "r") as f:
+        meta, measurements = time_function(
+            get_h5_subgroup_meta, f, root_group=BENCHMARK_GROUP, repeats=repeats
+        )
+        rows = meta["total_length"]
+        results.append({"function": "get_h5_subgroup_meta", **measurements})
+
+        for subgroup_x, subgroup_y in BENCHMARK_PAIRS:
+            pair = {"subgroup_x": subgroup_x, "subgroup_y": subgroup_y}
+            _, measurements = time_function(
+                get_h5_subgroup_data,
+                f,
+                BENCHMARK_GROUP,
+                subgroup_x,
+                subgroup_y,
+                stride_length=meta["stride_length"],
+                bins=bins,
+                repeats=repeats,
+            )
+            results.append({"function": "get_h5_subgroup_data", **pair, **measurements})
+
+            x_array, y_array = remove_null_coords(
+                *read_h5_sample(
+                    f, BENCHMARK_GROUP, [subgroup_x, subgroup_y], meta["stride_length"]
+                )
+            )
+            (x_array, _, min_max_x, _), measurements = time_function(
+                get_log_and_limits,
+                x_array,
+                check_subgroup_boolean(f, BENCHMARK_GROUP, subgroup_x),
+                repeats=repeats,
+            )
+            results.append({"function": "get_log_and_limits", **pair, **measurements})
+            y_array, _, min_max_y, _ = get_log_and_limits(
+                y_array, check_subgroup_boolean(f, BENCHMARK_GROUP, subgroup_y)
+            )
+
+            hist_bins, hist_range = get_histogram_bins(min_max_x, min_max_y, bins)
+            counts = np.histogram2d(x_array, y_array, bins=hist_bins, range=hist_range)[
+                0
+            ]
+            _, measurements = time_function(
+                split_histogram_by_count, counts, 3, repeats=repeats
+            )
+            results.append(
+                {"function": "split_histogram_by_count", **pair, **measurements}
+            )
+
+            _, measurements = time_function(
+                histo2d_scatter_hybrid,
+                x_array,
+                y_array,
+                min_max_x,
+                min_max_y,
+                bins=bins,
+                repeats=repeats,
+            )
+            results.append(
+                {"function": "histo2d_scatter_hybrid", **pair, **measurements}
+            )
+
+    return [{"rows": rows, **result} for result in results]
+
+
+def run_benchmarks(
+    directory, rows=BENCHMARK_ROWS, repeats=3, bins=40, compression=None
+):
+    """Writes a synthetic data file with each number of rows, if it doesn't exist yet, and benchmarks it, see
+    run_benchmark
+
+    Each file is benchmarked in a new process, so that the peak resident set size of each benchmark only
+    includes the memory used for that file
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the data files, which are kept so they can be benchmarked again
+    rows : list, optional
+        The number of rows of each data file, by default BENCHMARK_ROWS
+    repeats : int, optional
+        The number of times each function is timed, by default 3
+    bins : int, optional
+        The number of bins in each dimension of the plots, by default 40
+    compression : str, optional
+        HDF5 compression filter of the columns of new data files, by default no compression
+
+    Returns
+    -------
+    dict
+        Dictionary containing the environment the benchmarks were run in and the results of every benchmark,
+        which can be saved as JSON and compared with the results of other commits
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for length in rows:
+        path = directory / f"benchmark_{length}_{compression or 'none'}.h5"
+        if not path.exists():
+            temp_path = path.with_suffix(".tmp")
+            write_benchmark_file(temp_path, length, compression=compression)
+            temp_path.replace(path)
+
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            results += executor.submit(run_benchmark, path, repeats, bins).result()
+
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "h5py": h5py.__version__,
+        "machine": platform.machine(),
+        "compression": compression,
+        "bins": bins,
+        "results": results,
+    }
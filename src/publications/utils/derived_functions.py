@@ -0,0 +1,129 @@
+import h5py
+import numpy as np
+
+
+def get_chirp_mass(mass_1, mass_2):
+    return (mass_1 * mass_2) ** 0.6 / (mass_1 + mass_2) ** 0.2
+
+
+def get_mass_ratio(mass_1, mass_2):
+    # The ratio of the lighter to the heavier mass, so that it is between 0 and 1 whichever star is heavier
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.minimum(mass_1, mass_2) / np.maximum(mass_1, mass_2)
+
+
+def get_total_mass(mass_1, mass_2):
+    return mass_1 + mass_2
+
+
+def get_delay_time(coalescence_time, time):
+    # The time from the formation of the binary to the merger of the double compact object
+    return coalescence_time + time
+
+
+# Columns that aren't stored in COMPAS output files but can be computed from the columns of the same group,
+# keyed by name. Each is a vectorized function of its input columns, in order, with the units of the result
+DERIVED_COLUMNS = {
+    "Chirp_Mass": {
+        "inputs": ["Mass(1)", "Mass(2)"],
+        "function": get_chirp_mass,
+        "units": "Msol",
+    },
+    "Mass_Ratio": {
+        "inputs": ["Mass(1)", "Mass(2)"],
+        "function": get_mass_ratio,
+        "units": "-",
+    },
+    "Total_Mass": {
+        "inputs": ["Mass(1)", "Mass(2)"],
+        "function": get_total_mass,
+        "units": "Msol",
+    },
+    "Chirp_Mass@ZAMS": {
+        "inputs": ["Mass@ZAMS(1)", "Mass@ZAMS(2)"],
+        "function": get_chirp_mass,
+        "units": "Msol",
+    },
+    "Mass_Ratio@ZAMS": {
+        "inputs": ["Mass@ZAMS(1)", "Mass@ZAMS(2)"],
+        "function": get_mass_ratio,
+        "units": "-",
+    },
+    "Total_Mass@ZAMS": {
+        "inputs": ["Mass@ZAMS(1)", "Mass@ZAMS(2)"],
+        "function": get_total_mass,
+        "units": "Msol",
+    },
+    "Delay_Time": {
+        "inputs": ["Coalescence_Time", "Time"],
+        "function": get_delay_time,
+        "units": "Myr",
+    },
+}
+
+
+def get_derived_columns(subgroups):
+    """Returns the names of the derived columns that can be computed from a list of subgroups of a group,
+    excluding any that are stored in the group under the same name
+    """
+    return [
+        name
+        for name, column in DERIVED_COLUMNS.items()
+        if name not in subgroups
+        and all(subgroup in subgroups for subgroup in column["inputs"])
+    ]
+
+
+def compute_derived_column(name, columns):
+    """Computes a chunk of a derived column from the same rows of each of its input columns, as float64"""
+    column = DERIVED_COLUMNS[name]
+    return np.asarray(
+        column["function"](*[np.asarray(c, dtype=np.float64) for c in columns]),
+        dtype=np.float64,
+    )
+
+
+class DerivedH5Group(h5py.Group):
+    """A group of a H5 file in which the derived columns of the group can be read like any other dataset
+
+    The derived columns are not included in keys(), so the group has the same layout as in the file, but
+    can be indexed by name and are found by `in`. Derived columns are opened with open_column(root_group, name),
+    which should return a h5py.Dataset
+    """
+
+    def __init__(self, group, root_group, open_column):
+        super().__init__(group.id)
+        self.root_group = root_group
+        self.open_column = open_column
+        self.derived_columns = get_derived_columns(list(super().keys()))
+
+    def __getitem__(self, name):
+        if name in self.derived_columns:
+            return self.open_column(self.root_group, name)
+        return super().__getitem__(name)
+
+    def __contains__(self, name):
+        return name in self.derived_columns or super().__contains__(name)
+
+
+class DerivedH5File:
+    """A read-only view of a H5 file whose groups are DerivedH5Groups, see DerivedH5Group"""
+
+    def __init__(self, h5_file, open_column):
+        self.h5_file = h5_file
+        self.open_column = open_column
+
+    def __getitem__(self, name):
+        item = self.h5_file[name]
+        if isinstance(item, h5py.Group):
+            return DerivedH5Group(item, name, self.open_column)
+        return item
+
+    def __contains__(self, name):
+        return name in self.h5_file
+
+    def __iter__(self):
+        return iter(self.h5_file)
+
+    def keys(self):
+        return self.h5_file.keys()
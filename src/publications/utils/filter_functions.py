@@ -0,0 +1,243 @@
+import re
+import numpy as np
+
+# Comparison operators allowed in filters, and the numpy functions that evaluate them
+COMPARISONS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    "<=": np.less_equal,
+    ">=": np.greater_equal,
+    "<": np.less,
+    ">": np.greater,
+}
+
+NUMBER_PATTERN = re.compile(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+
+# Operator tokens, longest first so that e.g. <= isn't read as <
+OPERATORS = ["&&", "||", "==", "!=", "<=", ">=", "<", ">", "!", "(", ")"]
+
+# The maximum depth of a parsed filter, as filters are parsed, formatted and evaluated recursively
+MAX_FILTER_DEPTH = 100
+
+
+def tokenize_filter(expression, columns):
+    """Splits a filter expression into (kind, value) tokens
+
+    Column names can contain characters that are also operators (e.g. "Mass(1)" or "SemiMajorAxis>CE"),
+    so the longest column name starting at each position is matched before any operator
+
+    Parameters
+    ----------
+    expression : str
+        Filter expression
+    columns : list
+        Names of the columns that can be used in the expression
+
+    Returns
+    -------
+    list
+        List of tokens, where kind is one of "column", "number" or "operator"
+    """
+    columns = sorted(columns, key=len, reverse=True)
+    tokens = []
+    position = 0
+    while position < len(expression):
+        if expression[position].isspace():
+            position += 1
+            continue
+
+        column = next((c for c in columns if expression.startswith(c, position)), None)
+        if column is not None:
+            tokens.append(("column", column))
+            position += len(column)
+            continue
+
+        number = NUMBER_PATTERN.match(expression, position)
+        if number is not None:
+            tokens.append(("number", float(number.group())))
+            position = number.end()
+            continue
+
+        operator = next(
+            (o for o in OPERATORS if expression.startswith(o, position)), None
+        )
+        if operator is not None:
+            tokens.append(("operator", operator))
+            position += len(operator)
+            continue
+
+        raise ValueError(f"Unknown column or operator at '{expression[position:]}'")
+
+    return tokens
+
+
+class FilterParser:
+    """Recursive descent parser for filter expressions, with the grammar
+
+    expression := and ("||" and)*
+    and := unary ("&&" unary)*
+    unary := "!" unary | "(" expression ")" | operand comparison operand
+    operand := column | number
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, operator=None):
+        token = self.peek()
+        if token is None or (operator is not None and token != ("operator", operator)):
+            expected = f"'{operator}'" if operator else "more of the expression"
+            raise ValueError(f"Expected {expected} in filter")
+        self.position += 1
+        return token
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in filter")
+        if get_filter_depth(tree) > MAX_FILTER_DEPTH:
+            raise ValueError(f"Filter is nested more than {MAX_FILTER_DEPTH} deep")
+        return tree
+
+    def parse_or(self):
+        tree = self.parse_and()
+        while self.peek() == ("operator", "||"):
+            self.take()
+            tree = ("or", tree, self.parse_and())
+        return tree
+
+    def parse_and(self):
+        tree = self.parse_unary()
+        while self.peek() == ("operator", "&&"):
+            self.take()
+            tree = ("and", tree, self.parse_unary())
+        return tree
+
+    def parse_unary(self):
+        if self.peek() in [("operator", "!"), ("operator", "(")]:
+            # Limit the recursion of the parser itself, before the depth of the tree is known
+            self.depth += 1
+            if self.depth > MAX_FILTER_DEPTH:
+                raise ValueError(f"Filter is nested more than {MAX_FILTER_DEPTH} deep")
+            _, operator = self.take()
+            if operator == "!":
+                tree = ("not", self.parse_unary())
+            else:
+                tree = self.parse_or()
+                self.take(")")
+            self.depth -= 1
+            return tree
+
+        left = self.parse_operand()
+        kind, operator = self.take()
+        if kind != "operator" or operator not in COMPARISONS:
+            raise ValueError(f"Expected a comparison instead of '{operator}' in filter")
+        return ("compare", operator, left, self.parse_operand())
+
+    def parse_operand(self):
+        kind, value = self.take()
+        if kind not in ["column", "number"]:
+            raise ValueError(
+                f"Expected a column or number instead of '{value}' in filter"
+            )
+        return (kind, value)
+
+
+def parse_filter(expression, columns):
+    """Parses a filter expression such as "Mass(1) > 10 && Stellar_Type(2) == 14" into a tree of nested
+    tuples, supporting comparisons between columns and numbers combined with &&, || and ! and parentheses
+
+    Parameters
+    ----------
+    expression : str
+        Filter expression
+    columns : list
+        Names of the columns that can be used in the expression
+
+    Returns
+    -------
+    tuple
+        The parsed expression tree
+
+    Raises
+    ------
+    ValueError
+        If the expression isn't valid
+    """
+    return FilterParser(tokenize_filter(expression, columns)).parse()
+
+
+def get_filter_depth(tree):
+    """Returns the depth of a parsed filter, without recursing so that any tree can be measured"""
+    depth = 0
+    stack = [(tree, 1)]
+    while stack:
+        tree, tree_depth = stack.pop()
+        depth = max(depth, tree_depth)
+        stack.extend(
+            (child, tree_depth + 1) for child in tree[1:] if isinstance(child, tuple)
+        )
+    return depth
+
+
+def get_filter_columns(tree):
+    """Returns the sorted names of the columns used in a parsed filter"""
+    if tree[0] == "column":
+        return [tree[1]]
+    if tree[0] == "number":
+        return []
+    children = tree[2:] if tree[0] == "compare" else tree[1:]
+    return sorted(
+        {column for child in children for column in get_filter_columns(child)}
+    )
+
+
+def format_filter(tree):
+    """Formats a parsed filter as a canonical, fully parenthesised expression"""
+    kind = tree[0]
+    if kind == "column":
+        return tree[1]
+    if kind == "number":
+        return repr(tree[1])
+    if kind == "not":
+        return f"!({format_filter(tree[1])})"
+    if kind == "compare":
+        return f"({format_filter(tree[2])} {tree[1]} {format_filter(tree[3])})"
+    operator = "&&" if kind == "and" else "||"
+    return f"({format_filter(tree[1])} {operator} {format_filter(tree[2])})"
+
+
+def evaluate_filter(tree, data):
+    """Evaluates a parsed filter over arrays of the same rows of each column, comparisons with null values
+    are always false
+
+    Parameters
+    ----------
+    tree : tuple
+        Parsed filter from parse_filter
+    data : dict
+        Arrays of the same rows of each column used in the filter, keyed by column name
+
+    Returns
+    -------
+    array_like
+        Boolean mask of the rows that match the filter
+    """
+    kind = tree[0]
+    if kind == "column":
+        return data[tree[1]]
+    if kind == "number":
+        return tree[1]
+    if kind == "not":
+        return ~evaluate_filter(tree[1], data)
+    if kind == "compare":
+        return COMPARISONS[tree[1]](
+            evaluate_filter(tree[2], data), evaluate_filter(tree[3], data)
+        )
+    combine = np.logical_and if kind == "and" else np.logical_or
+    return combine(evaluate_filter(tree[1], data), evaluate_filter(tree[2], data))
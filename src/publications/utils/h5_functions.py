@@ -1,6 +1,22 @@
+import h5py
 import numpy as np
 import logging
-from .plotting_functions import get_log_and_limits, histo2d_scatter_hybrid
+from .plotting_functions import (
+    apply_log,
+    get_histogram_bins,
+    get_log_and_limits,
+    get_log_decision,
+    histo2d_scatter_hybrid,
+    histo2d_scatter_hybrid_chunked,
+)
+from .derived_functions import (
+    DERIVED_COLUMNS,
+    compute_derived_column,
+    get_derived_columns,
+)
+from .filter_functions import evaluate_filter, get_filter_columns
+from .join_functions import SEED_COLUMN, build_seed_index
+from .pyramid_functions import build_histogram_pyramid
 
 # Set up a logger for this file
 logger = logging.getLogger(__name__)
@@ -13,16 +29,32 @@ default_prefs = {
 }
 
 
+# The number of rows read at a time when streaming over whole columns
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+
 def get_h5_keys(h5_file):
     return list(h5_file.keys())
 
 
 def get_h5_subgroups(h5_file, root_group):
-    return get_h5_keys(h5_file[root_group])
+    # Derived columns are listed after the stored columns they can be computed from, see DERIVED_COLUMNS
+    subgroups = get_h5_keys(h5_file[root_group])
+    return subgroups + get_derived_columns(subgroups)
+
+
+def check_subgroup_derived(h5_file, root_group, subgroup):
+    # Derived columns are described from the registry, so they don't need to be computed to be listed
+    return subgroup in DERIVED_COLUMNS and subgroup not in get_h5_keys(
+        h5_file[root_group]
+    )
 
 
 def get_subgroup_units(h5_file, root_group, subgroup):
-    units = h5_file[root_group][subgroup].attrs.get("units", b"-").decode("utf-8")
+    if check_subgroup_derived(h5_file, root_group, subgroup):
+        units = DERIVED_COLUMNS[subgroup]["units"]
+    else:
+        units = h5_file[root_group][subgroup].attrs.get("units", b"-").decode("utf-8")
 
     if units in ["-", "State", "Event"]:
         return None
@@ -36,41 +68,596 @@ def check_subgroup_boolean(h5_file, root_group, subgroup):
     if get_subgroup_units(h5_file, root_group, subgroup) is not None:
         return False
 
+    # Derived columns are always float64
+    if check_subgroup_derived(h5_file, root_group, subgroup):
+        return False
+
     return h5_file[root_group][subgroup].dtype.type is np.uint8
 
 
-def get_h5_subgroup_meta(h5_file, **kwargs):
-    root_group = kwargs.get("root_group") or get_h5_keys(h5_file)[0]
-    subgroup_list = get_h5_subgroups(h5_file, root_group)
+# The sampling modes for plots of large datasets, see get_h5_subgroup_data
+SAMPLING_MODES = ["stride", "random", "reservoir"]
 
-    total_length = h5_file[root_group][subgroup_list[0]].shape[0]
-    stride_length = 1 if total_length < 1e6 else int(total_length / 5e5)
+# The seed used for random sampling, so that samples are reproducible
+SAMPLE_SEED = 0
 
+
+def get_stride_length(total_length):
+    # Stride large datasets down to roughly half a million points
+    return 1 if total_length < 1e6 else int(total_length / 5e5)
+
+
+def get_sample_size(total_length):
+    # Sample large datasets down to half a million points, the same budget as striding
+    return total_length if total_length < 1e6 else int(5e5)
+
+
+def get_sample_fraction(total_length, sampling="stride", stride_length=1):
+    # The fraction of rows plotted for a sampling mode
+    if not total_length:
+        return 1.0
+    if sampling == "stride":
+        return -(-total_length // stride_length) / total_length
+    return get_sample_size(total_length) / total_length
+
+
+def get_plot_subgroups(root_group, subgroup_list, subgroup_x=None, subgroup_y=None):
     default_values = default_prefs.get(root_group, None)
 
-    subgroup_x = kwargs.get("subgroup_x") or (
+    subgroup_x = subgroup_x or (
         default_values[0] if default_values else subgroup_list[0]
     )
 
-    subgroup_y = kwargs.get("subgroup_y") or (
+    subgroup_y = subgroup_y or (
         default_values[1] if default_values else subgroup_list[1]
     )
 
+    return subgroup_x, subgroup_y
+
+
+def get_h5_subgroup_meta(h5_file, **kwargs):
+    root_group = kwargs.get("root_group") or get_h5_keys(h5_file)[0]
+    subgroup_list = get_h5_subgroups(h5_file, root_group)
+
+    root_group_y = kwargs.get("root_group_y") or root_group
+    subgroup_list_y = get_h5_subgroups(h5_file, root_group_y)
+
+    total_length = h5_file[root_group][subgroup_list[0]].shape[0]
+
+    subgroup_x, _ = get_plot_subgroups(
+        root_group, subgroup_list, kwargs.get("subgroup_x"), kwargs.get("subgroup_y")
+    )
+    # The y axis can come from a different group, joined on SEED
+    _, subgroup_y = get_plot_subgroups(
+        root_group_y,
+        subgroup_list_y,
+        kwargs.get("subgroup_x"),
+        kwargs.get("subgroup_y"),
+    )
+    stride_length = kwargs.get("stride_length") or get_stride_length(total_length)
+    sampling = kwargs.get("sampling", "stride")
+
     return {
         "groups": [key for key in get_h5_keys(h5_file) if key not in ["Run_Details"]],
         "group": root_group,
         "subgroups": subgroup_list,
         "subgroup_x": subgroup_x,
         "subgroup_y": subgroup_y,
+        "group_y": root_group_y,
+        "subgroups_y": subgroup_list_y,
         "subgroup_x_unit": get_subgroup_units(h5_file, root_group, subgroup_x),
-        "subgroup_y_unit": get_subgroup_units(h5_file, root_group, subgroup_y),
-        "stride_length": kwargs.get("stride_length", stride_length),
+        "subgroup_y_unit": get_subgroup_units(h5_file, root_group_y, subgroup_y),
+        "stride_length": stride_length,
         "total_length": total_length,
+        "sampling": sampling,
+        "sample_fraction": get_sample_fraction(total_length, sampling, stride_length),
+    }
+
+
+def get_h5_schema(h5_file):
+    """Reads the layout of a H5 file, so that it can be indexed without having to open the file again
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file to be indexed
+
+    Returns
+    -------
+    list
+        List of (group, subgroups) tuples in file order, where subgroups is a list of dicts
+        containing the name, dtype, units, length and boolean and derived flags of each dataset in the group,
+        followed by the derived columns of the group, which are not computed
+    """
+    schema = []
+    for root_group in get_h5_keys(h5_file):
+        if not isinstance(h5_file[root_group], h5py.Group):
+            continue
+
+        subgroups = []
+        for subgroup in get_h5_keys(h5_file[root_group]):
+            dataset = h5_file[root_group][subgroup]
+            if not isinstance(dataset, h5py.Dataset):
+                continue
+
+            subgroups.append(
+                {
+                    "name": subgroup,
+                    "dtype": str(dataset.dtype),
+                    "units": get_subgroup_units(h5_file, root_group, subgroup),
+                    "length": dataset.shape[0] if dataset.shape else 1,
+                    "is_bool": check_subgroup_boolean(h5_file, root_group, subgroup),
+                    "is_derived": False,
+                }
+            )
+
+        stored = [subgroup["name"] for subgroup in subgroups]
+        for subgroup in get_derived_columns(stored):
+            inputs = DERIVED_COLUMNS[subgroup]["inputs"]
+            subgroups.append(
+                {
+                    "name": subgroup,
+                    "dtype": str(np.dtype(np.float64)),
+                    "units": get_subgroup_units(h5_file, root_group, subgroup),
+                    "length": subgroups[stored.index(inputs[0])]["length"],
+                    "is_bool": False,
+                    "is_derived": True,
+                }
+            )
+        schema.append((root_group, subgroups))
+
+    return schema
+
+
+def get_chunk_rows(dataset, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Round the number of rows to read at a time to a whole number of HDF5 chunks, so no chunk is decompressed twice
+    if dataset.chunks:
+        return max(
+            dataset.chunks[0], chunk_rows // dataset.chunks[0] * dataset.chunks[0]
+        )
+    return chunk_rows
+
+
+def get_h5_column(dataset):
+    """Returns a read-only array of a numeric column that is memory-mapped from the file, if the column is
+    stored contiguously without compression, so slicing it doesn't copy the data and its pages are shared
+    between processes through the page cache. Otherwise returns the dataset itself, which reads slices
+    from the file
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        Dataset of the column
+
+    Returns
+    -------
+    numpy.memmap or h5py.Dataset
+        The column, which can be sliced in the same way either way
+    """
+    offset = dataset.id.get_offset()
+    if (
+        offset is not None
+        and dataset.size
+        and dataset.dtype.kind in "biuf"
+        and dataset.id.get_create_plist().get_layout() == h5py.h5d.CONTIGUOUS
+        and not dataset.external
+        and dataset.file.driver == "sec2"
+    ):
+        return np.memmap(
+            dataset.file.filename,
+            dtype=dataset.dtype,
+            mode="r",
+            offset=offset,
+            shape=dataset.shape,
+        )
+    return dataset
+
+
+def iter_chunk_slices(length, chunk_rows):
+    for start in range(0, length, chunk_rows):
+        yield slice(start, min(start + chunk_rows, length))
+
+
+def iter_h5_subgroup_chunks(
+    h5_file, root_group, subgroups, chunk_rows=DEFAULT_CHUNK_ROWS, mask=None
+):
+    """Iterates over aligned chunks of rows of several subgroups of the same group
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroups : list
+        Subgroups to read
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+    mask : array_like, optional
+        Boolean mask of the rows to include, by default every row
+
+    Yields
+    ------
+    list
+        List of arrays containing the same rows of each subgroup
+    """
+    datasets = [h5_file[root_group][subgroup] for subgroup in subgroups]
+    chunk_rows = get_chunk_rows(datasets[0], chunk_rows)
+    datasets = [get_h5_column(dataset) for dataset in datasets]
+    for chunk_slice in iter_chunk_slices(datasets[0].shape[0], chunk_rows):
+        if mask is None:
+            yield [dataset[chunk_slice] for dataset in datasets]
+        elif mask[chunk_slice].any():
+            yield [dataset[chunk_slice][mask[chunk_slice]] for dataset in datasets]
+
+
+def save_h5_derived_column(
+    h5_file, root_group, subgroup, path, chunk_rows=DEFAULT_CHUNK_ROWS
+):
+    """Computes a derived column from its input columns a chunk at a time, and saves it to a new H5 file at the
+    same location as it would have in the data file, so it can be read like a stored column
+
+    The column is saved without chunking or compression, as it is read far more often than it is written
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the input columns
+    root_group : str
+        The base group of the H5 file
+    subgroup : str
+        Name of the derived column, see DERIVED_COLUMNS
+    path : str or Path
+        Path of the H5 file to create
+    chunk_rows : int, optional
+        Approximate number of rows to compute at a time, by default DEFAULT_CHUNK_ROWS
+    """
+    column = DERIVED_COLUMNS[subgroup]
+    inputs = [h5_file[root_group][name] for name in column["inputs"]]
+    length = inputs[0].shape[0]
+    chunk_rows = get_chunk_rows(inputs[0], chunk_rows)
+    inputs = [get_h5_column(dataset) for dataset in inputs]
+    with h5py.File(path, "w") as f:
+        dataset = f.create_dataset(
+            f"{root_group}/{subgroup}", shape=(length,), dtype=np.float64
+        )
+        dataset.attrs["units"] = np.bytes_(column["units"])
+
+        for chunk_slice in iter_chunk_slices(length, chunk_rows):
+            dataset[chunk_slice] = compute_derived_column(
+                subgroup, [values[chunk_slice] for values in inputs]
+            )
+
+
+def check_float32_lossless(dataset, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Whether every value of a float64 column is exactly representable as a float32, e.g. if it was
+    # written from float32 values
+    chunk_rows = get_chunk_rows(dataset, chunk_rows)
+    column = get_h5_column(dataset)
+    for chunk_slice in iter_chunk_slices(dataset.shape[0], chunk_rows):
+        values = column[chunk_slice]
+        with np.errstate(over="ignore"):
+            if not np.array_equal(values.astype(np.float32), values, equal_nan=True):
+                return False
+    return True
+
+
+def repack_h5_file(h5_file, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Writes a copy of a H5 file laid out for reading whole columns, with the same groups, datasets and
+    attributes
+
+    Numeric columns are stored contiguously without compression, whatever their chunking and compression
+    in the original file, and float64 columns are stored as float32 if no value changes. Other datasets are
+    copied unchanged
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file to be copied
+    path : str or Path
+        Path of the H5 file to create
+    chunk_rows : int, optional
+        Approximate number of rows to copy at a time, by default DEFAULT_CHUNK_ROWS
+    """
+    with h5py.File(path, "w") as f:
+        f.attrs.update(h5_file.attrs)
+
+        def copy_item(name, item):
+            if isinstance(item, h5py.Group):
+                f.require_group(name).attrs.update(item.attrs)
+            elif item.ndim != 1 or item.dtype.kind not in "biuf":
+                f.copy(item, name)
+            else:
+                dtype = item.dtype
+                if dtype == np.float64 and check_float32_lossless(item, chunk_rows):
+                    dtype = np.dtype(np.float32)
+
+                dataset = f.create_dataset(name, shape=item.shape, dtype=dtype)
+                dataset.attrs.update(item.attrs)
+                column = get_h5_column(item)
+                for chunk_slice in iter_chunk_slices(
+                    item.shape[0], get_chunk_rows(item, chunk_rows)
+                ):
+                    dataset[chunk_slice] = column[chunk_slice]
+
+        h5_file.visititems(copy_item)
+
+
+def get_h5_filter_mask(h5_file, root_group, tree, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Evaluates a parsed filter over every row of a group, reading only the columns used in the filter,
+    a chunk of rows at a time
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    tree : tuple
+        Parsed filter from parse_filter
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+
+    Returns
+    -------
+    array_like
+        Boolean mask of the rows that match the filter
+
+    Raises
+    ------
+    ValueError
+        If the filter uses a column that isn't numeric
+    """
+    columns = get_filter_columns(tree)
+    for column in columns:
+        if h5_file[root_group][column].dtype.kind not in "biuf":
+            raise ValueError(f"Column {column} can't be used in a filter")
+
+    dataset = h5_file[root_group][(columns or get_h5_subgroups(h5_file, root_group))[0]]
+    datasets = {
+        column: get_h5_column(h5_file[root_group][column]) for column in columns
     }
+    mask = np.empty(dataset.shape[0], dtype=bool)
+    for chunk_slice in iter_chunk_slices(
+        dataset.shape[0], get_chunk_rows(dataset, chunk_rows)
+    ):
+        data = {column: datasets[column][chunk_slice] for column in columns}
+        # Filters that don't use any columns give a single value for every row
+        mask[chunk_slice] = evaluate_filter(tree, data)
+    return mask
+
+
+def get_random_sample_indices(total_length, sample_size, seed=SAMPLE_SEED):
+    """Returns a sorted, reproducible uniform random sample of row indices, without replacement"""
+    if sample_size >= total_length:
+        return np.arange(total_length)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(total_length, sample_size, replace=False))
 
 
-def get_h5_subgroup_data(h5_file, root_group, subgroup_x, subgroup_y, stride_length=1):
-    """Takes a H5 file and returns the data necessary for a histogram-scatter plot
+def read_h5_rows(
+    h5_file, root_group, subgroups, indices, chunk_rows=DEFAULT_CHUNK_ROWS
+):
+    """Reads the specified rows of several subgroups of the same group, a chunk of rows at a time,
+    skipping any chunks that don't contain any of the rows
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroups : list
+        Subgroups to read
+    indices : array_like
+        Sorted indices of the rows to read
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+
+    Returns
+    -------
+    list
+        List of arrays containing the rows of each subgroup
+    """
+    datasets = [h5_file[root_group][subgroup] for subgroup in subgroups]
+    chunk_rows = get_chunk_rows(datasets[0], chunk_rows)
+    datasets = [get_h5_column(dataset) for dataset in datasets]
+
+    parts = [[np.empty(0, dtype=dataset.dtype)] for dataset in datasets]
+    for chunk_slice in iter_chunk_slices(datasets[0].shape[0], chunk_rows):
+        start, stop = np.searchsorted(indices, [chunk_slice.start, chunk_slice.stop])
+        if start == stop:
+            continue
+
+        chunk_indices = indices[start:stop] - chunk_slice.start
+        for part, dataset in zip(parts, datasets):
+            part.append(dataset[chunk_slice][chunk_indices])
+
+    return [np.concatenate(part) for part in parts]
+
+
+def reservoir_sample_h5_rows(
+    h5_file,
+    root_group,
+    subgroups,
+    sample_size,
+    seed=SAMPLE_SEED,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    mask=None,
+):
+    """Takes a reproducible uniform random sample of rows of several subgroups of the same group, in a single
+    streaming pass without knowing the number of rows in advance
+
+    Every row is given a random key, and the rows with the smallest keys seen so far are kept in the reservoir,
+    which is equivalent to reservoir sampling but can be done a chunk at a time
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroups : list
+        Subgroups to read
+    sample_size : int
+        The number of rows to sample
+    seed : int, optional
+        Seed of the random keys, by default SAMPLE_SEED
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+    mask : array_like, optional
+        Boolean mask of the rows to sample from, by default every row
+
+    Returns
+    -------
+    list
+        List of arrays containing the sampled rows of each subgroup, in file order
+    """
+    rng = np.random.default_rng(seed)
+    keys, rows = np.empty(0), np.empty(0, dtype=np.int64)
+    samples = [np.empty(0, dtype=h5_file[root_group][s].dtype) for s in subgroups]
+
+    start = 0
+    for chunks in iter_h5_subgroup_chunks(
+        h5_file, root_group, subgroups, chunk_rows, mask
+    ):
+        keys = np.concatenate([keys, rng.random(len(chunks[0]))])
+        rows = np.concatenate([rows, np.arange(start, start + len(chunks[0]))])
+        samples = [np.concatenate(pair) for pair in zip(samples, chunks)]
+        start += len(chunks[0])
+
+        if len(keys) > sample_size:
+            keep = np.argpartition(keys, sample_size)[:sample_size]
+            keys, rows = keys[keep], rows[keep]
+            samples = [sample[keep] for sample in samples]
+
+    order = np.argsort(rows)
+    return [sample[order] for sample in samples]
+
+
+def get_column_statistics(dataset, chunk_rows=DEFAULT_CHUNK_ROWS, sketch=None):
+    """Computes summary statistics of a numeric H5 dataset in a single streaming pass, reading
+    a fixed number of rows at a time
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        1D numeric dataset
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+    sketch : QuantileSketch, optional
+        Sketch to add the finite values of the dataset to in the same pass, by default None
+
+    Returns
+    -------
+    dict
+        Dictionary containing the number of rows, the counts of NaN, infinite and zero values, and the minimum,
+        maximum and minimum positive value of the finite values (None if there are no such values)
+    """
+    stats = {
+        "count": 0,
+        "nan_count": 0,
+        "inf_count": 0,
+        "zero_count": 0,
+        "min": None,
+        "max": None,
+        "min_positive": None,
+    }
+
+    def merge(key, value, func):
+        stats[key] = value if stats[key] is None else func(stats[key], value)
+
+    chunk_rows = get_chunk_rows(dataset, chunk_rows)
+    column = get_h5_column(dataset)
+    for chunk_slice in iter_chunk_slices(dataset.shape[0], chunk_rows):
+        chunk = column[chunk_slice]
+        stats["count"] += len(chunk)
+
+        if chunk.dtype.kind == "f":
+            stats["nan_count"] += int(np.isnan(chunk).sum())
+            stats["inf_count"] += int(np.isinf(chunk).sum())
+            chunk = chunk[np.isfinite(chunk)]
+
+        if not len(chunk):
+            continue
+
+        if sketch is not None:
+            sketch.add(chunk)
+
+        stats["zero_count"] += int((chunk == 0).sum())
+        merge("min", float(chunk.min()), min)
+        merge("max", float(chunk.max()), max)
+
+        positive = chunk[chunk > 0]
+        if len(positive):
+            merge("min_positive", float(positive.min()), min)
+
+    return stats
+
+
+def read_h5_sample(
+    h5_file,
+    root_group,
+    subgroups,
+    stride_length=1,
+    sampling="stride",
+    sample_indices=None,
+    mask=None,
+):
+    """Reads the same sample of rows of several subgroups of the same group, see get_h5_subgroup_data for
+    the sampling modes. If a mask is given, only the rows it includes are sampled
+
+    Returns
+    -------
+    list
+        List of arrays containing the sampled rows of each subgroup
+    """
+    if mask is not None:
+        rows = np.flatnonzero(mask)
+        if sampling == "stride":
+            return read_h5_rows(h5_file, root_group, subgroups, rows[::stride_length])
+        if sampling == "random":
+            sample = get_random_sample_indices(len(rows), get_sample_size(len(rows)))
+            return read_h5_rows(h5_file, root_group, subgroups, rows[sample])
+        if sampling == "reservoir":
+            return reservoir_sample_h5_rows(
+                h5_file, root_group, subgroups, get_sample_size(len(rows)), mask=mask
+            )
+        raise ValueError(f"Unknown sampling mode {sampling}")
+
+    total_length = h5_file[root_group][subgroups[0]].shape[0]
+    if sampling == "stride":
+        return [
+            get_h5_column(h5_file[root_group][subgroup])[::stride_length]
+            for subgroup in subgroups
+        ]
+    if sampling == "random":
+        if sample_indices is None:
+            sample_indices = get_random_sample_indices(
+                total_length, get_sample_size(total_length)
+            )
+        return read_h5_rows(h5_file, root_group, subgroups, sample_indices)
+    if sampling == "reservoir":
+        return reservoir_sample_h5_rows(
+            h5_file, root_group, subgroups, get_sample_size(total_length)
+        )
+    raise ValueError(f"Unknown sampling mode {sampling}")
+
+
+def get_h5_subgroup_data(
+    h5_file,
+    root_group,
+    subgroup_x,
+    subgroup_y,
+    stride_length=1,
+    bins=40,
+    encoding="json",
+    statistics=None,
+    sampling="stride",
+    sample_indices=None,
+    mask=None,
+):
+    """Takes a H5 file and returns the data necessary for a histogram-scatter plot of a sample of the rows
 
     Parameters
     ----------
@@ -83,15 +670,39 @@ def get_h5_subgroup_data(h5_file, root_group, subgroup_x, subgroup_y, stride_len
     subgroup_y : str
         subgroup for the y axis
     stride_length : int, optional
-        Will use obtain a subset of the data by striding at this interval, by default 1
+        Will use obtain a subset of the data by striding at this interval if sampling is "stride", by default 1
+    bins : int, optional
+        The number of histogram bins in each dimension, by default 40
+    encoding : str, optional
+        Encoding of the histogram and scatter data, see histo2d_scatter_hybrid, by default "json"
+    statistics : dict, optional
+        Precomputed statistics for the subgroups, keyed by subgroup name. Each entry should contain the
+        min, max, min_positive and is_bool values of the full column. If provided, these are used to decide
+        on logging and plot limits instead of the (sampled) data, by default None
+    sampling : str, optional
+        How rows are sampled, one of SAMPLING_MODES. "stride" takes every stride_length-th row, which can alias
+        with any ordering of the rows. "random" takes a uniform random sample of get_sample_size rows, and
+        "reservoir" takes a sample of the same size in a single streaming pass, by default "stride"
+    sample_indices : array_like, optional
+        Precomputed sorted row indices for "random" sampling, by default get_random_sample_indices
+    mask : array_like, optional
+        Boolean mask of the rows to plot, e.g. from get_h5_filter_mask. The rows it includes are sampled
+        instead of every row, and sample_indices is ignored, by default every row
 
     Returns
     -------
     dict
         Dictionary with the required data and metadata
     """
-    data_group_x = h5_file[root_group][subgroup_x][::stride_length]
-    data_group_y = h5_file[root_group][subgroup_y][::stride_length]
+    data_group_x, data_group_y = read_h5_sample(
+        h5_file,
+        root_group,
+        [subgroup_x, subgroup_y],
+        stride_length,
+        sampling,
+        sample_indices,
+        mask,
+    )
 
     if data_group_x.dtype.type is np.bytes_ or data_group_y.dtype.type is np.bytes_:
         logger.warning("One of the subgroups has a dtype of string")
@@ -99,18 +710,21 @@ def get_h5_subgroup_data(h5_file, root_group, subgroup_x, subgroup_y, stride_len
 
     data_group_x, data_group_y = remove_null_coords(data_group_x, data_group_y)
 
-    # Check that the data is boolean
-    bool_check_x = check_subgroup_boolean(h5_file, root_group, subgroup_x)
-    bool_check_y = check_subgroup_boolean(h5_file, root_group, subgroup_y)
-
-    # Check for log, get limits and flag if the minimum value is representing a log(0)
-    data_group_x, log_check_x, min_max_x, null_check_x = get_log_and_limits(
-        data_group_x, bool_check_x
+    statistics = statistics or {}
+    data_group_x, bool_check_x, log_check_x, min_max_x, null_check_x = (
+        get_log_and_limits_from_statistics(
+            h5_file, root_group, subgroup_x, data_group_x, statistics.get(subgroup_x)
+        )
     )
-    data_group_y, log_check_y, min_max_y, null_check_y = get_log_and_limits(
-        data_group_y, bool_check_y
+    data_group_y, bool_check_y, log_check_y, min_max_y, null_check_y = (
+        get_log_and_limits_from_statistics(
+            h5_file, root_group, subgroup_y, data_group_y, statistics.get(subgroup_y)
+        )
+    )
+
+    plot_data = histo2d_scatter_hybrid(
+        data_group_x, data_group_y, min_max_x, min_max_y, bins=bins, encoding=encoding
     )
-    plot_data = histo2d_scatter_hybrid(data_group_x, data_group_y, min_max_x, min_max_y)
 
     plot_data["min_max_x"] = min_max_x
     plot_data["min_max_y"] = min_max_y
@@ -127,6 +741,627 @@ def get_h5_subgroup_data(h5_file, root_group, subgroup_x, subgroup_y, stride_len
     return plot_data
 
 
+def get_h5_seed_index(h5_file, root_group):
+    """Builds the SEED join index of a group, see build_seed_index, or returns None if the group doesn't
+    have a SEED column"""
+    if SEED_COLUMN not in h5_file[root_group]:
+        return None
+    return build_seed_index(get_h5_column(h5_file[root_group][SEED_COLUMN])[()])
+
+
+def get_h5_joined_subgroup_data(
+    h5_file,
+    root_group_x,
+    subgroup_x,
+    root_group_y,
+    subgroup_y,
+    rows_x,
+    rows_y,
+    stride_length=1,
+    bins=40,
+    encoding="json",
+    statistics_x=None,
+    statistics_y=None,
+    sampling="stride",
+):
+    """Takes a H5 file and returns the data necessary for a histogram-scatter plot of subgroups from two
+    different groups, pairing up the rows of the same systems found by join_seed_indexes
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group_x : str
+        The group of the subgroup for the x axis
+    subgroup_x : str
+        Subgroup for the x axis
+    root_group_y : str
+        The group of the subgroup for the y axis
+    subgroup_y : str
+        Subgroup for the y axis
+    rows_x : array_like
+        Sorted row indices of the joined pairs in the x group
+    rows_y : array_like
+        Row indices of the joined pairs in the y group
+    stride_length : int, optional
+        Will obtain a subset of the pairs by striding at this interval if sampling is "stride", by default 1
+    bins : int, optional
+        The number of histogram bins in each dimension, by default 40
+    encoding : str, optional
+        Encoding of the histogram and scatter data, see histo2d_scatter_hybrid, by default "json"
+    statistics_x : dict, optional
+        Precomputed statistics of the full column of the x subgroup, see get_h5_subgroup_data, by default None
+    statistics_y : dict, optional
+        Precomputed statistics of the full column of the y subgroup, see get_h5_subgroup_data, by default None
+    sampling : str, optional
+        How pairs are sampled, one of SAMPLING_MODES. "random" and "reservoir" both take a uniform random
+        sample of get_sample_size pairs, as the pairs are already in memory, by default "stride"
+
+    Returns
+    -------
+    dict
+        Dictionary with the required data and metadata
+    """
+    if sampling == "stride":
+        rows_x, rows_y = rows_x[::stride_length], rows_y[::stride_length]
+    elif sampling in ["random", "reservoir"]:
+        sample = get_random_sample_indices(len(rows_x), get_sample_size(len(rows_x)))
+        rows_x, rows_y = rows_x[sample], rows_y[sample]
+    else:
+        raise ValueError(f"Unknown sampling mode {sampling}")
+
+    (data_group_x,) = read_h5_rows(h5_file, root_group_x, [subgroup_x], rows_x)
+    # The rows of the y group aren't in file order, so are read in order and then put back in pair order
+    unique_rows_y, inverse = np.unique(rows_y, return_inverse=True)
+    (data_group_y,) = read_h5_rows(h5_file, root_group_y, [subgroup_y], unique_rows_y)
+    data_group_y = data_group_y[inverse]
+
+    if data_group_x.dtype.type is np.bytes_ or data_group_y.dtype.type is np.bytes_:
+        logger.warning("One of the subgroups has a dtype of string")
+        return None
+
+    data_group_x, data_group_y = remove_null_coords(data_group_x, data_group_y)
+
+    data_group_x, bool_check_x, log_check_x, min_max_x, null_check_x = (
+        get_log_and_limits_from_statistics(
+            h5_file, root_group_x, subgroup_x, data_group_x, statistics_x
+        )
+    )
+    data_group_y, bool_check_y, log_check_y, min_max_y, null_check_y = (
+        get_log_and_limits_from_statistics(
+            h5_file, root_group_y, subgroup_y, data_group_y, statistics_y
+        )
+    )
+
+    return {
+        **histo2d_scatter_hybrid(
+            data_group_x,
+            data_group_y,
+            min_max_x,
+            min_max_y,
+            bins=bins,
+            encoding=encoding,
+        ),
+        "min_max_x": min_max_x,
+        "min_max_y": min_max_y,
+        "null_check_x": null_check_x,
+        "null_check_y": null_check_y,
+        "log_check_x": log_check_x,
+        "log_check_y": log_check_y,
+        "bool_check_x": bool_check_x,
+        "bool_check_y": bool_check_y,
+    }
+
+
+def get_h5_subgroup_data_batch(
+    h5_file,
+    root_group,
+    pairs,
+    stride_length=1,
+    bins=40,
+    encoding="json",
+    statistics=None,
+    sampling="stride",
+    sample_indices=None,
+    mask=None,
+):
+    """Takes a H5 file and returns the data necessary for histogram-scatter plots of several pairs of
+    subgroups of the same group, reading each distinct subgroup only once
+
+    Each plot is the same as get_h5_subgroup_data would return for the pair. Subgroups with precomputed
+    statistics are only logged once, and shared between every plot they appear in
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    pairs : list
+        List of (subgroup_x, subgroup_y) pairs to plot
+    stride_length : int, optional
+        Will use obtain a subset of the data by striding at this interval if sampling is "stride", by default 1
+    bins : int, optional
+        The number of histogram bins in each dimension, by default 40
+    encoding : str, optional
+        Encoding of the histogram and scatter data, see histo2d_scatter_hybrid, by default "json"
+    statistics : dict, optional
+        Precomputed statistics for the subgroups, see get_h5_subgroup_data, by default None
+    sampling : str, optional
+        How rows are sampled, see get_h5_subgroup_data, by default "stride"
+    sample_indices : array_like, optional
+        Precomputed sorted row indices for "random" sampling, by default get_random_sample_indices
+    mask : array_like, optional
+        Boolean mask of the rows to plot, see get_h5_subgroup_data, by default every row
+
+    Returns
+    -------
+    list
+        List of dictionaries with the required data and metadata for each pair, or None for pairs
+        where one of the subgroups has a dtype of string
+    """
+    subgroups = list(dict.fromkeys(subgroup for pair in pairs for subgroup in pair))
+    subgroups = [
+        subgroup
+        for subgroup in subgroups
+        if h5_file[root_group][subgroup].dtype.type is not np.bytes_
+    ]
+    columns = {}
+    if subgroups:
+        columns = dict(
+            zip(
+                subgroups,
+                read_h5_sample(
+                    h5_file,
+                    root_group,
+                    subgroups,
+                    stride_length,
+                    sampling,
+                    sample_indices,
+                    mask,
+                ),
+            )
+        )
+
+    # Log each column with statistics once, nulls are removed per pair afterwards
+    statistics = statistics or {}
+    axes, logged = {}, {}
+    for subgroup, column in columns.items():
+        stats = statistics.get(subgroup)
+        if stats is None or stats["min"] is None:
+            continue
+        axes[subgroup] = (
+            stats["is_bool"],
+            *get_log_decision(
+                stats["min"], stats["max"], stats["min_positive"], stats["is_bool"]
+            ),
+        )
+        logged[subgroup] = apply_log(column, axes[subgroup][1], axes[subgroup][4])
+
+    results = []
+    for subgroup_x, subgroup_y in pairs:
+        if subgroup_x not in columns or subgroup_y not in columns:
+            logger.warning("One of the subgroups has a dtype of string")
+            results.append(None)
+            continue
+
+        not_null = np.isfinite(columns[subgroup_x]) & np.isfinite(columns[subgroup_y])
+        data_groups, pair_axes = [], []
+        for subgroup in [subgroup_x, subgroup_y]:
+            if subgroup in axes:
+                data_groups.append(logged[subgroup][not_null])
+                pair_axes.append(axes[subgroup])
+            else:
+                data_group, *checks = get_log_and_limits_from_statistics(
+                    h5_file, root_group, subgroup, columns[subgroup][not_null], None
+                )
+                data_groups.append(data_group)
+                pair_axes.append((*checks, None))
+
+        plot_data = histo2d_scatter_hybrid(
+            *data_groups,
+            pair_axes[0][2],
+            pair_axes[1][2],
+            bins=bins,
+            encoding=encoding,
+        )
+        results.append({**plot_data, **get_plot_axes_metadata(pair_axes)})
+
+    return results
+
+
+def get_h5_subgroup_data_streaming(
+    h5_file,
+    root_group,
+    subgroup_x,
+    subgroup_y,
+    bins=40,
+    encoding="json",
+    statistics=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    x_range=None,
+    y_range=None,
+    mask=None,
+    weights_subgroup=None,
+    weighted_split=False,
+):
+    """Takes a H5 file and returns the data necessary for a histogram-scatter plot of every row, streaming over
+    both subgroups in aligned chunks so that memory use is fixed regardless of the size of the data
+
+    If a range is given for either axis, only the points inside the window are binned, so that zooming
+    in gives the same number of bins over the smaller window. If a weights subgroup is given, e.g. the
+    mixture weights of an importance-sampled population, each row adds its weight to the histogram counts
+    rather than one
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroup_x : str
+        Subgroup for the x axis
+    subgroup_y : str
+        subgroup for the y axis
+    bins : int, optional
+        The number of histogram bins in each dimension, by default 40
+    encoding : str, optional
+        Encoding of the histogram and scatter data, see histo2d_scatter_hybrid, by default "json"
+    statistics : dict, optional
+        Precomputed statistics for the subgroups, see get_h5_subgroup_data. Statistics for any subgroup
+        not included are computed with an extra pass over its column, by default None
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+    x_range : list, optional
+        Min and max x values of the window to plot, after logging, by default the full extent of the data
+    y_range : list, optional
+        Min and max y values of the window to plot, after logging, by default the full extent of the data
+    mask : array_like, optional
+        Boolean mask of the rows to plot, e.g. from get_h5_filter_mask, by default every row
+    weights_subgroup : str, optional
+        Subgroup containing the non-negative weight of each row, by default None
+    weighted_split : bool, optional
+        Whether bins with a weighted count above min_count are also drawn in the histogram, see
+        histo2d_scatter_hybrid_chunked, by default False
+
+    Returns
+    -------
+    dict
+        Dictionary with the required data and metadata
+
+    Raises
+    ------
+    ValueError
+        If the weights subgroup isn't numeric, or contains negative weights
+    """
+    axes = get_h5_plot_axes(
+        h5_file, root_group, subgroup_x, subgroup_y, statistics, chunk_rows
+    )
+    if axes is None:
+        return None
+
+    if weights_subgroup is not None:
+        check_h5_weights(
+            h5_file,
+            root_group,
+            weights_subgroup,
+            (statistics or {}).get(weights_subgroup),
+            chunk_rows,
+        )
+
+    min_max_x = list(x_range or axes[0][2])
+    min_max_y = list(y_range or axes[1][2])
+
+    chunks = iter_h5_plot_chunks(
+        h5_file,
+        root_group,
+        subgroup_x,
+        subgroup_y,
+        axes,
+        chunk_rows,
+        mask,
+        weights_subgroup,
+    )
+    if x_range or y_range:
+        # Keep the points that fall within the histogram limits, which extend half a bin beyond the window
+        chunks = iter_window_chunks(
+            chunks, *get_histogram_bins(min_max_x, min_max_y, bins)[1]
+        )
+
+    plot_data = histo2d_scatter_hybrid_chunked(
+        chunks,
+        min_max_x,
+        min_max_y,
+        bins=bins,
+        encoding=encoding,
+        weighted_split=weighted_split,
+    )
+
+    return {
+        **plot_data,
+        **get_plot_axes_metadata(axes),
+        "min_max_x": min_max_x,
+        "min_max_y": min_max_y,
+    }
+
+
+def get_h5_plot_axes(
+    h5_file,
+    root_group,
+    subgroup_x,
+    subgroup_y,
+    statistics=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+):
+    """Decides on logging and plot limits for both axes of a plot of whole columns, using precomputed
+    statistics where available and computing them with a streaming pass over the column otherwise
+
+    Returns
+    -------
+    list or None
+        Tuples of (bool_check, log_check, min_max, null_check, zero_value) for the x and y axes,
+        or None if one of the subgroups has a dtype of string
+    """
+    dataset_x = h5_file[root_group][subgroup_x]
+    dataset_y = h5_file[root_group][subgroup_y]
+
+    if dataset_x.dtype.type is np.bytes_ or dataset_y.dtype.type is np.bytes_:
+        logger.warning("One of the subgroups has a dtype of string")
+        return None
+
+    statistics = statistics or {}
+    axes = []
+    for subgroup, dataset in [(subgroup_x, dataset_x), (subgroup_y, dataset_y)]:
+        stats = statistics.get(subgroup) or {
+            **get_column_statistics(dataset, chunk_rows),
+            "is_bool": check_subgroup_boolean(h5_file, root_group, subgroup),
+        }
+        axes.append(
+            (
+                stats["is_bool"],
+                *get_log_decision(
+                    stats["min"], stats["max"], stats["min_positive"], stats["is_bool"]
+                ),
+            )
+        )
+    return axes
+
+
+def check_h5_weights(
+    h5_file, root_group, weights_subgroup, stats=None, chunk_rows=DEFAULT_CHUNK_ROWS
+):
+    # Weights must be numeric and non-negative, which is checked from the statistics of the weights column
+    dataset = h5_file[root_group][weights_subgroup]
+    if dataset.dtype.kind not in "biuf":
+        raise ValueError(f"Weights subgroup {weights_subgroup} must be numeric")
+
+    stats = stats or get_column_statistics(dataset, chunk_rows)
+    if stats["min"] is not None and stats["min"] < 0:
+        raise ValueError(
+            f"Weights subgroup {weights_subgroup} contains negative weights"
+        )
+
+
+def iter_h5_plot_chunks(
+    h5_file,
+    root_group,
+    subgroup_x,
+    subgroup_y,
+    axes,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    mask=None,
+    weights_subgroup=None,
+):
+    # Yields aligned chunks of both subgroups with null coordinates removed and logs applied, along with
+    # the aligned weights if a weights subgroup is given. Rows with null weights are removed too
+    (_, log_check_x, _, _, zero_value_x), (_, log_check_y, _, _, zero_value_y) = axes
+    subgroups = [subgroup_x, subgroup_y]
+    if weights_subgroup is not None:
+        subgroups.append(weights_subgroup)
+
+    for data_group_x, data_group_y, *weights in iter_h5_subgroup_chunks(
+        h5_file, root_group, subgroups, chunk_rows, mask
+    ):
+        not_null = np.isfinite(data_group_x) & np.isfinite(data_group_y)
+        for weight in weights:
+            not_null &= np.isfinite(weight)
+        yield (
+            apply_log(data_group_x[not_null], log_check_x, zero_value_x),
+            apply_log(data_group_y[not_null], log_check_y, zero_value_y),
+            *[weight[not_null] for weight in weights],
+        )
+
+
+def iter_window_chunks(chunks, x_limits, y_limits):
+    # Filters chunks of coordinates, and any aligned weights, down to the points inside the window
+    for x_array, y_array, *weights in chunks:
+        in_window = (
+            (x_array >= x_limits[0])
+            & (x_array <= x_limits[1])
+            & (y_array >= y_limits[0])
+            & (y_array <= y_limits[1])
+        )
+        yield (
+            x_array[in_window],
+            y_array[in_window],
+            *[weight[in_window] for weight in weights],
+        )
+
+
+def get_plot_axes_metadata(axes):
+    # Plot metadata for the axes from get_h5_plot_axes, as plain python types so that it can be serialised
+    metadata = {}
+    for axis, (bool_check, log_check, min_max, null_check, _) in zip("xy", axes):
+        metadata[f"min_max_{axis}"] = [float(value) for value in min_max]
+        metadata[f"null_check_{axis}"] = bool(null_check)
+        metadata[f"log_check_{axis}"] = bool(log_check)
+        metadata[f"bool_check_{axis}"] = bool(bool_check)
+    return metadata
+
+
+def get_h5_subgroup_pyramid(
+    h5_file,
+    root_group,
+    subgroup_x,
+    subgroup_y,
+    bins=40,
+    statistics=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+):
+    """Builds a multi-resolution histogram pyramid of every row of two subgroups, streaming over both
+    subgroups in aligned chunks, see build_histogram_pyramid
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroup_x : str
+        Subgroup for the x axis
+    subgroup_y : str
+        subgroup for the y axis
+    bins : int, optional
+        The number of histogram bins in each dimension of the coarsest level, by default 40
+    statistics : dict, optional
+        Precomputed statistics for the subgroups, see get_h5_subgroup_data_streaming, by default None
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+
+    Returns
+    -------
+    dict, dict or None
+        The histogram pyramid and the plot metadata for the axes, or None if one of the subgroups has a
+        dtype of string
+    """
+    axes = get_h5_plot_axes(
+        h5_file, root_group, subgroup_x, subgroup_y, statistics, chunk_rows
+    )
+    if axes is None:
+        return None
+
+    pyramid = build_histogram_pyramid(
+        iter_h5_plot_chunks(
+            h5_file, root_group, subgroup_x, subgroup_y, axes, chunk_rows
+        ),
+        axes[0][2],
+        axes[1][2],
+        bins=bins,
+    )
+    return pyramid, get_plot_axes_metadata(axes)
+
+
+def get_h5_column_histogram(
+    h5_file,
+    root_group,
+    subgroup,
+    bins=40,
+    statistics=None,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+):
+    """Computes the 1D histogram of every row of a subgroup in a single streaming pass, logging and limiting
+    the values in the same way as the axes of a plot, see get_log_decision
+
+    Parameters
+    ----------
+    h5_file : h5py.File
+        H5 file containing the necessary data
+    root_group : str
+        The base group of the H5 file
+    subgroup : str
+        Subgroup to histogram
+    bins : int, optional
+        The approximate number of histogram bins, see get_histogram_bins, by default 40
+    statistics : dict, optional
+        Precomputed statistics of the full column, see get_h5_subgroup_data. If not provided, they are
+        computed in an extra pass over the column, by default None
+    chunk_rows : int, optional
+        Approximate number of rows to read at a time, by default DEFAULT_CHUNK_ROWS
+
+    Returns
+    -------
+    dict
+        Dictionary with the histogram edges and counts, and the axis metadata, or None if the subgroup
+        has a dtype of string
+    """
+    dataset = h5_file[root_group][subgroup]
+    if dataset.dtype.kind not in "biuf":
+        logger.warning("The subgroup has a dtype of string")
+        return None
+
+    if statistics is None:
+        statistics = {
+            **get_column_statistics(dataset, chunk_rows),
+            "is_bool": check_subgroup_boolean(h5_file, root_group, subgroup),
+        }
+
+    if statistics["min"] is None:
+        # There are no finite values to histogram
+        return {
+            "edges": [],
+            "counts": [],
+            "min_max": None,
+            "log_check": False,
+            "null_check": False,
+            "bool_check": statistics["is_bool"],
+        }
+
+    log_check, min_max, null_check, zero_value = get_log_decision(
+        statistics["min"],
+        statistics["max"],
+        statistics["min_positive"],
+        statistics["is_bool"],
+    )
+    (hist_bins, _), (limits, _) = get_histogram_bins(min_max, min_max, bins)
+
+    counts = np.zeros(hist_bins, dtype=np.int64)
+    chunk_rows = get_chunk_rows(dataset, chunk_rows)
+    column = get_h5_column(dataset)
+    for chunk_slice in iter_chunk_slices(dataset.shape[0], chunk_rows):
+        chunk = column[chunk_slice]
+        chunk = apply_log(chunk[np.isfinite(chunk)], log_check, zero_value)
+        counts += np.histogram(chunk, bins=hist_bins, range=limits)[0]
+
+    return {
+        "edges": np.linspace(*limits, hist_bins + 1).tolist(),
+        "counts": counts.tolist(),
+        "min_max": [float(value) for value in min_max],
+        "log_check": bool(log_check),
+        "null_check": bool(null_check),
+        "bool_check": bool(statistics["is_bool"]),
+    }
+
+
+def get_log_and_limits_from_statistics(h5_file, root_group, subgroup, arr, stats):
+    """Logs the array and finds its plot limits, using precomputed statistics of the full column if available,
+    otherwise falling back to checking the array itself
+
+    Returns
+    -------
+    array_like, bool, bool, list, bool
+        Returns the array, and flags to show if it is boolean and if it has been logged, a list of
+        sensible min and max values for the array when plotted, and a flag to show if the minimum value is
+        representing a log(0)
+    """
+    if stats is None or stats["min"] is None:
+        # Check that the data is boolean
+        bool_check = check_subgroup_boolean(h5_file, root_group, subgroup)
+        # Check for log, get limits and flag if the minimum value is representing a log(0)
+        arr, log_check, min_max, null_check = get_log_and_limits(arr, bool_check)
+        return arr, bool_check, log_check, min_max, null_check
+
+    log_check, min_max, null_check, zero_value = get_log_decision(
+        stats["min"], stats["max"], stats["min_positive"], stats["is_bool"]
+    )
+    return (
+        apply_log(arr, log_check, zero_value),
+        stats["is_bool"],
+        log_check,
+        min_max,
+        null_check,
+    )
+
+
 def remove_null_coords(x_array, y_array):
     # Select only points where both are not null
     null_indices = np.isfinite(x_array) & np.isfinite(y_array)
@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import h5py
+
+# The maximum number of H5 files each process keeps open
+DEFAULT_POOL_SIZE = 16
+
+
+class PooledH5File:
+    def __init__(self, h5_file):
+        self.h5_file = h5_file
+        self.users = 0
+        self.evicted = False
+
+    def close_if_unused(self):
+        # Evicted files are only closed once every user has finished with them
+        if self.evicted and self.users == 0 and self.h5_file.id.valid:
+            self.h5_file.close()
+
+
+class H5FilePool:
+    """A per-process LRU pool of read-only H5 files, keyed by path and modification time
+
+    Files are closed when they are evicted from the pool, or once they are no longer in use if they were
+    in use at the time. A file that has been modified on disk is reopened, and its stale handle evicted
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE):
+        self.max_size = max_size
+        self._files = OrderedDict()
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+
+    def _check_process(self):
+        # Handles inherited from a parent process (e.g. a forked worker) can't be shared, so are dropped
+        # without closing them, as closing them would close the parent's handles
+        if self._pid != os.getpid():
+            self._files = OrderedDict()
+            self._pid = os.getpid()
+
+    def _evict(self, key):
+        entry = self._files.pop(key)
+        entry.evicted = True
+        entry.close_if_unused()
+
+    def _acquire(self, path):
+        path = str(Path(path).absolute())
+        key = (path, os.stat(path).st_mtime_ns)
+
+        with self._lock:
+            self._check_process()
+
+            entry = self._files.get(key)
+            if entry is None:
+                self.discard(path)
+
+                entry = PooledH5File(h5py.File(path, "r"))
+                self._files[key] = entry
+                while len(self._files) > self.max_size:
+                    self._evict(next(iter(self._files)))
+            else:
+                self._files.move_to_end(key)
+
+            entry.users += 1
+            return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.users -= 1
+            entry.close_if_unused()
+
+    @contextmanager
+    def open(self, path):
+        """Context manager returning an open read-only H5 file for the path, from the pool if possible
+
+        The file must not be closed by the caller, as it may be shared with other users of the pool
+        """
+        entry = self._acquire(path)
+        try:
+            yield entry.h5_file
+        finally:
+            self._release(entry)
+
+    def discard(self, path):
+        """Evicts every handle of the path from the pool, closing each one once it is no longer in use"""
+        path = str(Path(path).absolute())
+        with self._lock:
+            self._check_process()
+            for key in [k for k in self._files if k[0] == path]:
+                self._evict(key)
+
+    def clear(self):
+        """Evicts every file from the pool, closing each one once it is no longer in use"""
+        with self._lock:
+            self._check_process()
+            for key in list(self._files):
+                self._evict(key)
+
+    def __len__(self):
+        return len(self._files)
+
+
+h5_file_pool = H5FilePool()
+
+
+def open_h5_file(path):
+    """Opens a read-only H5 file from the shared per-process pool, see H5FilePool.open"""
+    return h5_file_pool.open(path)
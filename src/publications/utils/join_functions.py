@@ -0,0 +1,80 @@
+import numpy as np
+
+# The column identifying the binary system a row of a COMPAS output group belongs to
+SEED_COLUMN = "SEED"
+
+
+def build_seed_index(seeds):
+    """Builds a join index of a SEED column, from which the rows with any seed can be found with searchsorted
+
+    Parameters
+    ----------
+    seeds : array_like
+        SEED of each row of a group, in file order
+
+    Returns
+    -------
+    dict
+        Dictionary containing the sorted unique seeds, the row indices sorted by seed, and the offsets into
+        the sorted row indices of the rows of each unique seed, such that the rows with seeds[i] are
+        order[offsets[i]:offsets[i + 1]]
+    """
+    seeds = np.asarray(seeds)
+    order = np.argsort(seeds, kind="stable")
+    unique_seeds, starts = np.unique(seeds[order], return_index=True)
+    return {
+        "seeds": unique_seeds,
+        "offsets": np.append(starts, len(seeds)).astype(np.int64),
+        "order": order.astype(np.int64),
+    }
+
+
+def save_seed_index(path_or_file, index):
+    """Saves a join index from build_seed_index to a .npz file"""
+    np.savez(path_or_file, **index)
+
+
+def load_seed_index(path):
+    """Loads a join index saved by save_seed_index"""
+    with np.load(path) as data:
+        return {key: data[key] for key in ["seeds", "offsets", "order"]}
+
+
+def join_seed_indexes(index_x, index_y):
+    """Finds the pairs of rows of two groups that belong to the same system, i.e. an inner join on SEED
+
+    Every row of the first group is paired with every row of the second group with the same seed, so e.g. a
+    system with two supernovae is paired with both of them
+
+    Parameters
+    ----------
+    index_x : dict
+        Join index of the first group, from build_seed_index
+    index_y : dict
+        Join index of the second group, from build_seed_index
+
+    Returns
+    -------
+    array_like, array_like
+        Row indices of the pairs in the first and second group, sorted by the row of the first group
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(index_x["seeds"]) or not len(index_y["seeds"]):
+        return empty, empty
+
+    positions = np.searchsorted(index_y["seeds"], index_x["seeds"])
+    positions = np.minimum(positions, len(index_y["seeds"]) - 1)
+    found = index_y["seeds"][positions] == index_x["seeds"]
+
+    # The number of matching rows of the second group, and where they start, for each row of the first group
+    counts_x = np.diff(index_x["offsets"])
+    counts_y = np.where(found, np.diff(index_y["offsets"])[positions], 0)
+    matches = np.repeat(counts_y, counts_x)
+    starts = np.repeat(index_y["offsets"][positions], counts_x)
+
+    rows_x = np.repeat(index_x["order"], matches)
+    within = np.arange(len(rows_x)) - np.repeat(np.cumsum(matches) - matches, matches)
+    rows_y = index_y["order"][np.repeat(starts, matches) + within]
+
+    order = np.argsort(rows_x, kind="stable")
+    return rows_x[order], rows_y[order]
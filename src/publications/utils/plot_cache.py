@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+
+from django.core.cache import caches
+
+# The cache alias used for plot results, see CACHES in the settings
+PLOT_CACHE_ALIAS = "plots"
+
+
+def get_plot_cache_key(dataset_id, file_path, **params):
+    """Builds a cache key for a plot result of a dataset file
+
+    The modification time and size of the file are included in the key, so that results are never
+    served for a file that has since changed on disk
+
+    Parameters
+    ----------
+    dataset_id : int
+        ID of the CompasDatasetModel the file belongs to
+    file_path : str or Path
+        Path to the H5 file the plot was computed from
+    **params
+        Any parameters that affect the plot result, such as the groups, stride length and bins
+
+    Returns
+    -------
+    str
+        Cache key for the plot result
+    """
+    stat = os.stat(file_path)
+    key_data = json.dumps(
+        [dataset_id, stat.st_mtime_ns, stat.st_size, sorted(params.items())],
+        default=str,
+    )
+    return f"plot_data:{hashlib.sha256(key_data.encode()).hexdigest()}"
+
+
+def get_cached_plot(key, compute):
+    """Returns the cached plot result for key, computing and storing it if it isn't cached yet
+
+    Parameters
+    ----------
+    key : str
+        Cache key from get_plot_cache_key
+    compute : callable
+        Called with no arguments to compute the plot result on a cache miss
+
+    Returns
+    -------
+    object
+        The plot result
+    """
+    cache = caches[PLOT_CACHE_ALIAS]
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        # Results of None (e.g. for string subgroups) are cheap to compute and are not cached
+        if result is not None:
+            cache.set(key, result)
+    return result
+
+
+def get_cached_plots(keys, compute):
+    """Returns the cached plot results for several keys, computing and storing any that aren't cached yet
+    together, so that work can be shared between them
+
+    Parameters
+    ----------
+    keys : list
+        Cache keys from get_plot_cache_key
+    compute : callable
+        Called with the list of indices of the keys that missed the cache, and returns a list of the plot
+        results for those keys
+
+    Returns
+    -------
+    list
+        The plot results for each key
+    """
+    cache = caches[PLOT_CACHE_ALIAS]
+    cached = cache.get_many(keys)
+    results = [cached.get(key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, compute(missing)):
+            results[i] = result
+        # Results of None (e.g. for string subgroups) are cheap to compute and are not cached
+        cache.set_many({keys[i]: results[i] for i in missing if results[i] is not None})
+    return results
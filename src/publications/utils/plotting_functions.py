@@ -1,30 +1,96 @@
+import base64
 import json
 import numpy as np
-from itertools import product
+from numpy.lib.stride_tricks import sliding_window_view
 
 
-def get_surrounding_bins(indices, x_lim, y_lim):
-    """Given x and y indices, return the 3x3 indices surrounding the indices
+def get_log_decision(
+    arr_min, arr_max, arr_min_nonzero, is_bool, max_cond=80, min_cond=1e-2
+):
+    """Decides whether or not an array should be logged, and returns sensible limits on the resulting array,
+    using only summary statistics of the array so that they can be computed ahead of time
 
     Parameters
     ----------
-    indices : array_like
-        List containing x and y indices
-    x_lim : upp
-        Upper x limit, beyond which indices should not be found
-    y_lim : int
-        Upper y limit, beyond which indices should not be found
+    arr_min : float
+        Minimum of the array
+    arr_max : float
+        Maximum of the array
+    arr_min_nonzero : float or None
+        Minimum of the non-zero values in the array, only used if the array minimum is 0
+    is_bool : bool
+        Whether the array contains boolean data
+    max_cond : int or float, optional
+        Log array if the maximum is above this value, by default 80
+    min_cond : int or float, optional
+        Log array if the minimum is below this value, by default 1e-2
+
+    Returns
+    -------
+    bool, list, bool, float or None
+        Returns a flag to show if the array should be logged, a list of sensible min and max values for the
+        array when plotted, a flag to show if the minimum value is representing a log(0), and the value that
+        zeroes should be replaced with after logging
+    """
+    # If the data is boolean, we know what the limits should be
+    # While the data will only be 0 or 1, we add a buffer on either side to make the plot look nicer
+    if is_bool:
+        return False, [-0.5, 1.5], False, None
+
+    # If the array minimum is lower than 0, shouldn't be logged
+    if arr_min < 0:
+        return False, [arr_min, arr_max], False, None
+
+    # If the array is uniform, log values if it is above or below a specific threshold, else leave
+    if arr_max == arr_min:
+        if min_cond < arr_max < max_cond or arr_max == 0:
+            return False, [arr_max - 0.01, arr_max + 0.01], False, None
+        return (
+            True,
+            [np.log10(arr_max) - 0.01, np.log10(arr_max) + 0.01],
+            False,
+            None,
+        )
+
+    if min_cond < arr_max < max_cond:
+        return False, [arr_min, arr_max], False, None
+
+    # If there are any zeroes in the data, they are replaced with a value lower than the next lowest value after
+    # logging. This will be used in plotting to display zeroes in a log plot
+    if arr_min == 0:
+        zero_value = np.log10(arr_min_nonzero) - 0.25 * (
+            np.log10(arr_max) - np.log10(arr_min_nonzero)
+        )
+        return True, [zero_value, np.log10(arr_max)], True, zero_value
+
+    return True, [np.log10(arr_min), np.log10(arr_max)], False, None
+
+
+def apply_log(arr, log_check, zero_value=None):
+    """Logs the input array according to the output of get_log_decision
+
+    Parameters
+    ----------
+    arr : array_like
+        Input 1D array to be logged
+    log_check : bool
+        Whether the array should be logged
+    zero_value : float or None, optional
+        Value to replace zeroes with after logging, by default None
 
     Returns
     -------
     array_like
-        Array containing indices for the original indices and all surrounding in a 3x3 block,
-        as long as they are within the limits
+        The logged array, or the input array if it shouldn't be logged
     """
-    x, y = indices
-    x1, x2 = max(x - 1, 0), min(x + 1, x_lim)
-    y1, y2 = max(y - 1, 0), min(y + 1, y_lim)
-    return np.array(list(product(range(x1, x2 + 1), range(y1, y2 + 1))))
+    if not log_check:
+        return arr
+
+    if zero_value is None:
+        return np.log10(arr)
+
+    with np.errstate(divide="ignore"):
+        return np.nan_to_num(np.log10(arr), neginf=zero_value)
 
 
 def get_log_and_limits(arr, is_bool, max_cond=80, min_cond=1e-2):
@@ -48,41 +114,42 @@ def get_log_and_limits(arr, is_bool, max_cond=80, min_cond=1e-2):
     """
     arr_max = float(np.max(arr))
     arr_min = float(np.min(arr))
+    arr_min_nonzero = float(np.min(arr[arr != 0])) if arr_min == 0 < arr_max else None
 
-    # If the data is boolean, we know what the limits should be
-    # While the data will only be 0 or 1, we add a buffer on either side to make the plot look nicer
-    if is_bool:
-        return arr, False, [-0.5, 1.5], False
+    log_check, min_max, null_check, zero_value = get_log_decision(
+        arr_min, arr_max, arr_min_nonzero, is_bool, max_cond, min_cond
+    )
+    return apply_log(arr, log_check, zero_value), log_check, min_max, null_check
 
-    # If the array minimum is lower than 0, shouldn't be logged
-    if arr_min < 0:
-        return arr, False, [arr_min, arr_max], False
 
-    # If the array is uniform, log values if it is above or below a specific threshold, else leave
-    if arr_max == arr_min:
-        if min_cond < arr_max < max_cond or arr_max == 0:
-            return arr, False, [arr_max - 0.01, arr_max + 0.01], False
-        return (
-            np.log10(arr),
-            True,
-            [np.log10(arr_max) - 0.01, np.log10(arr_max) + 0.01],
-            False,
-        )
+def get_histogram_masks(counts, split_count):
+    """Takes the counts output of numpy.histogram2d and returns boolean masks for the bins that should be
+    drawn as a smoothed histogram, and for the remaining bins whose points should be drawn as a scatter plot
 
-    if min_cond < arr_max < max_cond:
-        return arr, False, [arr_min, arr_max], False
+    Every bin with more than split_count counts is dilated to its surrounding 3x3 block, so that the
+    histogram has a smooth border. Only bins with any counts at all are retained in either mask.
+
+    Parameters
+    ----------
+    counts : array_like
+        2D array of histogram bin counts
+    split_count : int
+        The threshold count at which the histogram bins will be split
 
-    logged_arr = np.log10(arr)
+    Returns
+    -------
+    tuple
+        First index contains the mask of smoothed histogram bins, second index contains the mask
+        of the remaining bins with any counts at all
+    """
+    counts = np.asarray(counts)
+    nonzero_mask = counts > 0
 
-    # If there are any negative infinites in the data, we replaced them with a value lower than the next lowest value
-    # This will be used in plotting to display zeroes in a log plot
-    if np.isinf(logged_arr).any():
-        arr_min = np.min(arr[arr != 0])
-        zero_value = np.log10(arr_min) - 0.25 * (np.log10(arr_max) - np.log10(arr_min))
-        logged_arr = np.nan_to_num(logged_arr, neginf=zero_value)
-        return logged_arr, True, [np.min(logged_arr), np.log10(arr_max)], True
+    # Dilate the bins above split_count by one bin in every direction, including diagonals
+    padded = np.pad(counts > split_count, 1)
+    dilated_mask = sliding_window_view(padded, (3, 3)).any(axis=(2, 3))
 
-    return logged_arr, True, [np.min(logged_arr), np.log10(arr_max)], False
+    return dilated_mask & nonzero_mask, nonzero_mask & ~dilated_mask
 
 
 def split_histogram_by_count(counts, split_count):
@@ -103,68 +170,120 @@ def split_histogram_by_count(counts, split_count):
         First index contains an array of the smoothed histogram indices, second index contains the remaining
         indices for bins with any counts at all
     """
-    all_count_indices = np.array(np.where(counts > 0)).T
-    min_count_indices = np.array(np.where(counts > split_count)).T
-
-    x_lim, y_lim = counts.shape
-
-    # Get all coordinates surrounding all histogram bins above split_count
-    min_count_bins = [
-        get_surrounding_bins(entry, x_lim=x_lim - 1, y_lim=y_lim - 1)
-        for entry in min_count_indices
-    ]
+    if not (np.asarray(counts) > split_count).any():
+        return np.array([]), np.argwhere(np.asarray(counts) > 0)
 
-    if not len(min_count_bins):
-        return np.array([]), all_count_indices
+    histogram_mask, scatter_mask = get_histogram_masks(counts, split_count)
 
-    smoothed_indices = np.concatenate(min_count_bins)
+    return np.argwhere(histogram_mask), np.argwhere(scatter_mask)
 
-    # Remove doubles
-    smoothed_indices = np.unique(smoothed_indices, axis=0)
 
-    # For each of the coordinates, retain them only if they have any counts in them
-    smoothed_unique_indices = smoothed_indices[
-        np.asarray(
-            [
-                (entry == all_count_indices).all(axis=1).any()
-                for entry in smoothed_indices
-            ]
-        )
-    ]
+def get_bin_indices(arr, edges):
+    """Returns the index of the histogram bin that each value falls into, using the same convention
+    as numpy.histogram2d: bins are half-open, except for the last bin which includes its right edge
 
-    # Get the coordinates where there are counts, but not covered by smooth histogram
-    inverse_unique_indices = all_count_indices[
-        ~np.asarray(
-            [
-                (entry == smoothed_indices).all(axis=1).any()
-                for entry in all_count_indices
-            ]
-        )
-    ]
+    Parameters
+    ----------
+    arr : array_like
+        Input 1D array of values
+    edges : array_like
+        Monotonically increasing bin edges
 
-    return smoothed_unique_indices, inverse_unique_indices
+    Returns
+    -------
+    array_like
+        Array of bin indices with the same length as arr, set to -1 for values outside the edges
+    """
+    arr = np.asarray(arr)
+    indices = np.searchsorted(edges, arr, side="right") - 1
+    indices[arr == edges[-1]] = len(edges) - 2
+    indices[(indices < 0) | (indices > len(edges) - 2)] = -1
+    return indices
 
 
-def histo2d_scatter_hybrid(
-    x_array, y_array, min_max_x, min_max_y, min_count=3, bins=40
-):
-    """Return data necessary to build a hybrid scatter-histogram plot
+def get_sparse_points(x_array, y_array, x_edges, y_edges, mask):
+    """Flags the points that fall into the histogram bins selected by a mask, e.g. the scatter bins from
+    get_histogram_masks
 
     Parameters
     ----------
-    x_array : array-like
+    x_array : array_like
         Array of x-coordinates for each point
-    y_array : array-like
+    y_array : array_like
         Array of y-coordinates for each point
-    min_count : int, optional
-        The minimum amount of counts in a histogram bin to be plotted, by default 3
-    bins : int, optional
-        The number of bins in each dimension, by default 40
+    x_edges : array_like
+        Bin edges in the x dimension
+    y_edges : array_like
+        Bin edges in the y dimension
+    mask : array_like
+        2D boolean array of the selected bins
+
+    Returns
+    -------
+    array_like
+        Boolean array with the same length as x_array, which is False for points outside the edges
+    """
+    x_indices = get_bin_indices(x_array, x_edges)
+    y_indices = get_bin_indices(y_array, y_edges)
+    in_range = (x_indices >= 0) & (y_indices >= 0)
+    index_array = np.zeros(len(x_indices), dtype=bool)
+    index_array[in_range] = mask[x_indices[in_range], y_indices[in_range]]
+    return index_array
+
+
+def encode_columns(columns, encoding):
+    """Encodes a dictionary of equal length 1D arrays for sending to the client
+
+    Parameters
+    ----------
+    columns : dict
+        Dictionary mapping column names to 1D arrays
+    encoding : str
+        Either "list", for plain lists of numbers, or "base64", for base64 encoded little-endian float32 buffers
 
     Returns
     -------
     dict
-        Contains json data for the scatter plot and histogram, along with the side lengths of the histogram bins
+        Contains the encoded columns, along with the encoding and the number of entries in each column
+    """
+    if encoding == "list":
+        encoded = {
+            key: np.asarray(val, dtype=float).tolist() for key, val in columns.items()
+        }
+    elif encoding == "base64":
+        encoded = {
+            key: base64.b64encode(np.asarray(val, dtype="<f4").tobytes()).decode(
+                "ascii"
+            )
+            for key, val in columns.items()
+        }
+    else:
+        raise ValueError(f"Unknown plot data encoding: {encoding}")
+
+    return {
+        "encoding": encoding,
+        "length": len(next(iter(columns.values()))),
+        **encoded,
+    }
+
+
+def get_histogram_bins(min_max_x, min_max_y, bins):
+    """Returns the number of bins and the limits of the histogram in each dimension
+
+    Parameters
+    ----------
+    min_max_x : list
+        Min and max values of the x-coordinates
+    min_max_y : list
+        Min and max values of the y-coordinates
+    bins : int
+        The approximate number of bins in each dimension
+
+    Returns
+    -------
+    tuple, tuple
+        The number of bins in each dimension, and the (min, max) limits in each dimension,
+        in the form accepted by numpy.histogram2d
     """
     # Small adjustment to the limits to force bins to fall on integer values if that's how the data are
     # This helps with displaying boolean data, and data for classifying stellar types etc.
@@ -177,36 +296,87 @@ def histo2d_scatter_hybrid(
     x_offset, y_offset = 0.5 * x_range / x_bins, 0.5 * y_range / y_bins
     x_limits = (x_min - x_offset, x_max + x_offset)
     y_limits = (y_min - y_offset, y_max + y_offset)
-    counts, x_edges, y_edges = np.histogram2d(
-        x_array, y_array, bins=(x_bins + 1, y_bins + 1), range=(x_limits, y_limits)
-    )
+    return (x_bins + 1, y_bins + 1), (x_limits, y_limits)
+
+
+def hybrid_plot_from_counts(
+    counts,
+    x_edges,
+    y_edges,
+    x_array,
+    y_array,
+    min_count=3,
+    encoding="json",
+    split_counts=None,
+):
+    """Builds the hybrid scatter-histogram plot data from histogram counts and the points that may fall into
+    the sparse bins
 
+    Parameters
+    ----------
+    counts : array_like
+        2D array of histogram bin counts, which may be weighted
+    x_edges : array_like
+        Bin edges in the x dimension
+    y_edges : array_like
+        Bin edges in the y dimension
+    x_array : array-like
+        Array of x-coordinates of candidate scatter points, which must include every point in the sparse bins
+    y_array : array-like
+        Array of y-coordinates of candidate scatter points
+    min_count : int, optional
+        The minimum amount of counts in a histogram bin to be plotted, by default 3
+    encoding : str, optional
+        Either "json", for json strings of per-point objects, or one of the columnar encodings accepted by
+        encode_columns, by default "json"
+    split_counts : array_like, optional
+        2D array of the counts used to split the bins into histogram and scatter bins, e.g. the raw counts
+        of a weighted histogram, by default counts
+
+    Returns
+    -------
+    dict
+        Contains json data for the scatter plot and histogram, along with the side lengths of the histogram bins.
+        For columnar encodings, the data are returned as hist_columns and scatter_columns instead
+    """
     x_centers = (x_edges[1:] + x_edges[:-1]) / 2.0
     y_centers = (y_edges[1:] + y_edges[:-1]) / 2.0
     x_side, y_side = np.abs(x_edges[1] - x_edges[0]), np.abs(y_edges[1] - y_edges[0])
 
-    histogram_indices, scatter_indices = split_histogram_by_count(counts, min_count)
+    histogram_mask, scatter_mask = get_histogram_masks(
+        counts if split_counts is None else split_counts, min_count
+    )
+
+    # Now to grab the scatter points of < min_count, by looking up the bin of every point once
+    x_array, y_array = np.asarray(x_array), np.asarray(y_array)
+    index_array = get_sparse_points(x_array, y_array, x_edges, y_edges, scatter_mask)
+
+    hist_xi, hist_yi = np.nonzero(histogram_mask)
+    hist_columns = {
+        "x": x_centers[hist_xi],
+        "y": y_centers[hist_yi],
+        "counts": counts[hist_xi, hist_yi],
+    }
+    scatter_columns = {
+        "x": x_array[index_array],
+        "y": y_array[index_array],
+    }
+
+    if encoding != "json":
+        return {
+            "sides": [x_side, y_side],
+            "hist_columns": encode_columns(hist_columns, encoding),
+            "scatter_columns": encode_columns(scatter_columns, encoding),
+        }
 
     hist_json = [
-        {"x": x_centers[xi], "y": y_centers[yi], "counts": counts[xi, yi]}
-        for xi, yi in histogram_indices
+        {"x": float(x), "y": float(y), "counts": float(c)}
+        for x, y, c in zip(hist_columns["x"], hist_columns["y"], hist_columns["counts"])
     ]
 
-    # Now to grab the scatter points of < min_count
-    index_array = np.any(
-        [
-            np.logical_and(
-                np.abs(x_array - x_centers[entry[0]]) <= x_side / 2.0,
-                np.abs(y_array - y_centers[entry[1]]) <= y_side / 2.0,
-            )
-            for entry in scatter_indices
-        ],
-        axis=0,
-    )
-
     scatter_json = [
         {"x": float(x), "y": float(y)}
-        for x, y in np.column_stack((x_array, y_array))[index_array]
+        for x, y in zip(scatter_columns["x"], scatter_columns["y"])
     ]
 
     return {
@@ -214,3 +384,118 @@ def histo2d_scatter_hybrid(
         "hist_data": json.dumps(hist_json),
         "scatter_data": json.dumps(scatter_json),
     }
+
+
+def histo2d_scatter_hybrid(
+    x_array, y_array, min_max_x, min_max_y, min_count=3, bins=40, encoding="json"
+):
+    """Return data necessary to build a hybrid scatter-histogram plot
+
+    Parameters
+    ----------
+    x_array : array-like
+        Array of x-coordinates for each point
+    y_array : array-like
+        Array of y-coordinates for each point
+    min_count : int, optional
+        The minimum amount of counts in a histogram bin to be plotted, by default 3
+    bins : int, optional
+        The number of bins in each dimension, by default 40
+    encoding : str, optional
+        Either "json", for json strings of per-point objects, or one of the columnar encodings accepted by
+        encode_columns, by default "json"
+
+    Returns
+    -------
+    dict
+        Contains json data for the scatter plot and histogram, along with the side lengths of the histogram bins.
+        For columnar encodings, the data are returned as hist_columns and scatter_columns instead
+    """
+    hist_bins, hist_range = get_histogram_bins(min_max_x, min_max_y, bins)
+    counts, x_edges, y_edges = np.histogram2d(
+        x_array, y_array, bins=hist_bins, range=hist_range
+    )
+
+    return hybrid_plot_from_counts(
+        counts, x_edges, y_edges, x_array, y_array, min_count, encoding
+    )
+
+
+def histo2d_scatter_hybrid_chunked(
+    chunks,
+    min_max_x,
+    min_max_y,
+    min_count=3,
+    bins=40,
+    encoding="json",
+    weighted_split=False,
+):
+    """Return data necessary to build a hybrid scatter-histogram plot, accumulating the histogram over chunks
+    of points so that memory use doesn't depend on the total number of points
+
+    The points of any bin that is still sparse after a chunk are kept as scatter candidates, and candidates in
+    bins that have since become dense are dropped, so at most min_count points per bin are held at a time
+
+    Parameters
+    ----------
+    chunks : iterable
+        Iterable of (x_array, y_array) tuples of coordinates, with the limits already applied, or of
+        (x_array, y_array, weights) tuples for a weighted histogram
+    min_max_x : list
+        Min and max values of the x-coordinates over all chunks
+    min_max_y : list
+        Min and max values of the y-coordinates over all chunks
+    min_count : int, optional
+        The minimum amount of counts in a histogram bin to be plotted, by default 3
+    bins : int, optional
+        The number of bins in each dimension, by default 40
+    encoding : str, optional
+        Either "json", for json strings of per-point objects, or one of the columnar encodings accepted by
+        encode_columns, by default "json"
+    weighted_split : bool, optional
+        Whether a bin of a weighted histogram whose weighted count is above min_count is also drawn in the
+        histogram, even if it holds few points, by default False. Bins with more than min_count points are
+        always drawn in the histogram, so that the scatter candidates stay bounded whatever the weights
+
+    Returns
+    -------
+    dict
+        The same data as histo2d_scatter_hybrid for the concatenation of all chunks, with weighted histogram
+        counts if weights are given
+    """
+    hist_bins, hist_range = get_histogram_bins(min_max_x, min_max_y, bins)
+    x_edges = np.linspace(*hist_range[0], hist_bins[0] + 1)
+    y_edges = np.linspace(*hist_range[1], hist_bins[1] + 1)
+
+    counts = np.zeros(hist_bins)
+    raw_counts = np.zeros(hist_bins)
+    split_counts = raw_counts
+    candidates_x, candidates_y = np.empty(0), np.empty(0)
+    for x_array, y_array, *weights in chunks:
+        chunk_counts = np.histogram2d(x_array, y_array, bins=(x_edges, y_edges))[0]
+        raw_counts += chunk_counts
+        if weights:
+            chunk_counts = np.histogram2d(
+                x_array, y_array, bins=(x_edges, y_edges), weights=weights[0]
+            )[0]
+        counts += chunk_counts
+        # Small weights would otherwise leave every point as a scatter candidate
+        split_counts = np.maximum(raw_counts, counts) if weighted_split else raw_counts
+
+        candidates_x = np.concatenate([candidates_x, x_array])
+        candidates_y = np.concatenate([candidates_y, y_array])
+        keep = get_sparse_points(
+            candidates_x, candidates_y, x_edges, y_edges, split_counts <= min_count
+        )
+        candidates_x, candidates_y = candidates_x[keep], candidates_y[keep]
+
+    return hybrid_plot_from_counts(
+        counts,
+        x_edges,
+        y_edges,
+        candidates_x,
+        candidates_y,
+        min_count,
+        encoding,
+        split_counts=split_counts,
+    )
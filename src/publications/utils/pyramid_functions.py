@@ -0,0 +1,169 @@
+import json
+import numpy as np
+
+from .plotting_functions import (
+    get_histogram_bins,
+    get_sparse_points,
+    hybrid_plot_from_counts,
+)
+
+# The number of resolutions in a histogram pyramid, each level doubling the number of bins of the previous one
+PYRAMID_LEVELS = 4
+
+
+def build_histogram_pyramid(
+    chunks, min_max_x, min_max_y, bins=40, levels=PYRAMID_LEVELS, min_count=3
+):
+    """Accumulates 2D histograms of the same points at several resolutions, along with every point that
+    could be drawn as a scatter point at any of the resolutions
+
+    Level 0 uses the same bins as histo2d_scatter_hybrid with the given number of bins, and each following
+    level doubles the number of bins in each dimension over the same limits
+
+    Parameters
+    ----------
+    chunks : iterable
+        Iterable of (x_array, y_array) tuples of coordinates, with the limits already applied
+    min_max_x : list
+        Min and max values of the x-coordinates over all chunks
+    min_max_y : list
+        Min and max values of the y-coordinates over all chunks
+    bins : int, optional
+        The number of bins in each dimension of level 0, by default 40
+    levels : int, optional
+        The number of levels in the pyramid, by default PYRAMID_LEVELS
+    min_count : int, optional
+        The minimum amount of counts in a histogram bin to be plotted, by default 3
+
+    Returns
+    -------
+    dict
+        Dictionary of arrays, containing counts_{level}, x_edges_{level} and y_edges_{level} for each level,
+        the candidate scatter points in candidates_x and candidates_y, and the number of bins of level 0
+    """
+    hist_bins, hist_range = get_histogram_bins(min_max_x, min_max_y, bins)
+
+    x_edges = [
+        np.linspace(*hist_range[0], hist_bins[0] * 2**level + 1)
+        for level in range(levels)
+    ]
+    y_edges = [
+        np.linspace(*hist_range[1], hist_bins[1] * 2**level + 1)
+        for level in range(levels)
+    ]
+    counts = [np.zeros((len(x) - 1, len(y) - 1)) for x, y in zip(x_edges, y_edges)]
+
+    candidates_x, candidates_y = np.empty(0), np.empty(0)
+    for x_array, y_array in chunks:
+        candidates_x = np.concatenate([candidates_x, x_array])
+        candidates_y = np.concatenate([candidates_y, y_array])
+
+        keep = np.zeros(len(candidates_x), dtype=bool)
+        for level in range(levels):
+            counts[level] += np.histogram2d(
+                x_array, y_array, bins=(x_edges[level], y_edges[level])
+            )[0]
+            keep |= get_sparse_points(
+                candidates_x,
+                candidates_y,
+                x_edges[level],
+                y_edges[level],
+                counts[level] <= min_count,
+            )
+        candidates_x, candidates_y = candidates_x[keep], candidates_y[keep]
+
+    pyramid = {
+        "bins": np.array(bins),
+        "candidates_x": candidates_x,
+        "candidates_y": candidates_y,
+    }
+    for level in range(levels):
+        pyramid[f"counts_{level}"] = counts[level]
+        pyramid[f"x_edges_{level}"] = x_edges[level]
+        pyramid[f"y_edges_{level}"] = y_edges[level]
+
+    return pyramid
+
+
+def get_pyramid_levels(pyramid):
+    return sum(key.startswith("counts_") for key in pyramid.keys())
+
+
+def save_histogram_pyramid(path, pyramid, metadata):
+    """Saves a histogram pyramid and its plot metadata as a compressed numpy file"""
+    np.savez_compressed(path, metadata=np.array(json.dumps(metadata)), **pyramid)
+
+
+def load_histogram_pyramid(path):
+    """Loads a histogram pyramid saved by save_histogram_pyramid, returning the pyramid and its plot metadata"""
+    with np.load(path) as data:
+        pyramid = {key: data[key] for key in data.files if key != "metadata"}
+        metadata = json.loads(str(data["metadata"]))
+    return pyramid, metadata
+
+
+def get_window_slices(edges, window):
+    # Slices of the bins that overlap the window, and of the edges of those bins
+    start = max(int(np.searchsorted(edges, window[0], side="right")) - 1, 0)
+    end = min(int(np.searchsorted(edges, window[1], side="left")), len(edges) - 1)
+    end = max(end, start + 1)
+    return slice(start, end), slice(start, end + 1)
+
+
+def hybrid_plot_from_pyramid(
+    pyramid, bins=40, x_range=None, y_range=None, min_count=3, encoding="json"
+):
+    """Builds hybrid scatter-histogram plot data from a histogram pyramid, without needing the original points
+
+    The coarsest level that has at least the requested resolution across the requested window in both
+    dimensions is used, falling back to the finest level. For a zoomed window, only the bins overlapping the
+    window are included, so the window is rounded out to the bin edges of the chosen level
+
+    Parameters
+    ----------
+    pyramid : dict
+        Histogram pyramid from build_histogram_pyramid
+    bins : int, optional
+        The number of bins across the window in each dimension, as for histo2d_scatter_hybrid, by default 40
+    x_range : list, optional
+        Min and max x values of the window, by default the full extent of the pyramid
+    y_range : list, optional
+        Min and max y values of the window, by default the full extent of the pyramid
+    min_count : int, optional
+        The minimum amount of counts in a histogram bin to be plotted, this can't be larger than the
+        min_count used to build the pyramid, by default 3
+    encoding : str, optional
+        Encoding of the histogram and scatter data, see histo2d_scatter_hybrid, by default "json"
+
+    Returns
+    -------
+    dict
+        The same data as histo2d_scatter_hybrid
+    """
+    levels = get_pyramid_levels(pyramid)
+    x_full, y_full = pyramid["x_edges_0"], pyramid["y_edges_0"]
+    x_range = x_range or [x_full[0], x_full[-1]]
+    y_range = y_range or [y_full[0], y_full[-1]]
+
+    # Each level doubles the resolution of the previous one, so find how many doublings are needed for the
+    # window to be covered by at least the requested number of bins, relative to the full extent at level 0
+    zoom = max(
+        (x_full[-1] - x_full[0]) / (x_range[1] - x_range[0]),
+        (y_full[-1] - y_full[0]) / (y_range[1] - y_range[0]),
+    )
+    scale = bins * zoom / int(pyramid["bins"])
+    level = min(max(int(np.ceil(np.log2(scale) - 1e-9)), 0), levels - 1)
+
+    x_edges, y_edges = pyramid[f"x_edges_{level}"], pyramid[f"y_edges_{level}"]
+    x_bins, x_window_edges = get_window_slices(x_edges, x_range)
+    y_bins, y_window_edges = get_window_slices(y_edges, y_range)
+
+    return hybrid_plot_from_counts(
+        pyramid[f"counts_{level}"][x_bins, y_bins],
+        x_edges[x_window_edges],
+        y_edges[y_window_edges],
+        pyramid["candidates_x"],
+        pyramid["candidates_y"],
+        min_count,
+        encoding,
+    )
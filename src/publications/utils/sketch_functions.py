@@ -0,0 +1,140 @@
+import numpy as np
+
+# The maximum relative error of the quantiles estimated by a QuantileSketch
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+# The quantiles returned for a column if none are requested
+DEFAULT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def merge_bucket_counts(keys, counts):
+    # Sums the counts of buckets with the same key, returning sorted unique keys
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys, np.bincount(
+        inverse, weights=counts, minlength=len(unique_keys)
+    ).astype(np.int64)
+
+
+class QuantileSketch:
+    """A mergeable streaming sketch of the distribution of a column, from which any quantile can be estimated
+    to within a fixed relative error, using logarithmically sized buckets as in DDSketch
+
+    Values are counted in buckets such that every value in a bucket is within the relative accuracy of the
+    bucket's representative value, separately for positive and negative values. Sketches of different parts of
+    a column can be merged by adding the counts of their buckets, so a column can be sketched a chunk at a time
+    """
+
+    def __init__(self, relative_accuracy=SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.positive = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.negative = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def get_keys(self, values):
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64)
+
+    def get_values(self, keys):
+        # The representative value of each bucket, within the relative accuracy of every value in the bucket
+        return 2 * self.gamma ** keys.astype(float) / (self.gamma + 1)
+
+    def add(self, values):
+        """Adds the finite values of an array to the sketch"""
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+
+        other = QuantileSketch(self.relative_accuracy)
+        for sign, side in [(1, "positive"), (-1, "negative")]:
+            keys = self.get_keys(values[sign * values > 0] * sign)
+            setattr(other, side, merge_bucket_counts(keys, np.ones(len(keys))))
+        other.zero_count = int((values == 0).sum())
+        other.count = len(values)
+        other.min, other.max = float(values.min()), float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        """Adds the counts of another sketch with the same relative accuracy to this sketch"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                "Only sketches with the same relative accuracy can be merged"
+            )
+
+        for side in ["positive", "negative"]:
+            buckets = zip(getattr(self, side), getattr(other, side))
+            setattr(self, side, merge_bucket_counts(*map(np.concatenate, buckets)))
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantiles(self, quantiles):
+        """Estimates quantiles of the values added to the sketch
+
+        Parameters
+        ----------
+        quantiles : list
+            Quantiles to estimate, between 0 and 1
+
+        Returns
+        -------
+        list
+            Estimated value of each quantile, or None for each quantile if the sketch is empty
+        """
+        if not self.count:
+            return [None for _ in quantiles]
+
+        # Every bucket in ascending order of value, with negative values ordered from the largest magnitude
+        negative_keys, negative_counts = self.negative
+        positive_keys, positive_counts = self.positive
+        values = np.concatenate(
+            [
+                -self.get_values(negative_keys[::-1]),
+                [0.0],
+                self.get_values(positive_keys),
+            ]
+        )
+        cumulative_counts = np.cumsum(
+            np.concatenate([negative_counts[::-1], [self.zero_count], positive_counts])
+        )
+
+        ranks = np.asarray(quantiles, dtype=float) * (self.count - 1)
+        estimates = values[np.searchsorted(cumulative_counts, ranks, side="right")]
+        # The minimum and maximum are known exactly, and bound every estimate
+        estimates = np.clip(estimates, self.min, self.max)
+        estimates[ranks <= 0] = self.min
+        estimates[ranks >= self.count - 1] = self.max
+        return estimates.tolist()
+
+    def to_dict(self):
+        """Returns the sketch as a JSON serialisable dictionary, see from_dict"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": [array.tolist() for array in self.positive],
+            "negative": [array.tolist() for array in self.negative],
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Creates a sketch from a dictionary returned by to_dict"""
+        sketch = cls(data["relative_accuracy"])
+        sketch.positive = tuple(
+            np.array(array, dtype=np.int64) for array in data["positive"]
+        )
+        sketch.negative = tuple(
+            np.array(array, dtype=np.int64) for array in data["negative"]
+        )
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
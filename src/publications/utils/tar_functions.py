@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tarfile
+import uuid
+from pathlib import Path
+
+# The number of bytes read from a file at a time while it is copied or checksummed
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def copy_file_with_checksum(source, path):
+    """Copies a file object to a path, computing the SHA-256 of its contents as it is copied
+
+    The file is written to a temporary path then renamed, so a partially written file is never left at the path
+
+    Parameters
+    ----------
+    source : file object
+        File object to read from its current position to its end
+    path : str or Path
+        Path to write the file to, whose parent directories are created if they don't exist
+
+    Returns
+    -------
+    int, str
+        The size of the file in bytes and the hexadecimal SHA-256 of its contents
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as f:
+            while chunk := source.read(COPY_BUFFER_SIZE):
+                sha256.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+    return size, sha256.hexdigest()
+
+
+def get_file_checksum(path):
+    """Returns the size in bytes and the hexadecimal SHA-256 of the contents of a file"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            sha256.update(chunk)
+    return os.path.getsize(path), sha256.hexdigest()
+
+
+def iter_tar_file(path, directory):
+    """Reads a (possibly compressed) tar archive as a stream, yielding each regular file it contains in order
+
+    The archive is read once from start to end, and members aren't kept once read, so memory use doesn't depend
+    on how many members the archive has. Each member is checked with the "data" extraction filter, so that a
+    member can't be extracted outside the directory it is extracted into. Directories are skipped, as they are
+    created for the files they contain, as are links and special files
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the tar archive
+    directory : str or Path
+        Directory the members will be extracted into
+
+    Yields
+    ------
+    tarfile.TarInfo, file object
+        The member, and a file object of its contents which can only be read until the next member is yielded
+    """
+    with tarfile.open(path, "r|*") as tar:
+        while (member := tar.next()) is not None:
+            # TarFile keeps a list of every member read, which isn't needed to read a stream
+            tar.members = []
+            if not member.isfile():
+                continue
+            yield tarfile.data_filter(member, str(directory)), tar.extractfile(member)
+
+
+def check_tar_file(file):
+    """Returns whether a file object is a (possibly compressed) tar archive, reading only the first block of the
+    archive and leaving the file object at the position it was at
+    """
+    position = file.tell()
+    try:
+        return tarfile.is_tarfile(file)
+    finally:
+        file.seek(position)
@@ -0,0 +1,93 @@
+import os
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.benchmark_functions import (
+    BENCHMARK_GROUP,
+    BENCHMARK_PAIRS,
+    BENCHMARK_UNITS,
+    run_benchmark,
+    run_benchmarks,
+    time_function,
+    write_benchmark_file,
+)
+from publications.utils.h5_functions import check_subgroup_boolean
+
+FUNCTIONS = [
+    "get_h5_subgroup_data",
+    "get_log_and_limits",
+    "split_histogram_by_count",
+    "histo2d_scatter_hybrid",
+]
+
+
+class TestBenchmarkFunctions(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "benchmark.h5")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_benchmark_file(self):
+        write_benchmark_file(self.path, 2500, chunk_rows=1000)
+        # The file is the same whatever the chunk size
+        other_path = os.path.join(self.directory.name, "other.h5")
+        write_benchmark_file(other_path, 2500, chunk_rows=1000, compression="gzip")
+
+        with h5py.File(self.path, "r") as f, h5py.File(other_path, "r") as other:
+            group = f[BENCHMARK_GROUP]
+            self.assertSequenceEqual(sorted(group.keys()), sorted(BENCHMARK_UNITS))
+            for name, units in BENCHMARK_UNITS.items():
+                self.assertEqual(group[name].shape, (2500,))
+                self.assertEqual(group[name].attrs["units"], units.encode())
+                np.testing.assert_array_equal(group[name], other[BENCHMARK_GROUP][name])
+
+            np.testing.assert_array_equal(group["SEED"], np.arange(2500))
+            self.assertTrue(np.isnan(group["SemiMajorAxis@DCO"][()]).any())
+            self.assertTrue((group["Eccentricity@DCO"][()] == 0).any())
+            self.assertTrue(
+                check_subgroup_boolean(f, BENCHMARK_GROUP, "Merges_Hubble_Time")
+            )
+            self.assertSequenceEqual(
+                np.unique(group["Merges_Hubble_Time"]).tolist(), [0, 1]
+            )
+
+    def test_time_function(self):
+        result, measurements = time_function(np.ones, 10**6, repeats=2)
+
+        np.testing.assert_array_equal(result, np.ones(10**6))
+        self.assertEqual(measurements["repeats"], 2)
+        self.assertLessEqual(measurements["min_seconds"], measurements["mean_seconds"])
+        # The array is traced by tracemalloc
+        self.assertGreaterEqual(measurements["peak_traced_bytes"], 8 * 10**6)
+        self.assertGreater(measurements["peak_rss_bytes"], 8 * 10**6)
+
+    def test_run_benchmark(self):
+        write_benchmark_file(self.path, 2500, chunk_rows=1000)
+        results = run_benchmark(self.path, repeats=1)
+
+        self.assertEqual(results[0]["function"], "get_h5_subgroup_meta")
+        self.assertSequenceEqual(
+            [(r["function"], r["subgroup_x"], r["subgroup_y"]) for r in results[1:]],
+            [(function, *pair) for pair in BENCHMARK_PAIRS for function in FUNCTIONS],
+        )
+        for result in results:
+            self.assertEqual(result["rows"], 2500)
+            self.assertGreaterEqual(result["min_seconds"], 0)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(self.directory.name, rows=[1000, 3000], repeats=1)
+
+        self.assertSequenceEqual(
+            sorted({r["rows"] for r in results["results"]}), [1000, 3000]
+        )
+        self.assertEqual(len(results["results"]), 2 * (1 + 4 * len(BENCHMARK_PAIRS)))
+        self.assertEqual(results["numpy"], np.__version__)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory.name, "benchmark_1000_none.h5"))
+        )
@@ -0,0 +1,63 @@
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.derived_functions import (
+    DERIVED_COLUMNS,
+    compute_derived_column,
+    get_derived_columns,
+)
+
+
+class TestDerivedColumns(TestCase):
+    def test_get_derived_columns(self):
+        self.assertSequenceEqual(
+            get_derived_columns(["SEED", "Mass(1)", "Mass(2)"]),
+            ["Chirp_Mass", "Mass_Ratio", "Total_Mass"],
+        )
+        self.assertSequenceEqual(
+            get_derived_columns(["Coalescence_Time", "Time"]), ["Delay_Time"]
+        )
+        self.assertSequenceEqual(get_derived_columns(["Mass(1)", "Time"]), [])
+
+    def test_stored_columns_are_not_derived(self):
+        self.assertNotIn(
+            "Total_Mass", get_derived_columns(["Mass(1)", "Mass(2)", "Total_Mass"])
+        )
+
+    def test_inputs_are_not_derived(self):
+        # Derived columns are only computed from stored columns
+        inputs = {s for column in DERIVED_COLUMNS.values() for s in column["inputs"]}
+        self.assertFalse(inputs & DERIVED_COLUMNS.keys())
+
+    def test_compute_derived_column(self):
+        mass_1 = np.array([10.0, 30.0, 1.4])
+        mass_2 = np.array([30.0, 10.0, 1.4], dtype=np.float32)
+
+        np.testing.assert_allclose(
+            compute_derived_column("Chirp_Mass", [mass_1, mass_2]),
+            [14.651, 14.651, 1.2188],
+            rtol=1e-3,
+        )
+        np.testing.assert_allclose(
+            compute_derived_column("Mass_Ratio", [mass_1, mass_2]),
+            [1 / 3, 1 / 3, 1],
+        )
+        np.testing.assert_allclose(
+            compute_derived_column("Total_Mass", [mass_1, mass_2]), [40, 40, 2.8]
+        )
+        np.testing.assert_allclose(
+            compute_derived_column("Delay_Time", [[100.0, 5.0], [10.0, 2.5]]),
+            [110, 7.5],
+        )
+
+    def test_compute_derived_column_dtype(self):
+        values = compute_derived_column(
+            "Total_Mass", [np.arange(3, dtype=np.uint8), np.arange(3)]
+        )
+        self.assertEqual(values.dtype, np.float64)
+
+    def test_mass_ratio_of_massless_stars(self):
+        values = compute_derived_column("Mass_Ratio", [[0.0, 2.0], [0.0, 0.0]])
+        self.assertTrue(np.isnan(values[0]))
+        self.assertEqual(values[1], 0)
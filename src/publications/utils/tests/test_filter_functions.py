@@ -0,0 +1,135 @@
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.filter_functions import (
+    MAX_FILTER_DEPTH,
+    evaluate_filter,
+    format_filter,
+    get_filter_columns,
+    parse_filter,
+    tokenize_filter,
+)
+
+
+class TestFilterFunctions(TestCase):
+    def setUp(self):
+        self.columns = [
+            "Mass(1)",
+            "Mass(2)",
+            "Stellar_Type(2)",
+            "SemiMajorAxis>CE",
+            "SemiMajorAxis",
+            "Merges_Hubble_Time",
+        ]
+        self.data = {
+            "Mass(1)": np.array([5.0, 12.0, 20.0, np.nan]),
+            "Mass(2)": np.array([1.0, 15.0, 10.0, 3.0]),
+            "Stellar_Type(2)": np.array([14, 14, 13, 14]),
+            "SemiMajorAxis>CE": np.array([0.5, 1.5, 2.5, 3.5]),
+            "SemiMajorAxis": np.array([1.0, 1.0, 3.0, 3.0]),
+            "Merges_Hubble_Time": np.array([1, 0, 1, 1], dtype=np.uint8),
+        }
+
+    def evaluate(self, expression):
+        return evaluate_filter(parse_filter(expression, self.columns), self.data)
+
+    def test_tokenize_filter(self):
+        self.assertListEqual(
+            tokenize_filter("Mass(1) > 1e1 && SemiMajorAxis>CE<=-2.5", self.columns),
+            [
+                ("column", "Mass(1)"),
+                ("operator", ">"),
+                ("number", 10.0),
+                ("operator", "&&"),
+                ("column", "SemiMajorAxis>CE"),
+                ("operator", "<="),
+                ("number", -2.5),
+            ],
+        )
+
+    def test_comparisons(self):
+        np.testing.assert_array_equal(
+            self.evaluate("Merges_Hubble_Time == 1"), [True, False, True, True]
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("Merges_Hubble_Time != 1"), [False, True, False, False]
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("Mass(1) >= 12"), [False, True, True, False]
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("Mass(1) < Mass(2)"), [False, True, False, False]
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("SemiMajorAxis>CE > SemiMajorAxis"),
+            [False, True, False, True],
+        )
+
+    def test_combinations(self):
+        np.testing.assert_array_equal(
+            self.evaluate("Mass(1) > 10 && Stellar_Type(2) == 14"),
+            [False, True, False, False],
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("Mass(1) > 15 || Mass(2) < 2"), [True, False, True, False]
+        )
+        np.testing.assert_array_equal(
+            self.evaluate("!(Mass(1) > 15) && (Mass(2) > 2 || Mass(2) < 2)"),
+            [True, True, False, True],
+        )
+
+    def test_precedence(self):
+        self.assertEqual(
+            format_filter(
+                parse_filter("Mass(1) > 1 || Mass(2) > 2 && Mass(2) < 3", self.columns)
+            ),
+            "((Mass(1) > 1.0) || ((Mass(2) > 2.0) && (Mass(2) < 3.0)))",
+        )
+
+    def test_format_filter_is_canonical(self):
+        self.assertEqual(
+            format_filter(parse_filter("Mass(1)>10&&Mass(2)<1", self.columns)),
+            format_filter(
+                parse_filter(" ( Mass(1) > 1e1 ) && Mass(2) < 1.0", self.columns)
+            ),
+        )
+
+    def test_get_filter_columns(self):
+        self.assertListEqual(
+            get_filter_columns(
+                parse_filter(
+                    "Mass(2) > 1 && !(Mass(1) < Mass(2)) || 1 > 2", self.columns
+                )
+            ),
+            ["Mass(1)", "Mass(2)"],
+        )
+
+    def test_invalid_filters(self):
+        for expression in [
+            "Unknown_Column > 1",
+            "Mass(1) >",
+            "Mass(1) > 1 &&",
+            "Mass(1) 1",
+            "(Mass(1) > 1",
+            "Mass(1) > 1)",
+            "Mass(1) && Mass(2)",
+            "",
+        ]:
+            with self.assertRaises(ValueError, msg=expression):
+                parse_filter(expression, self.columns)
+
+    def test_deeply_nested_filters(self):
+        nested = "(" * MAX_FILTER_DEPTH + "Mass(1) > 10" + ")" * MAX_FILTER_DEPTH
+        np.testing.assert_array_equal(
+            self.evaluate(nested), self.evaluate("Mass(1) > 10")
+        )
+
+        # Filters nested deeper than the limit are invalid, rather than exceeding the recursion limit
+        for expression in [
+            "(" * 2000 + "Mass(1) > 10" + ")" * 2000,
+            "!" * 2000 + "Mass(1) > 10",
+            " && ".join(["Mass(1) > 10"] * 2000),
+        ]:
+            with self.assertRaises(ValueError):
+                parse_filter(expression, self.columns)
@@ -1,18 +1,47 @@
-from tempfile import NamedTemporaryFile
+import os
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest.mock import patch
 import numpy as np
 import h5py
 
 from django.test import TestCase
 from compasui.tests.utils import silence_logging
 
+from publications.utils.derived_functions import (
+    DerivedH5File,
+    compute_derived_column,
+    get_derived_columns,
+)
+from publications.utils.filter_functions import parse_filter
+from publications.utils.join_functions import build_seed_index, join_seed_indexes
+from publications.utils.plotting_functions import get_histogram_bins, get_log_decision
+from publications.utils.sketch_functions import QuantileSketch
+from publications.utils.pyramid_functions import hybrid_plot_from_pyramid
 from publications.utils.h5_functions import (
+    get_h5_column,
+    get_h5_column_histogram,
     get_h5_keys,
     get_h5_subgroups,
     get_h5_subgroup_meta,
+    get_h5_joined_subgroup_data,
+    get_h5_seed_index,
     get_h5_subgroup_data,
+    get_h5_subgroup_data_batch,
+    get_h5_subgroup_data_streaming,
+    get_h5_subgroup_pyramid,
+    get_h5_filter_mask,
+    get_h5_schema,
+    get_column_statistics,
+    get_random_sample_indices,
+    get_sample_fraction,
     get_subgroup_units,
+    read_h5_rows,
+    read_h5_sample,
+    reservoir_sample_h5_rows,
     check_subgroup_boolean,
     remove_null_coords,
+    repack_h5_file,
+    save_h5_derived_column,
 )
 
 
@@ -73,7 +102,11 @@ class TestGetH5SubgroupMeta(TestCase):
         with h5py.File(self.tf, "w") as f:
             meta = get_h5_subgroup_meta(f)
             self.assertSequenceEqual(sorted(meta["groups"]), sorted(self.root_groups))
-            self.assertSequenceEqual(sorted(meta["subgroups"]), sorted(self.subgroups))
+            # The groups have Mass(1), Mass(2), Mass@ZAMS(1) and Mass@ZAMS(2), so have derived columns too
+            self.assertSequenceEqual(
+                sorted(meta["subgroups"]),
+                sorted(self.subgroups + get_derived_columns(self.subgroups)),
+            )
             self.assertIn(meta["group"], self.root_groups)
             self.assertEqual(
                 meta["subgroup_x"],
@@ -127,6 +160,23 @@ class TestGetH5SubgroupMeta(TestCase):
             meta = get_h5_subgroup_meta(f, stride_length=2)
             self.assertEqual(meta["stride_length"], 2)
 
+    def test_returns_y_group_if_specified(self):
+        with h5py.File(self.tf, "w") as f:
+            meta = get_h5_subgroup_meta(f, root_group="BSE_Double_Compact_Objects")
+            self.assertEqual(meta["group_y"], "BSE_Double_Compact_Objects")
+            self.assertEqual(meta["subgroups_y"], meta["subgroups"])
+
+            meta = get_h5_subgroup_meta(
+                f,
+                root_group="BSE_Double_Compact_Objects",
+                root_group_y="BSE_System_Parameters",
+            )
+            self.assertEqual(meta["group"], "BSE_Double_Compact_Objects")
+            self.assertEqual(meta["group_y"], "BSE_System_Parameters")
+            self.assertEqual(meta["subgroup_x"], "Mass(1)")
+            self.assertEqual(meta["subgroup_y"], "Mass@ZAMS(2)")
+            self.assertEqual(meta["subgroup_y_unit"], "Mass@ZAMS(2)_unit")
+
 
 class TestGetH5SubgroupData(TestCase):
     def setUp(self):
@@ -172,6 +222,807 @@ class TestGetH5SubgroupData(TestCase):
             )
 
 
+class TestGetColumnStatistics(TestCase):
+    def setUp(self):
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.data = np.array(
+            [np.nan, 0, 5, -np.inf, 2, 0, 0.5, np.nan, 100, np.inf, 3], dtype=np.float64
+        )
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/base_group/float_dataset", data=self.data, chunks=(2,))
+            f.create_dataset(
+                "/base_group/int_dataset", data=np.array([4, 0, 7], dtype=np.int32)
+            )
+            f.create_dataset(
+                "/base_group/nan_dataset", data=np.array([np.nan, np.nan], dtype=float)
+            )
+
+    def test_float_statistics(self):
+        with h5py.File(self.tf, "r") as f:
+            for chunk_rows in [1, 3, 100]:
+                self.assertDictEqual(
+                    get_column_statistics(
+                        f["base_group"]["float_dataset"], chunk_rows=chunk_rows
+                    ),
+                    {
+                        "count": 11,
+                        "nan_count": 2,
+                        "inf_count": 2,
+                        "zero_count": 2,
+                        "min": 0.0,
+                        "max": 100.0,
+                        "min_positive": 0.5,
+                    },
+                )
+
+    def test_int_statistics(self):
+        with h5py.File(self.tf, "r") as f:
+            self.assertDictEqual(
+                get_column_statistics(f["base_group"]["int_dataset"], chunk_rows=2),
+                {
+                    "count": 3,
+                    "nan_count": 0,
+                    "inf_count": 0,
+                    "zero_count": 1,
+                    "min": 0.0,
+                    "max": 7.0,
+                    "min_positive": 4.0,
+                },
+            )
+
+    def test_all_nan_statistics(self):
+        with h5py.File(self.tf, "r") as f:
+            stats = get_column_statistics(f["base_group"]["nan_dataset"])
+            self.assertEqual(stats["nan_count"], 2)
+            self.assertIsNone(stats["min"])
+            self.assertIsNone(stats["max"])
+
+    def test_sketch(self):
+        with h5py.File(self.tf, "r") as f:
+            for chunk_rows in [1, 3, 100]:
+                sketch = QuantileSketch()
+                get_column_statistics(
+                    f["base_group"]["float_dataset"],
+                    chunk_rows=chunk_rows,
+                    sketch=sketch,
+                )
+
+                expected = QuantileSketch()
+                expected.add(self.data)
+                self.assertEqual(sketch.to_dict(), expected.to_dict())
+
+
+class TestGetH5ColumnHistogram(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(18)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.log_data = rng.lognormal(0, 3, 3000)
+        self.log_data[rng.integers(0, 3000, 30)] = 0
+        self.log_data[rng.integers(0, 3000, 30)] = np.nan
+        self.linear_data = rng.normal(0, 1, 3000)
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset(
+                "/base_group/log_dataset", data=self.log_data, chunks=(256,)
+            )
+            f.create_dataset(
+                "/base_group/linear_dataset", data=self.linear_data, chunks=(256,)
+            )
+            f.create_dataset(
+                "/base_group/bool_dataset",
+                data=rng.integers(0, 2, 3000).astype(np.uint8),
+            )
+            f.create_dataset(
+                "/base_group/nan_dataset", data=np.array([np.nan, np.nan], dtype=float)
+            )
+            f.create_dataset(
+                "/base_group/string_dataset", data=np.array([b"string_type"] * 3000)
+            )
+
+    def assert_histogram(self, histogram, data, is_bool=False, bins=40):
+        finite = data[np.isfinite(data)]
+        positive = finite[finite > 0]
+        log_check, min_max, null_check, zero_value = get_log_decision(
+            finite.min(), finite.max(), positive.min(), is_bool
+        )
+        if log_check:
+            finite = np.where(
+                finite > 0, np.log10(np.maximum(finite, 1e-300)), zero_value
+            )
+        (hist_bins, _), (limits, _) = get_histogram_bins(min_max, min_max, bins)
+        counts, edges = np.histogram(finite, bins=hist_bins, range=limits)
+
+        self.assertEqual(histogram["log_check"], log_check)
+        self.assertEqual(histogram["null_check"], null_check)
+        self.assertEqual(histogram["bool_check"], is_bool)
+        self.assertEqual(histogram["min_max"], [float(v) for v in min_max])
+        self.assertEqual(histogram["counts"], counts.tolist())
+        np.testing.assert_allclose(histogram["edges"], edges)
+        # Every finite value is counted
+        self.assertEqual(sum(histogram["counts"]), np.isfinite(data).sum())
+
+    def test_logged_histogram(self):
+        with h5py.File(self.tf, "r") as f:
+            for chunk_rows in [256, 1000, 10000]:
+                histogram = get_h5_column_histogram(
+                    f, "base_group", "log_dataset", chunk_rows=chunk_rows
+                )
+                self.assertTrue(histogram["log_check"])
+                self.assertTrue(histogram["null_check"])
+                self.assert_histogram(histogram, self.log_data)
+
+    def test_linear_histogram(self):
+        with h5py.File(self.tf, "r") as f:
+            histogram = get_h5_column_histogram(
+                f, "base_group", "linear_dataset", bins=20
+            )
+            self.assertFalse(histogram["log_check"])
+            self.assert_histogram(histogram, self.linear_data, bins=20)
+
+    def test_statistics_match_full_read(self):
+        with h5py.File(self.tf, "r") as f:
+            statistics = {
+                **get_column_statistics(f["base_group"]["log_dataset"]),
+                "is_bool": False,
+            }
+            self.assertDictEqual(
+                get_h5_column_histogram(
+                    f, "base_group", "log_dataset", statistics=statistics
+                ),
+                get_h5_column_histogram(f, "base_group", "log_dataset"),
+            )
+
+    def test_bool_histogram(self):
+        with h5py.File(self.tf, "r") as f:
+            histogram = get_h5_column_histogram(f, "base_group", "bool_dataset")
+            data = f["base_group"]["bool_dataset"][()]
+
+        self.assertTrue(histogram["bool_check"])
+        self.assertEqual(histogram["min_max"], [-0.5, 1.5])
+        self.assertEqual(sum(histogram["counts"]), 3000)
+        self.assertEqual(max(histogram["counts"]), max(np.bincount(data)))
+
+    def test_all_nan_histogram(self):
+        with h5py.File(self.tf, "r") as f:
+            histogram = get_h5_column_histogram(f, "base_group", "nan_dataset")
+        self.assertEqual(histogram["counts"], [])
+        self.assertIsNone(histogram["min_max"])
+
+    @silence_logging(logger_name="publications.utils.h5_functions")
+    def test_string_histogram(self):
+        with h5py.File(self.tf, "r") as f:
+            self.assertIsNone(
+                get_h5_column_histogram(f, "base_group", "string_dataset")
+            )
+
+
+class TestGetH5SubgroupDataStatistics(TestCase):
+    def setUp(self):
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset(
+                "/base_group/x_dataset",
+                data=np.array([0, 10, 100, 1000, 10000, 5], dtype=np.float64),
+            )
+            f.create_dataset(
+                "/base_group/y_dataset",
+                data=np.array([1, 2, 3, 4, 5, 6], dtype=np.float64),
+            )
+
+    def test_statistics_match_full_read(self):
+        with h5py.File(self.tf, "r") as f:
+            statistics = {
+                name: {
+                    **get_column_statistics(f["base_group"][name]),
+                    "is_bool": False,
+                }
+                for name in ["x_dataset", "y_dataset"]
+            }
+            self.assertDictEqual(
+                get_h5_subgroup_data(
+                    f, "base_group", "x_dataset", "y_dataset", statistics=statistics
+                ),
+                get_h5_subgroup_data(f, "base_group", "x_dataset", "y_dataset"),
+            )
+
+    def test_statistics_used_for_limits(self):
+        with h5py.File(self.tf, "r") as f:
+            statistics = {
+                "x_dataset": {
+                    "min": 0.0,
+                    "max": 1e5,
+                    "min_positive": 1.0,
+                    "is_bool": False,
+                }
+            }
+            # With a stride the maximum of the strided data is lower than that of the full column
+            plot_data = get_h5_subgroup_data(
+                f,
+                "base_group",
+                "x_dataset",
+                "y_dataset",
+                stride_length=2,
+                statistics=statistics,
+            )
+            self.assertTrue(plot_data["log_check_x"])
+            self.assertTrue(plot_data["null_check_x"])
+            self.assertEqual(plot_data["min_max_x"], [-1.25, 5.0])
+
+
+class TestGetH5SubgroupDataStreaming(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        x = rng.lognormal(0, 2, 5000)
+        x[rng.integers(0, 5000, 50)] = 0
+        y = rng.normal(0, 1, 5000)
+        y[rng.integers(0, 5000, 50)] = np.nan
+        self.weights = np.full(5000, 2.0)
+        self.weights[rng.integers(0, 5000, 50)] = np.nan
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/base_group/x_dataset", data=x, chunks=(256,))
+            f.create_dataset("/base_group/y_dataset", data=y, chunks=(256,))
+            f.create_dataset(
+                "/base_group/string_dataset", data=np.array([b"string_type"])
+            )
+            f.create_dataset("/base_group/weights", data=self.weights, chunks=(256,))
+            f.create_dataset("/base_group/unit_weights", data=np.ones(5000))
+            f.create_dataset("/base_group/negative_weights", data=-np.ones(5000))
+
+    def test_matches_full_read(self):
+        with h5py.File(self.tf, "r") as f:
+            expected = get_h5_subgroup_data(f, "base_group", "x_dataset", "y_dataset")
+            for chunk_rows in [256, 1000, 10000]:
+                self.assertDictEqual(
+                    get_h5_subgroup_data_streaming(
+                        f,
+                        "base_group",
+                        "x_dataset",
+                        "y_dataset",
+                        chunk_rows=chunk_rows,
+                    ),
+                    expected,
+                )
+
+    def test_full_range_matches_full_plot(self):
+        with h5py.File(self.tf, "r") as f:
+            expected = get_h5_subgroup_data_streaming(
+                f, "base_group", "x_dataset", "y_dataset"
+            )
+            self.assertDictEqual(
+                get_h5_subgroup_data_streaming(
+                    f,
+                    "base_group",
+                    "x_dataset",
+                    "y_dataset",
+                    x_range=expected["min_max_x"],
+                    y_range=expected["min_max_y"],
+                ),
+                expected,
+            )
+
+    def test_range(self):
+        with h5py.File(self.tf, "r") as f:
+            plot_data = get_h5_subgroup_data_streaming(
+                f,
+                "base_group",
+                "x_dataset",
+                "y_dataset",
+                bins=20,
+                encoding="list",
+                chunk_rows=1000,
+                x_range=[-1, 1],
+                y_range=[-1, 1],
+            )
+            x, y = remove_null_coords(
+                f["base_group"]["x_dataset"][()], f["base_group"]["y_dataset"][()]
+            )
+
+        self.assertTrue(plot_data["log_check_x"])
+        self.assertFalse(plot_data["log_check_y"])
+        self.assertEqual(plot_data["min_max_x"], [-1, 1])
+        self.assertEqual(plot_data["min_max_y"], [-1, 1])
+
+        # Each dimension is split into the requested number of bins over the window
+        self.assertAlmostEqual(plot_data["sides"][0], 2 / 20)
+        self.assertAlmostEqual(plot_data["sides"][1], 2 / 20)
+
+        # Every point within the histogram limits is counted, either in a bin or as a scatter point
+        half_x, half_y = plot_data["sides"][0] / 2, plot_data["sides"][1] / 2
+        with np.errstate(divide="ignore"):
+            log_x = np.log10(x)
+        in_window = (
+            (log_x >= -1 - half_x)
+            & (log_x <= 1 + half_x)
+            & (y >= -1 - half_y)
+            & (y <= 1 + half_y)
+        )
+        self.assertEqual(
+            sum(plot_data["hist_columns"]["counts"])
+            + plot_data["scatter_columns"]["length"],
+            in_window.sum(),
+        )
+
+    @silence_logging(logger_name="publications.utils.h5_functions")
+    def test_returns_none_if_string_type(self):
+        with h5py.File(self.tf, "r") as f:
+            self.assertIsNone(
+                get_h5_subgroup_data_streaming(
+                    f, "base_group", "string_dataset", "x_dataset"
+                )
+            )
+
+    def test_unit_weights(self):
+        args = ["base_group", "x_dataset", "y_dataset"]
+        with h5py.File(self.tf, "r") as f:
+            self.assertDictEqual(
+                get_h5_subgroup_data_streaming(
+                    f, *args, weights_subgroup="unit_weights", chunk_rows=1000
+                ),
+                get_h5_subgroup_data_streaming(f, *args),
+            )
+
+    def test_weights(self):
+        args = ["base_group", "x_dataset", "y_dataset"]
+        with h5py.File(self.tf, "r") as f:
+            # Rows with null weights are left out
+            unweighted = get_h5_subgroup_data_streaming(
+                f, *args, encoding="list", mask=np.isfinite(self.weights)
+            )
+            for chunk_rows in [256, 10000]:
+                plot_data = get_h5_subgroup_data_streaming(
+                    f,
+                    *args,
+                    encoding="list",
+                    chunk_rows=chunk_rows,
+                    weights_subgroup="weights",
+                )
+                self.assertDictEqual(
+                    plot_data["scatter_columns"], unweighted["scatter_columns"]
+                )
+                self.assertEqual(
+                    plot_data["hist_columns"]["counts"],
+                    [2 * c for c in unweighted["hist_columns"]["counts"]],
+                )
+
+            # Splitting on the weighted counts moves more bins into the histogram
+            plot_data = get_h5_subgroup_data_streaming(
+                f,
+                *args,
+                encoding="list",
+                weights_subgroup="weights",
+                weighted_split=True,
+            )
+            self.assertLess(
+                plot_data["scatter_columns"]["length"],
+                unweighted["scatter_columns"]["length"],
+            )
+
+    def test_invalid_weights(self):
+        args = ["base_group", "x_dataset", "y_dataset"]
+        with h5py.File(self.tf, "r") as f:
+            for weights_subgroup in ["negative_weights", "string_dataset"]:
+                with self.assertRaises(ValueError):
+                    get_h5_subgroup_data_streaming(
+                        f, *args, weights_subgroup=weights_subgroup
+                    )
+
+
+class TestGetH5SubgroupPyramid(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        x = rng.lognormal(0, 2, 5000)
+        x[rng.integers(0, 5000, 50)] = 0
+        y = rng.normal(0, 1, 5000)
+        y[rng.integers(0, 5000, 50)] = np.nan
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/base_group/x_dataset", data=x, chunks=(256,))
+            f.create_dataset("/base_group/y_dataset", data=y, chunks=(256,))
+            f.create_dataset(
+                "/base_group/string_dataset", data=np.array([b"string_type"])
+            )
+
+    def test_matches_streaming(self):
+        with h5py.File(self.tf, "r") as f:
+            expected = get_h5_subgroup_data_streaming(
+                f, "base_group", "x_dataset", "y_dataset"
+            )
+            pyramid, metadata = get_h5_subgroup_pyramid(
+                f, "base_group", "x_dataset", "y_dataset", chunk_rows=1000
+            )
+
+        self.assertDictEqual(
+            {**hybrid_plot_from_pyramid(pyramid), **metadata}, expected
+        )
+
+    @silence_logging(logger_name="publications.utils.h5_functions")
+    def test_returns_none_if_string_type(self):
+        with h5py.File(self.tf, "r") as f:
+            self.assertIsNone(
+                get_h5_subgroup_pyramid(f, "base_group", "string_dataset", "x_dataset")
+            )
+
+
+class TestSampling(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(13)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.x = rng.lognormal(0, 2, 5000)
+        self.y = np.arange(5000, dtype=np.float64)
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/base_group/x_dataset", data=self.x, chunks=(256,))
+            f.create_dataset("/base_group/y_dataset", data=self.y, chunks=(256,))
+
+    def test_get_sample_fraction(self):
+        self.assertEqual(get_sample_fraction(10, "stride", 1), 1)
+        self.assertEqual(get_sample_fraction(10, "stride", 3), 0.4)
+        self.assertEqual(get_sample_fraction(10, "random"), 1)
+        self.assertEqual(get_sample_fraction(int(2e6), "reservoir"), 0.25)
+        self.assertEqual(get_sample_fraction(0, "random"), 1)
+
+    def test_get_random_sample_indices(self):
+        indices = get_random_sample_indices(5000, 100, seed=1)
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(len(np.unique(indices)), 100)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        np.testing.assert_array_equal(
+            indices, get_random_sample_indices(5000, 100, seed=1)
+        )
+        np.testing.assert_array_equal(get_random_sample_indices(50, 100), np.arange(50))
+
+    def test_read_h5_rows(self):
+        indices = np.array([0, 3, 255, 256, 1000, 4999])
+        with h5py.File(self.tf, "r") as f:
+            for chunk_rows in [256, 1000, 10000]:
+                x, y = read_h5_rows(
+                    f,
+                    "base_group",
+                    ["x_dataset", "y_dataset"],
+                    indices,
+                    chunk_rows=chunk_rows,
+                )
+                np.testing.assert_array_equal(x, self.x[indices])
+                np.testing.assert_array_equal(y, self.y[indices])
+
+    def test_reservoir_sample_h5_rows(self):
+        with h5py.File(self.tf, "r") as f:
+            x, y = reservoir_sample_h5_rows(
+                f, "base_group", ["x_dataset", "y_dataset"], 300, chunk_rows=256
+            )
+            repeat_x, _ = reservoir_sample_h5_rows(
+                f, "base_group", ["x_dataset", "y_dataset"], 300, chunk_rows=256
+            )
+
+        # The rows are kept aligned, in file order, and the sample is reproducible
+        rows = y.astype(int)
+        self.assertEqual(len(np.unique(rows)), 300)
+        self.assertTrue(np.all(np.diff(rows) > 0))
+        np.testing.assert_array_equal(x, self.x[rows])
+        np.testing.assert_array_equal(x, repeat_x)
+
+        # The sample should be spread across the whole file
+        self.assertLess(rows.min(), 500)
+        self.assertGreater(rows.max(), 4500)
+
+    def test_full_samples_match_stride(self):
+        with h5py.File(self.tf, "r") as f:
+            expected = get_h5_subgroup_data(f, "base_group", "x_dataset", "y_dataset")
+            for sampling in ["random", "reservoir"]:
+                self.assertDictEqual(
+                    get_h5_subgroup_data(
+                        f, "base_group", "x_dataset", "y_dataset", sampling=sampling
+                    ),
+                    expected,
+                )
+
+    def test_random_sample_indices(self):
+        indices = np.arange(0, 5000, 7)
+        with h5py.File(self.tf, "r") as f:
+            self.assertDictEqual(
+                get_h5_subgroup_data(
+                    f,
+                    "base_group",
+                    "x_dataset",
+                    "y_dataset",
+                    sampling="random",
+                    sample_indices=indices,
+                ),
+                get_h5_subgroup_data(
+                    f, "base_group", "x_dataset", "y_dataset", stride_length=7
+                ),
+            )
+
+    def test_unknown_sampling(self):
+        with h5py.File(self.tf, "r") as f:
+            with self.assertRaises(ValueError):
+                get_h5_subgroup_data(
+                    f, "base_group", "x_dataset", "y_dataset", sampling="unknown"
+                )
+
+
+class TestGetH5SubgroupDataBatch(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(14)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.subgroups = ["a_dataset", "b_dataset", "c_dataset"]
+        with h5py.File(self.tf, "w") as f:
+            a = rng.lognormal(0, 2, 3000)
+            a[rng.integers(0, 3000, 30)] = 0
+            b = rng.normal(0, 1, 3000)
+            b[rng.integers(0, 3000, 30)] = np.nan
+            c = rng.integers(0, 2, 3000).astype(np.uint8)
+            for subgroup, data in zip(self.subgroups, [a, b, c]):
+                f.create_dataset(f"/base_group/{subgroup}", data=data)
+            f.create_dataset(
+                "/base_group/string_dataset", data=np.array([b"string_type"] * 3000)
+            )
+
+            self.statistics = {
+                subgroup: {
+                    **get_column_statistics(f["base_group"][subgroup]),
+                    "is_bool": check_subgroup_boolean(f, "base_group", subgroup),
+                }
+                for subgroup in self.subgroups
+            }
+
+        self.pairs = [(x, y) for x in self.subgroups for y in self.subgroups if x != y]
+
+    def test_matches_single_plots(self):
+        with h5py.File(self.tf, "r") as f:
+            for statistics in [
+                None,
+                self.statistics,
+                {"a_dataset": self.statistics["a_dataset"]},
+            ]:
+                for kwargs in [{"stride_length": 3}, {"sampling": "reservoir"}]:
+                    results = get_h5_subgroup_data_batch(
+                        f,
+                        "base_group",
+                        self.pairs,
+                        statistics=statistics,
+                        encoding="base64",
+                        **kwargs,
+                    )
+                    self.assertEqual(len(results), len(self.pairs))
+                    for (x, y), result in zip(self.pairs, results):
+                        self.assertDictEqual(
+                            result,
+                            get_h5_subgroup_data(
+                                f,
+                                "base_group",
+                                x,
+                                y,
+                                statistics=statistics,
+                                encoding="base64",
+                                **kwargs,
+                            ),
+                        )
+
+    @silence_logging(logger_name="publications.utils.h5_functions")
+    def test_string_pairs_are_none(self):
+        with h5py.File(self.tf, "r") as f:
+            results = get_h5_subgroup_data_batch(
+                f,
+                "base_group",
+                [("a_dataset", "string_dataset"), ("a_dataset", "b_dataset")],
+            )
+            self.assertIsNone(results[0])
+            self.assertIsNotNone(results[1])
+
+            self.assertListEqual(
+                get_h5_subgroup_data_batch(
+                    f, "base_group", [("string_dataset", "string_dataset")]
+                ),
+                [None],
+            )
+
+    def test_reads_each_subgroup_once(self):
+        with h5py.File(self.tf, "r") as f:
+            with patch(
+                "publications.utils.h5_functions.read_h5_sample",
+                wraps=read_h5_sample,
+            ) as read:
+                get_h5_subgroup_data_batch(f, "base_group", self.pairs)
+
+        read.assert_called_once()
+        self.assertListEqual(read.call_args.args[2], self.subgroups)
+
+
+class TestFilters(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(15)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.x = rng.lognormal(0, 2, 5000)
+        self.y = rng.normal(0, 1, 5000)
+        self.types = rng.integers(0, 16, 5000)
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/base_group/x_dataset", data=self.x, chunks=(256,))
+            f.create_dataset("/base_group/y_dataset", data=self.y, chunks=(256,))
+            f.create_dataset("/base_group/type", data=self.types, chunks=(256,))
+            f.create_dataset(
+                "/base_group/string_dataset", data=np.array([b"string_type"] * 5000)
+            )
+
+        self.columns = ["x_dataset", "y_dataset", "type", "string_dataset"]
+        self.tree = parse_filter("x_dataset > 1 && type == 14", self.columns)
+        self.expected_mask = (self.x > 1) & (self.types == 14)
+
+    def test_get_h5_filter_mask(self):
+        with h5py.File(self.tf, "r") as f:
+            for chunk_rows in [256, 1000, 10000]:
+                np.testing.assert_array_equal(
+                    get_h5_filter_mask(
+                        f, "base_group", self.tree, chunk_rows=chunk_rows
+                    ),
+                    self.expected_mask,
+                )
+            np.testing.assert_array_equal(
+                get_h5_filter_mask(
+                    f, "base_group", parse_filter("1 < 2", self.columns)
+                ),
+                np.ones(5000, dtype=bool),
+            )
+
+    def test_string_column_filter(self):
+        with h5py.File(self.tf, "r") as f:
+            with self.assertRaises(ValueError):
+                get_h5_filter_mask(
+                    f,
+                    "base_group",
+                    parse_filter("string_dataset == 1", self.columns),
+                )
+
+    def test_filtered_plots(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "filtered.h5")
+            with h5py.File(path, "w") as f:
+                f.create_dataset(
+                    "/base_group/x_dataset", data=self.x[self.expected_mask]
+                )
+                f.create_dataset(
+                    "/base_group/y_dataset", data=self.y[self.expected_mask]
+                )
+
+            args = ["base_group", "x_dataset", "y_dataset"]
+            with h5py.File(path, "r") as filtered, h5py.File(self.tf, "r") as f:
+                for kwargs in [
+                    {"stride_length": 3},
+                    {"sampling": "random"},
+                    {"sampling": "reservoir"},
+                ]:
+                    self.assertDictEqual(
+                        get_h5_subgroup_data(
+                            f, *args, mask=self.expected_mask, **kwargs
+                        ),
+                        get_h5_subgroup_data(filtered, *args, **kwargs),
+                    )
+
+                self.assertDictEqual(
+                    get_h5_subgroup_data_batch(
+                        f, args[0], [args[1:]], mask=self.expected_mask
+                    )[0],
+                    get_h5_subgroup_data(filtered, *args),
+                )
+
+                # The streaming plot uses the statistics of the full column for the plot limits
+                statistics = {
+                    subgroup: {
+                        **get_column_statistics(f["base_group"][subgroup]),
+                        "is_bool": False,
+                    }
+                    for subgroup in args[1:]
+                }
+                self.assertDictEqual(
+                    get_h5_subgroup_data_streaming(
+                        f,
+                        *args,
+                        statistics=statistics,
+                        mask=self.expected_mask,
+                        chunk_rows=256,
+                    ),
+                    get_h5_subgroup_data_streaming(
+                        filtered, *args, statistics=statistics
+                    ),
+                )
+
+
+class TestJoinedSubgroupData(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(16)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        # Every system has a row in the first group, and some have several rows in the second group
+        self.seeds_x = rng.permutation(3000).astype(np.uint64)
+        self.seeds_y = rng.integers(0, 4000, 5000).astype(np.uint64)
+        self.x = rng.lognormal(0, 2, 3000)
+        self.y = rng.normal(0, 1, 5000)
+        self.y[rng.integers(0, 5000, 50)] = np.nan
+        with h5py.File(self.tf, "w") as f:
+            f.create_dataset("/group_x/SEED", data=self.seeds_x, chunks=(256,))
+            f.create_dataset("/group_x/x_dataset", data=self.x, chunks=(256,))
+            f.create_dataset("/group_y/SEED", data=self.seeds_y, chunks=(256,))
+            f.create_dataset("/group_y/y_dataset", data=self.y, chunks=(256,))
+            f.create_dataset(
+                "/group_y/string_dataset", data=np.array([b"string_type"] * 5000)
+            )
+            f.create_dataset("/no_seed/x_dataset", data=self.x)
+
+    def test_get_h5_seed_index(self):
+        with h5py.File(self.tf, "r") as f:
+            index = get_h5_seed_index(f, "group_y")
+            self.assertIsNone(get_h5_seed_index(f, "no_seed"))
+
+        expected = build_seed_index(self.seeds_y)
+        for key, value in expected.items():
+            np.testing.assert_array_equal(index[key], value)
+
+    def test_matches_joined_file(self):
+        rows_x, rows_y = join_seed_indexes(
+            build_seed_index(self.seeds_x), build_seed_index(self.seeds_y)
+        )
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "joined.h5")
+            with h5py.File(path, "w") as f:
+                f.create_dataset("/joined/x_dataset", data=self.x[rows_x])
+                f.create_dataset("/joined/y_dataset", data=self.y[rows_y])
+
+            with h5py.File(path, "r") as joined, h5py.File(self.tf, "r") as f:
+                statistics = {
+                    "x_dataset": {
+                        **get_column_statistics(f["group_x"]["x_dataset"]),
+                        "is_bool": False,
+                    },
+                    "y_dataset": {
+                        **get_column_statistics(f["group_y"]["y_dataset"]),
+                        "is_bool": False,
+                    },
+                }
+                for kwargs in [
+                    {"stride_length": 3},
+                    {"sampling": "random"},
+                    {"encoding": "base64"},
+                ]:
+                    for stats in [{}, statistics]:
+                        self.assertDictEqual(
+                            get_h5_joined_subgroup_data(
+                                f,
+                                "group_x",
+                                "x_dataset",
+                                "group_y",
+                                "y_dataset",
+                                rows_x,
+                                rows_y,
+                                statistics_x=stats.get("x_dataset"),
+                                statistics_y=stats.get("y_dataset"),
+                                **kwargs,
+                            ),
+                            get_h5_subgroup_data(
+                                joined,
+                                "joined",
+                                "x_dataset",
+                                "y_dataset",
+                                statistics=stats,
+                                **kwargs,
+                            ),
+                        )
+
+    @silence_logging(logger_name="publications.utils.h5_functions")
+    def test_string_subgroup(self):
+        rows = np.arange(10)
+        with h5py.File(self.tf, "r") as f:
+            self.assertIsNone(
+                get_h5_joined_subgroup_data(
+                    f,
+                    "group_x",
+                    "x_dataset",
+                    "group_y",
+                    "string_dataset",
+                    rows,
+                    rows,
+                )
+            )
+
+
 class TestGetH5SubgroupMethods(TestCase):
     def setUp(self):
         self.tf = NamedTemporaryFile(suffix=".h5")
@@ -224,6 +1075,28 @@ class TestGetH5SubgroupMethods(TestCase):
                 get_subgroup_units(f, "base_group", "unitless_dataset"), None
             )
 
+    def test_get_h5_schema(self):
+        with h5py.File(self.tf, "r") as f:
+            schema = dict(get_h5_schema(f))
+
+        self.assertSequenceEqual(list(schema.keys()), ["base_group"])
+        subgroups = {s["name"]: s for s in schema["base_group"]}
+        self.assertDictEqual(
+            subgroups["int_dataset"],
+            {
+                "name": "int_dataset",
+                "dtype": "uint32",
+                "units": "int_unit",
+                "length": 10,
+                "is_bool": False,
+                "is_derived": False,
+            },
+        )
+        self.assertIsNone(subgroups["state_dataset"]["units"])
+        self.assertTrue(subgroups["bool_dataset"]["is_bool"])
+        self.assertEqual(subgroups["bool_dataset"]["length"], 4)
+        self.assertEqual(subgroups["string_dataset"]["dtype"], "|S11")
+
     def test_bool_check(self):
         with h5py.File(self.tf, "w") as f:
             self.assertFalse(check_subgroup_boolean(f, "base_group", "int_dataset"))
@@ -232,6 +1105,230 @@ class TestGetH5SubgroupMethods(TestCase):
             self.assertTrue(check_subgroup_boolean(f, "base_group", "bool_dataset"))
 
 
+class TestDerivedColumns(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(17)
+        self.mass_1 = rng.uniform(1, 50, 2500)
+        self.mass_2 = rng.uniform(1, 50, 2500).astype(np.float32)
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        with h5py.File(self.tf, "w") as f:
+            for subgroup, data in [("Mass(1)", self.mass_1), ("Mass(2)", self.mass_2)]:
+                dataset = f.create_dataset(
+                    f"/base_group/{subgroup}", data=data, chunks=(1000,)
+                )
+                dataset.attrs["units"] = np.bytes_("Msol")
+            f.create_dataset("/other_group/Mass(1)", data=self.mass_1)
+
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open_column(self, root_group, subgroup):
+        # Opens a derived column saved by save_h5_derived_column, as in CompasDatasetModel.open_data_file
+        path = os.path.join(self.directory.name, f"{root_group}_{subgroup}.h5")
+        if not os.path.exists(path):
+            save_h5_derived_column(
+                self.h5_file, root_group, subgroup, path, chunk_rows=1000
+            )
+        return h5py.File(path, "r")[root_group][subgroup]
+
+    def test_get_h5_subgroups(self):
+        with h5py.File(self.tf, "r") as f:
+            self.assertSequenceEqual(
+                get_h5_subgroups(f, "base_group"),
+                ["Mass(1)", "Mass(2)", "Chirp_Mass", "Mass_Ratio", "Total_Mass"],
+            )
+            self.assertSequenceEqual(get_h5_subgroups(f, "other_group"), ["Mass(1)"])
+            self.assertEqual(get_subgroup_units(f, "base_group", "Chirp_Mass"), "Msol")
+            self.assertIsNone(get_subgroup_units(f, "base_group", "Mass_Ratio"))
+            self.assertFalse(check_subgroup_boolean(f, "base_group", "Mass_Ratio"))
+
+    def test_get_h5_schema(self):
+        with h5py.File(self.tf, "r") as f:
+            subgroups = {s["name"]: s for s in dict(get_h5_schema(f))["base_group"]}
+
+        self.assertDictEqual(
+            subgroups["Chirp_Mass"],
+            {
+                "name": "Chirp_Mass",
+                "dtype": "float64",
+                "units": "Msol",
+                "length": 2500,
+                "is_bool": False,
+                "is_derived": True,
+            },
+        )
+        self.assertFalse(subgroups["Mass(1)"]["is_derived"])
+
+    def test_save_h5_derived_column(self):
+        with h5py.File(self.tf, "r") as self.h5_file:
+            dataset = self.open_column("base_group", "Chirp_Mass")
+
+            np.testing.assert_allclose(
+                dataset[()],
+                (self.mass_1 * self.mass_2) ** 0.6 / (self.mass_1 + self.mass_2) ** 0.2,
+            )
+            self.assertEqual(dataset.dtype, np.float64)
+            self.assertEqual(dataset.attrs["units"], b"Msol")
+
+    def test_derived_h5_file(self):
+        with h5py.File(self.tf, "r") as self.h5_file:
+            f = DerivedH5File(self.h5_file, self.open_column)
+
+            self.assertIn("Mass_Ratio", f["base_group"])
+            self.assertNotIn("Mass_Ratio", f["other_group"])
+            # The derived columns aren't stored, so the layout of the file is unchanged
+            self.assertSequenceEqual(
+                list(f["base_group"].keys()), ["Mass(1)", "Mass(2)"]
+            )
+            np.testing.assert_allclose(
+                f["base_group"]["Mass_Ratio"][::7],
+                compute_derived_column(
+                    "Mass_Ratio", [self.mass_1[::7], self.mass_2[::7]]
+                ),
+            )
+
+            # Derived columns can be plotted like stored columns
+            self.assertIsNotNone(
+                get_h5_subgroup_data(f, "base_group", "Total_Mass", "Mass(1)")
+            )
+
+
+class TestGetH5Column(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(19)
+        self.x = rng.lognormal(0, 2, 5000)
+        self.y = rng.normal(size=5000).astype(">f4")
+
+        self.directory = TemporaryDirectory()
+        self.contiguous = os.path.join(self.directory.name, "contiguous.h5")
+        self.chunked = os.path.join(self.directory.name, "chunked.h5")
+        with h5py.File(self.contiguous, "w") as f:
+            f.create_dataset("base_group/x", data=self.x)
+            f.create_dataset("base_group/y", data=self.y)
+            f.create_dataset("base_group/empty", shape=(0,), dtype=float)
+            f.create_dataset("base_group/strings", data=np.array([b"a", b"b"]))
+        with h5py.File(self.chunked, "w") as f:
+            f.create_dataset("base_group/x", data=self.x, chunks=(100,))
+            f.create_dataset(
+                "base_group/y", data=self.y, chunks=(100,), compression="gzip"
+            )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_maps_contiguous_columns(self):
+        with h5py.File(self.contiguous, "r") as f:
+            for subgroup, data in [("x", self.x), ("y", self.y)]:
+                column = get_h5_column(f["base_group"][subgroup])
+                self.assertIsInstance(column, np.memmap)
+                self.assertEqual(column.dtype, data.dtype)
+                np.testing.assert_array_equal(column, data)
+
+                # Slices are views of the mapped file, rather than copies
+                strided = column[::7]
+                self.assertTrue(np.shares_memory(strided, column))
+                np.testing.assert_array_equal(strided, data[::7])
+                self.assertFalse(column.flags.writeable)
+
+    def test_falls_back_to_dataset(self):
+        with h5py.File(self.chunked, "r") as f:
+            for subgroup in ["x", "y"]:
+                dataset = f["base_group"][subgroup]
+                self.assertIs(get_h5_column(dataset), dataset)
+
+        with h5py.File(self.contiguous, "r") as f:
+            for subgroup in ["empty", "strings"]:
+                dataset = f["base_group"][subgroup]
+                self.assertIs(get_h5_column(dataset), dataset)
+
+        # Files opened from file-like objects can't be mapped
+        with open(self.contiguous, "rb") as fileobj, h5py.File(fileobj, "r") as f:
+            dataset = f["base_group"]["x"]
+            self.assertIs(get_h5_column(dataset), dataset)
+
+    def test_plots_match_chunked_reads(self):
+        with (
+            h5py.File(self.contiguous, "r") as contiguous,
+            h5py.File(self.chunked, "r") as chunked,
+        ):
+            for sampling in ["stride", "random", "reservoir"]:
+                kwargs = {"stride_length": 3, "sampling": sampling}
+                self.assertDictEqual(
+                    get_h5_subgroup_data(contiguous, "base_group", "x", "y", **kwargs),
+                    get_h5_subgroup_data(chunked, "base_group", "x", "y", **kwargs),
+                )
+
+            for f in [contiguous, chunked]:
+                self.assertDictEqual(
+                    get_column_statistics(f["base_group"]["x"], chunk_rows=1000),
+                    get_column_statistics(chunked["base_group"]["x"]),
+                )
+            self.assertDictEqual(
+                get_h5_column_histogram(contiguous, "base_group", "y"),
+                get_h5_column_histogram(chunked, "base_group", "y"),
+            )
+
+
+class TestRepackH5File(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(18)
+        self.data = {
+            "float32_values": rng.normal(size=2500).astype(np.float32).astype(float),
+            "float64_values": rng.normal(size=2500),
+            "int_values": rng.integers(0, 100, 2500).astype(np.uint32),
+            "bool_values": rng.integers(0, 2, 2500).astype(np.uint8),
+        }
+        self.data["float32_values"][::100] = np.nan
+
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        with h5py.File(self.tf, "w") as f:
+            f.attrs["version"] = np.bytes_("v03.00")
+            group = f.create_group("base_group")
+            group.attrs["rows"] = 2500
+            for subgroup, data in self.data.items():
+                dataset = group.create_dataset(
+                    subgroup, data=data, chunks=(10,), compression="gzip"
+                )
+                dataset.attrs["units"] = np.bytes_(f"{subgroup}_unit")
+            group.create_dataset("string_values", data=np.array([b"a", b"bc"]))
+            f.create_dataset("Run_Details/values", data=np.arange(3))
+
+        self.repacked = NamedTemporaryFile(suffix=".h5")
+
+    def test_repack_h5_file(self):
+        with h5py.File(self.tf, "r") as f:
+            repack_h5_file(f, self.repacked.name, chunk_rows=1000)
+            original_schema = get_h5_schema(f)
+
+        with h5py.File(self.repacked.name, "r") as f:
+            self.assertEqual(f.attrs["version"], b"v03.00")
+            self.assertEqual(f["base_group"].attrs["rows"], 2500)
+            for subgroup, data in self.data.items():
+                dataset = f["base_group"][subgroup]
+                np.testing.assert_array_equal(dataset[()], data)
+                self.assertEqual(dataset.attrs["units"], f"{subgroup}_unit".encode())
+                self.assertIsNone(dataset.chunks)
+                self.assertIsNone(dataset.compression)
+
+            # Only float64 columns that fit in a float32 without loss are converted
+            self.assertEqual(f["base_group"]["float32_values"].dtype, np.float32)
+            self.assertEqual(f["base_group"]["float64_values"].dtype, np.float64)
+            self.assertEqual(f["base_group"]["int_values"].dtype, np.uint32)
+
+            np.testing.assert_array_equal(
+                f["base_group"]["string_values"][()], [b"a", b"bc"]
+            )
+            np.testing.assert_array_equal(f["Run_Details"]["values"][()], np.arange(3))
+
+            schema = get_h5_schema(f)
+            self.assertEqual(
+                [s["is_bool"] for _, subgroups in schema for s in subgroups],
+                [s["is_bool"] for _, subgroups in original_schema for s in subgroups],
+            )
+
+
 class TestRemoveNullCoords(TestCase):
     def test_remove_null_coords(self):
         arr1 = np.array([np.nan, 1, 2, 3, np.nan, 5])
@@ -0,0 +1,105 @@
+import os
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.h5_pool import H5FilePool
+
+
+class TestH5FilePool(TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.dir.name, f"test_{i}.h5")
+            with h5py.File(path, "w") as f:
+                f.create_dataset("/base_group/dataset", data=np.arange(10) * i)
+            self.paths.append(path)
+
+        self.pool = H5FilePool(max_size=2)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.dir.cleanup()
+
+    def test_reuses_open_file(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+        with self.pool.open(self.paths[0]) as f:
+            self.assertIs(f, first)
+            self.assertEqual(f["base_group"]["dataset"][1], 0)
+
+        self.assertEqual(len(self.pool), 1)
+
+    def test_evicts_least_recently_used(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+        with self.pool.open(self.paths[1]):
+            pass
+        with self.pool.open(self.paths[0]):
+            pass
+        with self.pool.open(self.paths[2]) as f:
+            self.assertEqual(f["base_group"]["dataset"][1], 2)
+
+        # The second file was least recently used, so was evicted and closed
+        self.assertEqual(len(self.pool), 2)
+        self.assertTrue(first.id.valid)
+        with self.pool.open(self.paths[0]) as f:
+            self.assertIs(f, first)
+
+    def test_eviction_closes_file(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+        with self.pool.open(self.paths[1]):
+            pass
+        with self.pool.open(self.paths[2]):
+            pass
+
+        self.assertFalse(first.id.valid)
+
+    def test_file_in_use_not_closed(self):
+        with self.pool.open(self.paths[0]) as f:
+            with self.pool.open(self.paths[1]):
+                pass
+            with self.pool.open(self.paths[2]):
+                pass
+
+            # The file has been evicted, but is still open until it is no longer in use
+            self.assertEqual(len(self.pool), 2)
+            self.assertTrue(f.id.valid)
+            self.assertEqual(f["base_group"]["dataset"][1], 0)
+
+        self.assertFalse(f.id.valid)
+
+    def test_modified_file_reopened(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        with self.pool.open(self.paths[0]) as f:
+            self.assertIsNot(f, first)
+        self.assertFalse(first.id.valid)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_discard(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+        with self.pool.open(self.paths[1]):
+            pass
+        self.pool.discard(self.paths[0])
+
+        self.assertEqual(len(self.pool), 1)
+        self.assertFalse(first.id.valid)
+
+    def test_clear(self):
+        with self.pool.open(self.paths[0]) as f:
+            first = f
+        self.pool.clear()
+
+        self.assertEqual(len(self.pool), 0)
+        self.assertFalse(first.id.valid)
@@ -0,0 +1,84 @@
+from io import BytesIO
+
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.join_functions import (
+    build_seed_index,
+    join_seed_indexes,
+    load_seed_index,
+    save_seed_index,
+)
+
+
+def join_with_loops(seeds_x, seeds_y):
+    return [
+        (row_x, row_y)
+        for row_x, seed_x in enumerate(seeds_x)
+        for row_y, seed_y in enumerate(seeds_y)
+        if seed_x == seed_y
+    ]
+
+
+class TestBuildSeedIndex(TestCase):
+    def test_builds_index(self):
+        index = build_seed_index(np.array([5, 3, 5, 1, 3, 5]))
+
+        np.testing.assert_array_equal(index["seeds"], [1, 3, 5])
+        np.testing.assert_array_equal(index["offsets"], [0, 1, 3, 6])
+        # Rows with the same seed stay in file order
+        np.testing.assert_array_equal(index["order"], [3, 1, 4, 0, 2, 5])
+
+    def test_empty(self):
+        index = build_seed_index(np.empty(0, dtype=np.uint64))
+
+        self.assertEqual(len(index["seeds"]), 0)
+        np.testing.assert_array_equal(index["offsets"], [0])
+        self.assertEqual(len(index["order"]), 0)
+
+    def test_save_and_load(self):
+        index = build_seed_index(np.array([5, 3, 5, 1]))
+        f = BytesIO()
+        save_seed_index(f, index)
+        f.seek(0)
+
+        loaded = load_seed_index(f)
+        for key, value in index.items():
+            np.testing.assert_array_equal(loaded[key], value)
+
+
+class TestJoinSeedIndexes(TestCase):
+    def assert_join(self, seeds_x, seeds_y):
+        rows_x, rows_y = join_seed_indexes(
+            build_seed_index(np.array(seeds_x)), build_seed_index(np.array(seeds_y))
+        )
+
+        self.assertTrue(np.all(np.diff(rows_x) >= 0))
+        self.assertEqual(
+            sorted(zip(rows_x.tolist(), rows_y.tolist())),
+            join_with_loops(seeds_x, seeds_y),
+        )
+
+    def test_one_to_one(self):
+        self.assert_join([4, 2, 9, 7], [7, 2, 4, 9])
+
+    def test_missing_seeds(self):
+        self.assert_join([4, 2, 9, 7], [1, 9, 3, 2, 10])
+
+    def test_one_to_many(self):
+        # e.g. systems with two supernovae
+        self.assert_join([1, 2, 3, 4], [3, 1, 3, 4, 4, 4])
+
+    def test_many_to_many(self):
+        rng = np.random.default_rng(0)
+        self.assert_join(
+            rng.integers(0, 20, 50).tolist(), rng.integers(0, 20, 30).tolist()
+        )
+
+    def test_no_matches(self):
+        self.assert_join([1, 2, 3], [4, 5])
+
+    def test_empty(self):
+        self.assert_join([], [1, 2])
+        self.assert_join([1, 2], [])
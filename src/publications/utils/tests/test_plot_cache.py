@@ -0,0 +1,90 @@
+import os
+from tempfile import NamedTemporaryFile
+from unittest.mock import Mock
+
+from django.test import TestCase, override_settings
+
+from publications.utils.plot_cache import (
+    get_cached_plot,
+    get_cached_plots,
+    get_plot_cache_key,
+)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "plots": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+)
+class TestPlotCache(TestCase):
+    def setUp(self):
+        self.tf = NamedTemporaryFile(suffix=".h5")
+        self.tf.write(b"test data")
+        self.tf.flush()
+        self.params = {
+            "root_group": "group",
+            "subgroup_x": "x",
+            "subgroup_y": "y",
+            "stride_length": 1,
+            "bins": 40,
+        }
+
+    def test_key_is_stable(self):
+        self.assertEqual(
+            get_plot_cache_key(1, self.tf.name, **self.params),
+            get_plot_cache_key(1, self.tf.name, **dict(reversed(self.params.items()))),
+        )
+
+    def test_key_changes_with_params(self):
+        key = get_plot_cache_key(1, self.tf.name, **self.params)
+        self.assertNotEqual(key, get_plot_cache_key(2, self.tf.name, **self.params))
+        for param, value in [("subgroup_x", "z"), ("stride_length", 2), ("bins", 80)]:
+            self.assertNotEqual(
+                key,
+                get_plot_cache_key(1, self.tf.name, **{**self.params, param: value}),
+            )
+
+    def test_key_changes_with_file(self):
+        key = get_plot_cache_key(1, self.tf.name, **self.params)
+
+        stat = os.stat(self.tf.name)
+        os.utime(self.tf.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertNotEqual(key, get_plot_cache_key(1, self.tf.name, **self.params))
+
+    def test_get_cached_plot(self):
+        compute = Mock(return_value={"sides": [1.0, 1.0]})
+        key = get_plot_cache_key(1, self.tf.name, **self.params)
+
+        self.assertDictEqual(get_cached_plot(key, compute), {"sides": [1.0, 1.0]})
+        self.assertDictEqual(get_cached_plot(key, compute), {"sides": [1.0, 1.0]})
+        compute.assert_called_once()
+
+    def test_none_not_cached(self):
+        compute = Mock(return_value=None)
+        key = get_plot_cache_key(1, self.tf.name, **self.params)
+
+        self.assertIsNone(get_cached_plot(key, compute))
+        self.assertIsNone(get_cached_plot(key, compute))
+        self.assertEqual(compute.call_count, 2)
+
+    def test_get_cached_plots(self):
+        keys = [
+            get_plot_cache_key(1, self.tf.name, **{**self.params, "subgroup_x": x})
+            for x in ["a", "b", "c"]
+        ]
+        get_cached_plot(keys[1], Mock(return_value={"sides": [2.0, 2.0]}))
+
+        compute = Mock(side_effect=lambda missing: [{"sides": [i, i]} for i in missing])
+        self.assertListEqual(
+            get_cached_plots(keys, compute),
+            [{"sides": [0, 0]}, {"sides": [2.0, 2.0]}, {"sides": [2, 2]}],
+        )
+        compute.assert_called_once_with([0, 2])
+
+        # Every result is cached now
+        self.assertListEqual(
+            get_cached_plots(keys, compute),
+            [{"sides": [0, 0]}, {"sides": [2.0, 2.0]}, {"sides": [2, 2]}],
+        )
+        compute.assert_called_once()
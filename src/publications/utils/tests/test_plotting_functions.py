@@ -1,18 +1,32 @@
+import base64
 import json
 import numpy as np
 import warnings
+from itertools import product
 
 from django.test import TestCase
 from compasui.tests.utils import silence_logging
 
 from publications.utils.plotting_functions import (
-    get_surrounding_bins,
     get_log_and_limits,
+    get_histogram_masks,
+    get_bin_indices,
+    encode_columns,
     split_histogram_by_count,
     histo2d_scatter_hybrid,
+    histo2d_scatter_hybrid_chunked,
 )
 
 
+def get_surrounding_bins(indices, x_lim, y_lim):
+    # The 3x3 block of bin indices around the indices within the limits, as searched by the original
+    # split_histogram_by_count, kept to check the vectorised version against
+    x, y = indices
+    x1, x2 = max(x - 1, 0), min(x + 1, x_lim)
+    y1, y2 = max(y - 1, 0), min(y + 1, y_lim)
+    return np.array(list(product(range(x1, x2 + 1), range(y1, y2 + 1))))
+
+
 class TestGetSurroundingBins(TestCase):
     def setUp(self):
         self.x_lim, self.y_lim = 10, 10
@@ -276,6 +290,123 @@ class TestSplitHistogramByCount(TestCase):
         )
 
 
+def reference_split_histogram_by_count(counts, split_count):
+    # The original neighbourhood search, kept to check the vectorised version against
+    all_count_indices = np.array(np.where(counts > 0)).T
+    min_count_indices = np.array(np.where(counts > split_count)).T
+
+    x_lim, y_lim = counts.shape
+    min_count_bins = [
+        get_surrounding_bins(entry, x_lim=x_lim - 1, y_lim=y_lim - 1)
+        for entry in min_count_indices
+    ]
+
+    if not len(min_count_bins):
+        return np.array([]), all_count_indices
+
+    smoothed_indices = np.unique(np.concatenate(min_count_bins), axis=0)
+    smoothed_unique_indices = smoothed_indices[
+        np.asarray(
+            [
+                (entry == all_count_indices).all(axis=1).any()
+                for entry in smoothed_indices
+            ]
+        )
+    ]
+    inverse_unique_indices = all_count_indices[
+        ~np.asarray(
+            [
+                (entry == smoothed_indices).all(axis=1).any()
+                for entry in all_count_indices
+            ]
+        )
+    ]
+
+    return smoothed_unique_indices, inverse_unique_indices
+
+
+class TestSplitHistogramByCountRegression(TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(42)
+
+    def assertMatchesReference(self, counts, split_count):
+        expected = reference_split_histogram_by_count(counts, split_count)
+        returned = split_histogram_by_count(counts, split_count)
+        self.assertSequenceEqual(returned[0].tolist(), expected[0].tolist())
+        self.assertSequenceEqual(returned[1].tolist(), expected[1].tolist())
+
+    def test_matches_reference_random(self):
+        for shape in [(1, 1), (1, 7), (5, 5), (13, 8), (41, 41)]:
+            for split_count in [0, 1, 3, 10]:
+                counts = self.rng.poisson(2, size=shape).astype(float)
+                self.assertMatchesReference(counts, split_count)
+
+    def test_matches_reference_sparse(self):
+        counts = np.zeros((41, 41))
+        counts[self.rng.integers(0, 41, 30), self.rng.integers(0, 41, 30)] = 1
+        counts[20, 20] = 10
+        counts[0, 40] = 10
+        self.assertMatchesReference(counts, 3)
+
+    def test_matches_reference_no_dense_bins(self):
+        counts = self.rng.integers(0, 2, size=(10, 10))
+        self.assertMatchesReference(counts, 3)
+
+    def test_matches_reference_empty(self):
+        self.assertMatchesReference(np.zeros((10, 10)), 3)
+
+    def test_masks_are_disjoint(self):
+        counts = self.rng.poisson(1, size=(41, 41))
+        histogram_mask, scatter_mask = get_histogram_masks(counts, 2)
+        self.assertFalse((histogram_mask & scatter_mask).any())
+        self.assertSequenceEqual(
+            (histogram_mask | scatter_mask).tolist(), (counts > 0).tolist()
+        )
+
+
+class TestGetBinIndices(TestCase):
+    def test_matches_numpy_histogram(self):
+        edges = np.linspace(0, 1, 11)
+        arr = np.concatenate([np.random.default_rng(1).random(1000), edges])
+        indices = get_bin_indices(arr, edges)
+        self.assertSequenceEqual(
+            np.bincount(indices, minlength=10).tolist(),
+            np.histogram(arr, bins=edges)[0].tolist(),
+        )
+
+    def test_out_of_range(self):
+        edges = np.array([0.0, 1.0, 2.0])
+        self.assertSequenceEqual(
+            get_bin_indices(np.array([-1, 0, 1, 2, 3, np.nan]), edges).tolist(),
+            [-1, 0, 1, 1, -1, -1],
+        )
+
+
+class TestEncodeColumns(TestCase):
+    def setUp(self):
+        self.columns = {"x": np.array([1.0, 2.5]), "y": np.array([-3.0, 4.0])}
+
+    def test_list(self):
+        self.assertDictEqual(
+            encode_columns(self.columns, "list"),
+            {"encoding": "list", "length": 2, "x": [1.0, 2.5], "y": [-3.0, 4.0]},
+        )
+
+    def test_base64(self):
+        encoded = encode_columns(self.columns, "base64")
+        self.assertEqual(encoded["encoding"], "base64")
+        self.assertEqual(encoded["length"], 2)
+        for key in ["x", "y"]:
+            self.assertSequenceEqual(
+                np.frombuffer(base64.b64decode(encoded[key]), dtype="<f4").tolist(),
+                self.columns[key].tolist(),
+            )
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            encode_columns(self.columns, "csv")
+
+
 class TestHisto2DScatterHybrid(TestCase):
     def setUp(self):
         # 1 0 0 0 1
@@ -315,3 +446,192 @@ class TestHisto2DScatterHybrid(TestCase):
                 {"x": 5.0, "y": 5.0},
             ],
         )
+
+    def test_scatter_points_match_sparse_bin_counts(self):
+        rng = np.random.default_rng(3)
+        x_array = np.concatenate([rng.normal(0, 1, 5000), rng.uniform(-8, 8, 50)])
+        y_array = np.concatenate([rng.normal(0, 1, 5000), rng.uniform(-8, 8, 50)])
+        min_max = [float(min(x_array.min(), y_array.min())), 8.0]
+
+        plot_data = histo2d_scatter_hybrid(x_array, y_array, min_max, min_max)
+        hist_counts = sum(b["counts"] for b in json.loads(plot_data["hist_data"]))
+        scatter_points = json.loads(plot_data["scatter_data"])
+
+        self.assertEqual(hist_counts + len(scatter_points), len(x_array))
+
+    def test_histo2d_scatter_hybrid_columns(self):
+        plot_data = histo2d_scatter_hybrid(
+            self.x_array,
+            self.y_array,
+            [1, 5],
+            [1, 5],
+            min_count=1,
+            bins=5,
+            encoding="list",
+        )
+        json_data = histo2d_scatter_hybrid(
+            self.x_array, self.y_array, [1, 5], [1, 5], min_count=1, bins=5
+        )
+        hist_columns = plot_data["hist_columns"]
+        scatter_columns = plot_data["scatter_columns"]
+
+        self.assertNotIn("hist_data", plot_data)
+        self.assertEqual(hist_columns["length"], 9)
+        self.assertCountEqual(
+            [
+                {"x": x, "y": y, "counts": c}
+                for x, y, c in zip(
+                    hist_columns["x"], hist_columns["y"], hist_columns["counts"]
+                )
+            ],
+            json.loads(json_data["hist_data"]),
+        )
+        self.assertCountEqual(
+            [
+                {"x": x, "y": y}
+                for x, y in zip(scatter_columns["x"], scatter_columns["y"])
+            ],
+            json.loads(json_data["scatter_data"]),
+        )
+
+
+class TestHisto2DScatterHybridChunked(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.x_array = np.concatenate(
+            [rng.normal(0, 1, 20000), rng.uniform(-6, 6, 200)]
+        )
+        self.y_array = np.concatenate(
+            [rng.normal(0, 2, 20000), rng.uniform(-9, 9, 200)]
+        )
+        self.min_max_x = [float(self.x_array.min()), float(self.x_array.max())]
+        self.min_max_y = [float(self.y_array.min()), float(self.y_array.max())]
+
+    def chunks(self, size):
+        sections = range(size, len(self.x_array), size)
+        return zip(np.split(self.x_array, sections), np.split(self.y_array, sections))
+
+    def test_matches_in_memory(self):
+        for encoding in ["json", "list"]:
+            expected = histo2d_scatter_hybrid(
+                self.x_array,
+                self.y_array,
+                self.min_max_x,
+                self.min_max_y,
+                encoding=encoding,
+            )
+            for size in [1000, 7777, len(self.x_array)]:
+                self.assertDictEqual(
+                    histo2d_scatter_hybrid_chunked(
+                        self.chunks(size),
+                        self.min_max_x,
+                        self.min_max_y,
+                        encoding=encoding,
+                    ),
+                    expected,
+                )
+
+    def weighted_chunks(self, size, weights):
+        sections = range(size, len(self.x_array), size)
+        return zip(
+            np.split(self.x_array, sections),
+            np.split(self.y_array, sections),
+            np.split(weights, sections),
+        )
+
+    def weighted_plot(self, weights, size=7777, **kwargs):
+        return histo2d_scatter_hybrid_chunked(
+            self.weighted_chunks(size, weights),
+            self.min_max_x,
+            self.min_max_y,
+            encoding="list",
+            **kwargs,
+        )
+
+    def test_unit_weights_match_unweighted(self):
+        self.assertDictEqual(
+            self.weighted_plot(np.ones(len(self.x_array))),
+            histo2d_scatter_hybrid_chunked(
+                self.chunks(1000), self.min_max_x, self.min_max_y, encoding="list"
+            ),
+        )
+
+    def test_weighted_counts(self):
+        weights = np.random.default_rng(8).uniform(0, 2, len(self.x_array))
+        expected = self.weighted_plot(weights, size=len(self.x_array))
+        for size in [1000, 7777]:
+            plot_data = self.weighted_plot(weights, size=size)
+            self.assertDictEqual(
+                plot_data["scatter_columns"], expected["scatter_columns"]
+            )
+            self.assertEqual(
+                plot_data["hist_columns"]["x"], expected["hist_columns"]["x"]
+            )
+            # Summing the weights in a different order can change the last digits of the counts
+            np.testing.assert_allclose(
+                plot_data["hist_columns"]["counts"], expected["hist_columns"]["counts"]
+            )
+
+        # The histogram counts are the sums of the weights in each bin
+        self.assertAlmostEqual(
+            sum(expected["hist_columns"]["counts"]),
+            weights[~self.scatter_points(expected)].sum(),
+            places=6,
+        )
+
+    def scatter_points(self, plot_data):
+        # Flags the points that were drawn in the scatter plot
+        scatter = set(
+            zip(plot_data["scatter_columns"]["x"], plot_data["scatter_columns"]["y"])
+        )
+        return np.array([p in scatter for p in zip(self.x_array, self.y_array)])
+
+    def test_weighted_split(self):
+        # By default the bins are split by the number of points in them, whatever the weights
+        weights = np.full(len(self.x_array), 10.0)
+        unweighted = histo2d_scatter_hybrid_chunked(
+            self.chunks(1000), self.min_max_x, self.min_max_y, encoding="list"
+        )
+        plot_data = self.weighted_plot(weights)
+        self.assertDictEqual(
+            plot_data["scatter_columns"], unweighted["scatter_columns"]
+        )
+        self.assertEqual(
+            plot_data["hist_columns"]["x"], unweighted["hist_columns"]["x"]
+        )
+        self.assertEqual(
+            plot_data["hist_columns"]["counts"],
+            [10.0 * c for c in unweighted["hist_columns"]["counts"]],
+        )
+
+        # With large weights every bin with any points is dense when the split also uses the weighted counts
+        plot_data = self.weighted_plot(weights, weighted_split=True)
+        self.assertEqual(plot_data["scatter_columns"]["length"], 0)
+        self.assertEqual(
+            sum(plot_data["hist_columns"]["counts"]), 10.0 * len(self.x_array)
+        )
+
+    def test_fractional_weights(self):
+        # Weights below 1 never make a bin dense, so the split falls back to the number of points in each bin
+        # rather than drawing every point in the scatter plot
+        weights = np.random.default_rng(9).uniform(0, 1e-3, len(self.x_array))
+        unweighted = histo2d_scatter_hybrid_chunked(
+            self.chunks(1000), self.min_max_x, self.min_max_y, encoding="list"
+        )
+        self.assertGreater(len(unweighted["hist_columns"]["x"]), 0)
+        for weighted_split in [False, True]:
+            plot_data = self.weighted_plot(weights, weighted_split=weighted_split)
+            self.assertDictEqual(
+                plot_data["scatter_columns"], unweighted["scatter_columns"]
+            )
+            self.assertEqual(
+                plot_data["hist_columns"]["x"], unweighted["hist_columns"]["x"]
+            )
+            self.assertLess(
+                plot_data["scatter_columns"]["length"], len(self.x_array) / 10
+            )
+
+    def test_no_chunks(self):
+        plot_data = histo2d_scatter_hybrid_chunked([], [0, 1], [0, 1])
+        self.assertEqual(plot_data["hist_data"], "[]")
+        self.assertEqual(plot_data["scatter_data"], "[]")
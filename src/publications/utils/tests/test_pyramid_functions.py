@@ -0,0 +1,111 @@
+from io import BytesIO
+
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.plotting_functions import (
+    get_histogram_bins,
+    histo2d_scatter_hybrid,
+)
+from publications.utils.pyramid_functions import (
+    build_histogram_pyramid,
+    get_pyramid_levels,
+    hybrid_plot_from_pyramid,
+    load_histogram_pyramid,
+    save_histogram_pyramid,
+)
+
+
+class TestHistogramPyramid(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.x = np.concatenate([rng.normal(0, 1, 20000), rng.uniform(-5, 5, 30)])
+        self.y = np.concatenate([rng.normal(2, 3, 20000), rng.uniform(-10, 14, 30)])
+        self.min_max_x = [self.x.min(), self.x.max()]
+        self.min_max_y = [self.y.min(), self.y.max()]
+
+    def chunks(self, size):
+        sections = range(size, len(self.x), size)
+        return zip(np.split(self.x, sections), np.split(self.y, sections))
+
+    def test_levels(self):
+        pyramid = build_histogram_pyramid(
+            self.chunks(3000), self.min_max_x, self.min_max_y, levels=3
+        )
+        self.assertEqual(get_pyramid_levels(pyramid), 3)
+
+        hist_bins, _ = get_histogram_bins(self.min_max_x, self.min_max_y, 40)
+        for level in range(3):
+            counts = pyramid[f"counts_{level}"]
+            self.assertEqual(
+                counts.shape,
+                (hist_bins[0] * 2**level, hist_bins[1] * 2**level),
+            )
+            self.assertEqual(counts.sum(), len(self.x))
+
+    def test_matches_in_memory(self):
+        expected = histo2d_scatter_hybrid(
+            self.x, self.y, self.min_max_x, self.min_max_y
+        )
+        for size in [1000, 7000, len(self.x)]:
+            pyramid = build_histogram_pyramid(
+                self.chunks(size), self.min_max_x, self.min_max_y
+            )
+            self.assertDictEqual(hybrid_plot_from_pyramid(pyramid), expected)
+
+    def test_zoom(self):
+        pyramid = build_histogram_pyramid(
+            self.chunks(5000), self.min_max_x, self.min_max_y
+        )
+        plot_data = hybrid_plot_from_pyramid(
+            pyramid, x_range=[-1, 1], y_range=[0, 4], encoding="list"
+        )
+
+        hist_x = np.array(plot_data["hist_columns"]["x"])
+        hist_y = np.array(plot_data["hist_columns"]["y"])
+        scatter_x = np.array(plot_data["scatter_columns"]["x"])
+        scatter_y = np.array(plot_data["scatter_columns"]["y"])
+
+        # The window is covered by a finer level than the full plot
+        self.assertLess(
+            plot_data["sides"][0], pyramid["x_edges_0"][1] - pyramid["x_edges_0"][0]
+        )
+        for x, y in [(hist_x, hist_y), (scatter_x, scatter_y)]:
+            self.assertTrue(
+                np.all(
+                    (x > -1 - plot_data["sides"][0]) & (x < 1 + plot_data["sides"][0])
+                )
+            )
+            self.assertTrue(
+                np.all(
+                    (y > 0 - plot_data["sides"][1]) & (y < 4 + plot_data["sides"][1])
+                )
+            )
+
+        # Every point within the window is either counted in a histogram bin or drawn as a scatter point
+        in_window = (
+            (self.x >= -1 + plot_data["sides"][0])
+            & (self.x <= 1 - plot_data["sides"][0])
+            & (self.y >= 0 + plot_data["sides"][1])
+            & (self.y <= 4 - plot_data["sides"][1])
+        )
+        self.assertGreaterEqual(
+            sum(plot_data["hist_columns"]["counts"]) + len(scatter_x), in_window.sum()
+        )
+
+    def test_save_and_load(self):
+        pyramid = build_histogram_pyramid(
+            self.chunks(5000), self.min_max_x, self.min_max_y
+        )
+        metadata = {"min_max_x": [0.0, 1.0], "log_check_x": True}
+
+        f = BytesIO()
+        save_histogram_pyramid(f, pyramid, metadata)
+        f.seek(0)
+        loaded, loaded_metadata = load_histogram_pyramid(f)
+
+        self.assertDictEqual(loaded_metadata, metadata)
+        self.assertEqual(loaded.keys(), pyramid.keys())
+        for key, value in pyramid.items():
+            np.testing.assert_array_equal(loaded[key], value)
@@ -0,0 +1,83 @@
+import numpy as np
+
+from django.test import TestCase
+
+from publications.utils.sketch_functions import QuantileSketch
+
+
+class TestQuantileSketch(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(17)
+        self.values = np.concatenate(
+            [
+                rng.lognormal(0, 3, 20000),
+                -rng.lognormal(2, 1, 5000),
+                np.zeros(1000),
+            ]
+        )
+        rng.shuffle(self.values)
+        self.quantiles = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1]
+
+    def assert_quantiles(self, sketch, values):
+        expected = np.quantile(values, self.quantiles, method="lower")
+        estimates = np.array(sketch.quantiles(self.quantiles))
+        np.testing.assert_allclose(estimates, expected, rtol=sketch.relative_accuracy)
+
+    def test_quantiles(self):
+        sketch = QuantileSketch()
+        sketch.add(self.values)
+
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertEqual(sketch.zero_count, 1000)
+        self.assert_quantiles(sketch, self.values)
+        # The minimum and maximum are exact
+        self.assertEqual(
+            sketch.quantiles([0, 1]), [self.values.min(), self.values.max()]
+        )
+
+    def test_relative_accuracy(self):
+        sketch = QuantileSketch(relative_accuracy=0.05)
+        sketch.add(self.values)
+        self.assert_quantiles(sketch, self.values)
+
+    def test_ignores_non_finite_values(self):
+        sketch = QuantileSketch()
+        sketch.add(np.concatenate([self.values, [np.nan, np.inf, -np.inf]]))
+        self.assertEqual(sketch.count, len(self.values))
+        self.assert_quantiles(sketch, self.values)
+
+    def test_merge(self):
+        sketch = QuantileSketch()
+        sketch.add(self.values)
+
+        merged = QuantileSketch()
+        for chunk in np.array_split(self.values, 7):
+            part = QuantileSketch()
+            part.add(chunk)
+            merged.merge(part)
+
+        self.assertEqual(merged.to_dict(), sketch.to_dict())
+
+    def test_merge_different_accuracy(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch().merge(QuantileSketch(relative_accuracy=0.05))
+
+    def test_empty(self):
+        sketch = QuantileSketch()
+        sketch.add(np.array([np.nan]))
+        self.assertEqual(sketch.quantiles([0, 0.5]), [None, None])
+
+    def test_single_value(self):
+        sketch = QuantileSketch()
+        sketch.add(np.full(10, 3.5))
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [3.5, 3.5, 3.5])
+
+    def test_to_dict_and_from_dict(self):
+        sketch = QuantileSketch()
+        sketch.add(self.values)
+
+        loaded = QuantileSketch.from_dict(sketch.to_dict())
+        self.assertEqual(loaded.to_dict(), sketch.to_dict())
+        self.assertEqual(
+            loaded.quantiles(self.quantiles), sketch.quantiles(self.quantiles)
+        )
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from publications.utils.tar_functions import (
+    check_tar_file,
+    copy_file_with_checksum,
+    get_file_checksum,
+    iter_tar_file,
+)
+
+
+def add_tar_member(tar, name, content=None):
+    member = tarfile.TarInfo(name)
+    if content is None:
+        member.type = tarfile.DIRTYPE
+        tar.addfile(member)
+    else:
+        member.size = len(content)
+        tar.addfile(member, io.BytesIO(content))
+
+
+class TestTarFunctions(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.root = Path(self.directory.name)
+        self.files = {
+            "job/COMPAS_Output/COMPAS_Output.h5": b"h5" * 1000,
+            "job/BSE_grid.txt": b"--initial-mass-1 10",
+        }
+
+        self.archive = self.root / "job.tar.gz"
+        with tarfile.open(self.archive, "w:gz") as tar:
+            add_tar_member(tar, "job")
+            add_tar_member(tar, "job/COMPAS_Output")
+            for name, content in self.files.items():
+                add_tar_member(tar, name, content)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_copy_file_with_checksum(self):
+        content = b"0123456789" * 200000
+        path = self.root / "a" / "b" / "file"
+
+        size, sha256 = copy_file_with_checksum(io.BytesIO(content), path)
+
+        self.assertEqual(size, len(content))
+        self.assertEqual(sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(path.read_bytes(), content)
+        # No temporary files are left behind
+        self.assertSequenceEqual(list(path.parent.iterdir()), [path])
+        self.assertEqual(get_file_checksum(path), (size, sha256))
+
+    def test_iter_tar_file(self):
+        extracted = {}
+        for member, source in iter_tar_file(self.archive, self.root):
+            extracted[member.name] = source.read()
+
+        # Directories are skipped, and files are read in the order of the archive
+        self.assertEqual(extracted, self.files)
+        self.assertSequenceEqual(list(extracted), list(self.files))
+
+    def test_iter_tar_file_outside_directory(self):
+        archive = self.root / "outside.tar"
+        with tarfile.open(archive, "w") as tar:
+            add_tar_member(tar, "../outside.txt", b"outside")
+
+        with self.assertRaises(tarfile.OutsideDestinationError):
+            list(iter_tar_file(archive, self.root / "job"))
+
+    def test_iter_tar_file_links(self):
+        archive = self.root / "links.tar"
+        with tarfile.open(archive, "w") as tar:
+            add_tar_member(tar, "file.txt", b"file")
+            member = tarfile.TarInfo("link.txt")
+            member.type = tarfile.SYMTYPE
+            member.linkname = "file.txt"
+            tar.addfile(member)
+
+        self.assertSequenceEqual(
+            [member.name for member, _ in iter_tar_file(archive, self.root)],
+            ["file.txt"],
+        )
+
+    def test_check_tar_file(self):
+        with open(self.archive, "rb") as f:
+            f.seek(5)
+            self.assertTrue(check_tar_file(f))
+            self.assertEqual(f.tell(), 5)
+
+        self.assertFalse(check_tar_file(io.BytesIO(b"not an archive" * 100)))
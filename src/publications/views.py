@@ -1,7 +1,32 @@
 from pathlib import Path
-from django.http import Http404, FileResponse
+from urllib.parse import quote
+from django.conf import settings
+from django.http import Http404, FileResponse, HttpResponse, JsonResponse
+from django.utils.http import content_disposition_header
 from django.core.exceptions import ValidationError
-from .models import FileDownloadToken
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from .models import (
+    ChunkedDatasetModelUpload,
+    CompasDatasetModelUploadToken,
+    FileDownloadToken,
+)
+
+
+def get_accel_redirect_url(path):
+    # The URL of a file within MEDIA_ROOT at the internal nginx location that serves it, or None if downloads
+    # aren't sent by nginx or the file is outside MEDIA_ROOT
+    if not settings.FILE_DOWNLOAD_ACCEL_REDIRECT_URL:
+        return None
+
+    try:
+        relative_path = path.resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
+    except ValueError:
+        return None
+
+    return settings.FILE_DOWNLOAD_ACCEL_REDIRECT_URL.rstrip("/") + quote(
+        f"/{relative_path.as_posix()}"
+    )
 
 
 def file_download(request):
@@ -17,9 +42,21 @@ def file_download(request):
         # Was a file found with this token?
         if fdl:
             file_path = Path(fdl.path)
+            as_attachment = "forceDownload" in request.GET
+
+            # Have nginx send the file if it can, so the file isn't streamed through this worker
+            accel_redirect_url = get_accel_redirect_url(file_path)
+            if accel_redirect_url:
+                response = HttpResponse(content_type="application/octet-stream")
+                response["X-Accel-Redirect"] = accel_redirect_url
+                response["Content-Disposition"] = content_disposition_header(
+                    as_attachment, file_path.name
+                )
+                return response
+
             return FileResponse(
                 open(file_path, "rb"),
-                as_attachment="forceDownload" in request.GET,
+                as_attachment=as_attachment,
                 filename=file_path.name,
                 content_type="application/octet-stream",
             )
@@ -27,3 +64,44 @@ def file_download(request):
         raise Http404
     except ValidationError:
         raise Http404
+
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def dataset_model_upload_part(request):
+    # The body of the request is a part of a file being uploaded with an upload token, see
+    # StartCompasDatasetModelUploadMutation. The body is read as a stream, so it is never buffered to disk
+    token = request.GET.get("uploadToken", None)
+    if not token:
+        raise Http404
+
+    try:
+        upload_token = CompasDatasetModelUploadToken.get_by_token(token)
+        chunked_upload = upload_token.chunked_upload if upload_token else None
+    except (ValidationError, ChunkedDatasetModelUpload.DoesNotExist):
+        raise Http404
+
+    if not chunked_upload:
+        raise Http404
+
+    try:
+        offset = int(request.GET.get("offset", ""))
+    except ValueError:
+        return JsonResponse(
+            {
+                "error": "Part offset must be an integer",
+                "offset": chunked_upload.offset,
+            },
+            status=400,
+        )
+
+    try:
+        offset = chunked_upload.write_part(
+            offset, request, request.headers.get("X-Part-SHA256")
+        )
+    except ValueError as e:
+        return JsonResponse(
+            {"error": str(e), "offset": chunked_upload.offset}, status=409
+        )
+
+    return JsonResponse({"offset": offset, "size": chunked_upload.size})